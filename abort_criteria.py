@@ -0,0 +1,130 @@
+"""
+Abort Criteria for Failed Runs
+Detects diverging controllers (vehicle off the route, heading reversed or
+stalled) so runners can stop an experiment instead of logging garbage
+"""
+
+import numpy as np
+
+
+# Failure reasons, in the order they are checked
+FAILURE_REASONS = ('lateral_error', 'heading_error', 'speed_collapse')
+
+# Failure reason of runs that ended before logging a single tick
+NO_DATA = 'no_data'
+
+
+class AbortCriteria:
+    """
+    Per-tick divergence checks.
+
+    A run fails when, for `patience` consecutive ticks, the lateral error
+    exceeds max_lateral_error, the absolute heading error exceeds
+    max_heading_error, or (after the first `grace_ticks` ticks, while the
+    vehicle accelerates from rest) the speed stays below min_speed.
+    """
+
+    def __init__(self, max_lateral_error=5.0, max_heading_error=90.0, min_speed=0.5,
+                 patience=20, grace_ticks=100):
+        """
+        Initialize abort criteria.
+
+        Args:
+            max_lateral_error (float): Lateral error bound (meters)
+            max_heading_error (float): Absolute heading error bound (degrees)
+            min_speed (float): Speed below which the vehicle counts as stalled (m/s)
+            patience (int): Consecutive ticks a bound must be violated
+            grace_ticks (int): Ticks before the speed check starts
+        """
+        self.max_lateral_error = max_lateral_error
+        self.max_heading_error = max_heading_error
+        self.min_speed = min_speed
+        self.patience = patience
+        self.grace_ticks = grace_ticks
+        self.reset()
+
+    def config(self):
+        """
+        Thresholds as a dict (e.g. for result cache keys).
+
+        Returns:
+            dict: Constructor arguments
+        """
+        return {
+            'max_lateral_error': self.max_lateral_error,
+            'max_heading_error': self.max_heading_error,
+            'min_speed': self.min_speed,
+            'patience': self.patience,
+            'grace_ticks': self.grace_ticks,
+        }
+
+    def reset(self, num_vehicles=None):
+        """
+        Reset the violation counters (call at the start of each run).
+
+        Args:
+            num_vehicles (int): Batch size for update_batch (None for update)
+        """
+        self.ticks = 0
+        self.counts = {reason: 0 if num_vehicles is None else np.zeros(num_vehicles, dtype=np.int64)
+                       for reason in FAILURE_REASONS}
+
+    def select(self, keep):
+        """
+        Keep the violation counters of a subset of a batch.
+
+        Args:
+            keep (np.ndarray): Boolean mask or indices of the vehicles to keep
+        """
+        self.counts = {reason: count[keep] for reason, count in self.counts.items()}
+
+    def update(self, lateral_error, heading_error, speed):
+        """
+        Check one tick of a single run.
+
+        Args:
+            lateral_error (float): Lateral error (meters)
+            heading_error (float): Heading error (degrees)
+            speed (float): Vehicle speed (m/s)
+
+        Returns:
+            str: Failure reason, or None while the run is healthy
+        """
+        self.ticks += 1
+        violations = (
+            lateral_error > self.max_lateral_error,
+            abs(heading_error) > self.max_heading_error,
+            self.ticks > self.grace_ticks and speed < self.min_speed,
+        )
+        failure = None
+        for reason, violated in zip(FAILURE_REASONS, violations):
+            count = self.counts[reason] + 1 if violated else 0
+            self.counts[reason] = count
+            if failure is None and count >= self.patience:
+                failure = reason
+        return failure
+
+    def update_batch(self, lateral_error, heading_error, speed):
+        """
+        Check one tick of a batch of runs (see reset(num_vehicles)).
+
+        Args:
+            lateral_error (np.ndarray): Lateral errors (meters)
+            heading_error (np.ndarray): Heading errors (degrees)
+            speed (np.ndarray): Vehicle speeds (m/s)
+
+        Returns:
+            np.ndarray: Index into FAILURE_REASONS per vehicle, -1 while healthy
+        """
+        self.ticks += 1
+        violations = (
+            lateral_error > self.max_lateral_error,
+            np.abs(heading_error) > self.max_heading_error,
+            (speed < self.min_speed) & (self.ticks > self.grace_ticks),
+        )
+        failure = np.full(np.shape(lateral_error), -1, dtype=np.int64)
+        for code, (reason, violated) in enumerate(zip(FAILURE_REASONS, violations)):
+            count = np.where(violated, self.counts[reason] + 1, 0)
+            self.counts[reason] = count
+            failure = np.where((failure < 0) & (count >= self.patience), code, failure)
+        return failure
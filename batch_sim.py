@@ -0,0 +1,381 @@
+"""
+Lockstep Batch Simulation
+Advances K vehicles with K controller parameterizations as one NumPy state
+array per tick, using the controllers' vectorized steering laws
+"""
+
+import argparse
+import itertools
+import time
+import numpy as np
+
+import local_sim
+from abort_criteria import FAILURE_REASONS, AbortCriteria
+from hybrid_controller import HybridController
+from local_sim import VEHICLE_PARAMS, bicycle_step
+from pure_pursuit import PurePursuitController
+from route_builder import build_route
+from stanley import StanleyController
+from waypoint_path import BatchClosestPointTracker
+
+
+# Constructor defaults of the scalar controllers, by controller name
+CONTROLLER_DEFAULTS = {
+    'pure_pursuit': {'lookahead_distance': 3.0, 'wheelbase': 2.875},
+    'stanley': {'k': 1.0, 'wheelbase': 2.875},
+    'hybrid': {'pp_lookahead': 3.0, 'stanley_k': 0.5, 'curvature_threshold': 0.05,
+               'blend_zone': 0.02},
+}
+
+# Hybrid modes (one mode per batch)
+HYBRID_MODES = ('adaptive', 'switching', 'blending')
+
+TARGET_SPEED = 30.0 / 3.6  # m/s
+
+
+def parameter_grid(**axes):
+    """
+    Cartesian product of parameter values.
+
+    Args:
+        **axes: Parameter name -> list of values
+
+    Returns:
+        dict: Parameter name -> array with one entry per grid point
+    """
+    names = list(axes)
+    points = list(itertools.product(*(axes[name] for name in names)))
+    return {name: np.array([point[i] for point in points], dtype=np.float64)
+            for i, name in enumerate(names)}
+
+
+class BatchSimulation:
+    """
+    Simulate one controller type with K parameterizations in lockstep.
+
+    Every vehicle starts at rest at the same waypoint (the start of the path
+    unless run is given another) and drives it alone (vehicles do not
+    interact). The controller is built once with array-valued parameters,
+    so each tick computes all controls with one
+    compute_steering_batch call and steps all vehicles with one
+    bicycle_step call, logging the same per-tick metrics as the runners.
+    """
+
+    def __init__(self, path, controller, params, mode='adaptive', curvature_horizon=20.0,
+                 speed_adaptive=True, dt=0.05, vehicle_params=VEHICLE_PARAMS):
+        """
+        Initialize the batch.
+
+        Args:
+            path (Path): Route to follow (starts at the spawn point)
+            controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+            params (dict): Constructor parameters of the controller; each value
+                is a scalar or an array with one entry per vehicle
+            mode (str): Hybrid mode shared by the batch
+            curvature_horizon (float): Hybrid preview curvature horizon (meters)
+            speed_adaptive (bool): Hybrid speed adaptation
+            dt (float): Simulation step (seconds)
+            vehicle_params (dict): Vehicle model parameters
+        """
+        if controller not in CONTROLLER_DEFAULTS:
+            raise ValueError(f"Unknown controller: {controller}")
+        if mode not in HYBRID_MODES:
+            raise ValueError(f"Unknown hybrid mode: {mode}")
+
+        self.path = path
+        self.controller = controller
+        self.mode = mode
+        self.curvature_horizon = curvature_horizon
+        self.speed_adaptive = speed_adaptive
+        self.dt = dt
+        self.vehicle_params = vehicle_params
+
+        unknown = set(params) - set(CONTROLLER_DEFAULTS[controller])
+        if unknown:
+            raise ValueError(f"Unknown {controller} parameters: {sorted(unknown)}")
+        merged = dict(CONTROLLER_DEFAULTS[controller], **params)
+        self.num_vehicles = max(np.size(value) for value in merged.values())
+        self.params = {name: np.broadcast_to(np.asarray(value, dtype=np.float64),
+                                             (self.num_vehicles,)).copy()
+                       for name, value in merged.items()}
+
+    def experiment_names(self):
+        """
+        Experiment name of each vehicle, in the runners' naming style.
+
+        Returns:
+            list: One name per vehicle
+        """
+        p = self.params
+        if self.controller == 'pure_pursuit':
+            return [f"PurePursuit_Ld{ld:g}" for ld in p['lookahead_distance']]
+        if self.controller == 'stanley':
+            return [f"Stanley_K{k:g}" for k in p['k']]
+        return [f"Hybrid_{self.mode.capitalize()}_Ld{ld:g}_K{k:g}_T{t:g}_B{b:g}"
+                for ld, k, t, b in zip(p['pp_lookahead'], p['stanley_k'],
+                                       p['curvature_threshold'], p['blend_zone'])]
+
+    def build_controller(self, params=None):
+        """
+        Controller instance holding one parameter array entry per vehicle.
+
+        Args:
+            params (dict): Parameter arrays to use instead of self.params
+
+        Returns:
+            PurePursuitController, StanleyController or HybridController:
+                Controller whose compute_steering_batch steers the whole batch
+        """
+        p = self.params if params is None else params
+        if self.controller == 'pure_pursuit':
+            return PurePursuitController(lookahead_distance=p['lookahead_distance'],
+                                         wheelbase=p['wheelbase'])
+        if self.controller == 'stanley':
+            return StanleyController(k=p['k'], wheelbase=p['wheelbase'])
+        return HybridController(
+            pp_lookahead=p['pp_lookahead'],
+            stanley_k=p['stanley_k'],
+            curvature_threshold=p['curvature_threshold'],
+            blend_zone=p['blend_zone'],
+            mode=self.mode,
+            curvature_horizon=self.curvature_horizon,
+            speed_adaptive=self.speed_adaptive,
+        )
+
+    def run(self, num_ticks, abort_criteria=None, start_index=0):
+        """
+        Run the batch.
+
+        Vehicles that meet the abort criteria are dropped from the batch, so
+        later ticks only simulate the vehicles still running; their log
+        entries after the abort are NaN.
+
+        Args:
+            num_ticks (int): Number of simulation ticks
+            abort_criteria (AbortCriteria): Early termination of diverging
+                vehicles (None to run every vehicle for num_ticks)
+            start_index (int): Waypoint every vehicle starts at, at rest
+
+        Returns:
+            dict: (num_ticks, K) arrays of lateral_errors, heading_errors
+                (degrees), steering_angles, speeds, curvatures and
+                blend_weights, the timestamps array, and per-vehicle steps
+                (ticks run) and failures (index into FAILURE_REASONS, -1 if
+                the vehicle did not abort)
+        """
+        path = self.path
+        k = self.num_vehicles
+        x = np.full(k, path.x[start_index])
+        y = np.full(k, path.y[start_index])
+        yaw = np.full(k, path.yaw[start_index])
+        speed = np.zeros(k)
+        wheel_angle = np.zeros(k)
+
+        controller = self.build_controller()
+        tracker = BatchClosestPointTracker()
+        closest_idx, _ = tracker.find(path, x, y)
+        curvature = np.zeros(k)
+        weight = np.zeros(k)
+
+        log = {name: np.full((num_ticks, k), np.nan) for name in
+               ('lateral_errors', 'heading_errors', 'steering_angles', 'speeds',
+                'curvatures', 'blend_weights')}
+
+        # Original vehicle index of each running vehicle
+        alive = np.arange(k)
+        steps = np.full(k, num_ticks)
+        failures = np.full(k, -1)
+        if abort_criteria is not None:
+            abort_criteria.reset(k)
+
+        for tick in range(num_ticks):
+            steering = controller.compute_steering_batch(x, y, yaw, speed, path, closest_idx)
+            if self.controller == 'hybrid':
+                curvature = controller.current_curvature
+                weight = controller.blend_weight
+            below_target = speed < TARGET_SPEED
+            throttle = np.where(below_target, 0.5, 0.0)
+            brake = np.where(below_target, 0.0, 0.3)
+
+            x, y, yaw, speed, wheel_angle = bicycle_step(
+                x, y, yaw, speed, wheel_angle, steering, throttle, brake, self.dt,
+                self.vehicle_params
+            )
+            closest_idx, _ = tracker.find(path, x, y)
+
+            # Errors against the path segments, as the runners measure them
+            cross_track_error, _, path_yaw = path.cross_track_batch(x, y, closest_idx)
+            heading_error = path_yaw - yaw
+            lateral_error = np.abs(cross_track_error)
+            heading_error = np.degrees(np.arctan2(np.sin(heading_error), np.cos(heading_error)))
+            log['lateral_errors'][tick, alive] = lateral_error
+            log['heading_errors'][tick, alive] = heading_error
+            log['steering_angles'][tick, alive] = steering
+            log['speeds'][tick, alive] = speed
+            log['curvatures'][tick, alive] = curvature
+            log['blend_weights'][tick, alive] = weight
+
+            if abort_criteria is None:
+                continue
+            codes = abort_criteria.update_batch(lateral_error, heading_error, speed)
+            failed = codes >= 0
+            if not failed.any():
+                continue
+
+            # Drop the failed vehicles from the batch
+            steps[alive[failed]] = tick + 1
+            failures[alive[failed]] = codes[failed]
+            keep = ~failed
+            alive = alive[keep]
+            if len(alive) == 0:
+                break
+            x, y, yaw, speed, wheel_angle = x[keep], y[keep], yaw[keep], speed[keep], wheel_angle[keep]
+            closest_idx = closest_idx[keep]
+            curvature = np.broadcast_to(curvature, failed.shape)[keep]
+            weight = np.broadcast_to(weight, failed.shape)[keep]
+            tracker.select(keep)
+            abort_criteria.select(keep)
+            controller = self.build_controller({name: values[alive]
+                                                for name, values in self.params.items()})
+
+        log['timestamps'] = np.arange(1, num_ticks + 1) * self.dt
+        log['steps'] = steps
+        log['failures'] = failures
+        return log
+
+    def summaries(self, log):
+        """
+        Per-vehicle summary statistics, with the runners' summary keys.
+
+        Args:
+            log (dict): Output of run
+
+        Returns:
+            list: One summary dict per vehicle
+        """
+        lateral = log['lateral_errors']
+        heading = np.abs(log['heading_errors'])
+        steering = log['steering_angles']
+        steps = log['steps']
+
+        # Entries after an abort are NaN and ignored
+        smoothness = np.zeros(self.num_vehicles)
+        several = steps > 1
+        if several.any():
+            smoothness[several] = np.nanstd(np.diff(steering[:, several], axis=0), axis=0)
+
+        columns = {
+            'mean_lateral_error': np.nanmean(lateral, axis=0),
+            'max_lateral_error': np.nanmax(lateral, axis=0),
+            'std_lateral_error': np.nanstd(lateral, axis=0),
+            'mean_abs_heading_error': np.nanmean(heading, axis=0),
+            'max_abs_heading_error': np.nanmax(heading, axis=0),
+            'steering_smoothness': smoothness,
+            'mean_speed': np.nanmean(log['speeds'], axis=0),
+            'mean_curvature': np.nanmean(log['curvatures'], axis=0),
+        }
+        summaries = []
+        for v in range(self.num_vehicles):
+            failure = int(log['failures'][v])
+            summaries.append(dict(
+                {name: float(values[v]) for name, values in columns.items()},
+                total_steps=int(steps[v]),
+                failed=failure >= 0,
+                failure_reason=FAILURE_REASONS[failure] if failure >= 0 else None,
+                total_time=float(log['timestamps'][steps[v] - 1]) if steps[v] else 0.0,
+            ))
+        return summaries
+
+    def metrics(self, log):
+        """
+        Per-vehicle metrics dicts in the format the runners save.
+
+        Args:
+            log (dict): Output of run
+
+        Returns:
+            list: One metrics dict per vehicle
+        """
+        names = self.experiment_names()
+        summaries = self.summaries(log)
+        results = []
+        for v, (name, summary) in enumerate(zip(names, summaries)):
+            n = log['steps'][v]
+            results.append({
+                'experiment_name': name,
+                'lateral_errors': log['lateral_errors'][:n, v].tolist(),
+                'heading_errors': log['heading_errors'][:n, v].tolist(),
+                'steering_angles': log['steering_angles'][:n, v].tolist(),
+                'speeds': log['speeds'][:n, v].tolist(),
+                'timestamps': log['timestamps'][:n].tolist(),
+                'curvatures': log['curvatures'][:n, v].tolist(),
+                'blend_weights': log['blend_weights'][:n, v].tolist(),
+                'summary': summary,
+            })
+        return results
+
+
+def load_local_route(town='Town01', spawn_index=0, spacing=2.0, length=1000.0):
+    """
+    Build the runners' route on a local_sim town.
+
+    Returns:
+        Path: Route starting at the spawn point
+    """
+    world = local_sim.Client().load_world(town)
+    carla_map = world.get_map()
+    start = carla_map.get_spawn_points()[spawn_index]
+    return build_route(carla_map, start.location, length=length, spacing=spacing)
+
+
+def main():
+    """
+    Run a hybrid parameter grid as one batch and report the best configurations.
+    """
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--town', default='Town01', help='local_sim town')
+    argparser.add_argument('--duration', type=float, default=60.0,
+                           help='simulated seconds per configuration')
+    argparser.add_argument('--mode', choices=HYBRID_MODES, default='blending')
+    argparser.add_argument('--no-abort', action='store_true',
+                           help='run diverging configurations for the full duration')
+    args = argparser.parse_args()
+
+    path = load_local_route(args.town)
+    num_ticks = int(round(args.duration / 0.05))
+
+    # 1000-point grid; pp_lookahead and stanley_k only matter without speed
+    # adaptation, so the grid runs with it off
+    grid = parameter_grid(
+        pp_lookahead=np.linspace(2.0, 6.5, 10),
+        stanley_k=np.linspace(0.25, 2.5, 10),
+        curvature_threshold=np.linspace(0.02, 0.1, 5),
+        blend_zone=[0.01, 0.02],
+    )
+    batch = BatchSimulation(path, 'hybrid', grid, mode=args.mode, speed_adaptive=False)
+
+    start = time.perf_counter()
+    log = batch.run(num_ticks, abort_criteria=None if args.no_abort else AbortCriteria())
+    elapsed = time.perf_counter() - start
+
+    summaries = batch.summaries(log)
+    names = batch.experiment_names()
+    # Failed configurations rank last
+    order = sorted(range(batch.num_vehicles),
+                   key=lambda v: (summaries[v]['failed'], summaries[v]['mean_lateral_error']))
+    num_failed = sum(summary['failed'] for summary in summaries)
+
+    print("="*78)
+    print(f"BATCH SIMULATION: {batch.num_vehicles} configurations x {num_ticks} ticks "
+          f"in {elapsed:.2f} s ({log['steps'].sum() / elapsed:,.0f} vehicle-ticks/s)")
+    print(f"{num_failed} configurations aborted")
+    print("="*78)
+    print(f"{'Experiment':<44} {'Mean Lat (m)':>14} {'Smoothness':>12}")
+    print("-"*78)
+    for v in order[:10]:
+        print(f"{names[v]:<44} {summaries[v]['mean_lateral_error']:>14.3f} "
+              f"{summaries[v]['steering_smoothness']:>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Batched Steering Benchmark
+Checks compute_steering_batch against the scalar per-vehicle path and compares
+the cost per vehicle state
+"""
+
+import math
+import time
+import numpy as np
+
+from local_sim import Location, Rotation, Transform, Vector3D
+from hybrid_controller import HybridController
+from pure_pursuit import PurePursuitController
+from stanley import StanleyController
+from vehicle_state import VehicleState
+from waypoint_path import Path
+
+
+def make_path(num_waypoints=500, spacing=2.0, closed=True):
+    """
+    Winding test path: a loop whose radius varies around the circle.
+
+    Returns:
+        Path: Array-backed path
+    """
+    theta = np.linspace(0.0, 2.0 * np.pi, num_waypoints, endpoint=not closed)
+    radius = num_waypoints * spacing / (2.0 * np.pi) * (1.0 + 0.2 * np.sin(3.0 * theta))
+    x = radius * np.cos(theta)
+    y = radius * np.sin(theta)
+    yaw = np.arctan2(np.gradient(y), np.gradient(x))
+    return Path(x, y, yaw, closed=closed)
+
+
+def make_states(path, count, seed=0):
+    """
+    Vehicle states scattered around the path with lateral and heading offsets.
+
+    Returns:
+        tuple: (x, y, yaw, speed) arrays
+    """
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(path), size=count)
+    normal = path.yaw[idx] + np.pi / 2
+    offset = rng.normal(scale=1.0, size=count)
+    x = path.x[idx] + offset * np.cos(normal)
+    y = path.y[idx] + offset * np.sin(normal)
+    yaw = path.yaw[idx] + rng.normal(scale=0.2, size=count)
+    yaw = np.arctan2(np.sin(yaw), np.cos(yaw))
+    speed = rng.uniform(0.0, 15.0, size=count)
+    return x, y, yaw, speed
+
+
+def scalar_steering(controller, path, x, y, yaw, speed):
+    """
+    Reference: one run_step_from_state per vehicle state.
+
+    Returns:
+        np.ndarray: Steering commands
+    """
+    steering = np.empty(len(x))
+    for i in range(len(x)):
+        transform = Transform(Location(x[i], y[i], 0.0), Rotation(yaw=math.degrees(yaw[i])))
+        velocity = Vector3D(speed[i], 0.0, 0.0)
+        state = VehicleState(i, 0.0, i, transform, velocity)
+        controller.reset()
+        steering[i] = controller.run_step_from_state(state, path).steer
+    return steering
+
+
+def main(count=2000):
+    """
+    Compare batched and scalar steering on open and closed paths.
+    """
+    controllers = [
+        ('Pure Pursuit', lambda: PurePursuitController(lookahead_distance=3.0)),
+        ('Stanley', lambda: StanleyController(k=1.0)),
+        ('Hybrid adaptive', lambda: HybridController(mode='adaptive')),
+        ('Hybrid switching', lambda: HybridController(mode='switching')),
+        ('Hybrid blending', lambda: HybridController(mode='blending')),
+    ]
+
+    print("="*78)
+    print("BATCHED STEERING BENCHMARK")
+    print("="*78)
+    print(f"{'Controller':<18} {'Path':<7} {'Max |diff|':>12} {'Scalar (us)':>13} "
+          f"{'Batch (us)':>12} {'Speedup':>9}")
+    print("-"*78)
+
+    for closed in (True, False):
+        path = make_path(closed=closed)
+        x, y, yaw, speed = make_states(path, count)
+
+        # Closest indices as the scalar controllers find them after a reset
+        closest_idx = np.array([path.index.nearest(x[i], y[i])[0] for i in range(count)])
+
+        for name, make_controller in controllers:
+            start = time.perf_counter()
+            expected = scalar_steering(make_controller(), path, x, y, yaw, speed)
+            scalar_us = (time.perf_counter() - start) / count * 1e6
+
+            controller = make_controller()
+            start = time.perf_counter()
+            steering = controller.compute_steering_batch(x, y, yaw, speed, path, closest_idx)
+            batch_us = (time.perf_counter() - start) / count * 1e6
+
+            max_diff = float(np.max(np.abs(steering - expected)))
+            assert max_diff < 1e-9, f"{name}: batched steering differs by {max_diff}"
+
+            print(f"{name:<18} {'closed' if closed else 'open':<7} {max_diff:>12.2e} "
+                  f"{scalar_us:>13.1f} {batch_us:>12.3f} {scalar_us / batch_us:>8.0f}x")
+
+    print("-"*78)
+    print(f"{count} vehicle states per run; scalar column includes the per-state "
+          f"closest-waypoint search.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Cross-Track Metric Benchmark
+Compares the nearest-waypoint lateral error against the projection onto the
+path segments, in accuracy and in cost (per-tick calls and whole trajectories)
+"""
+
+import time
+import numpy as np
+
+from waypoint_path import Path
+
+
+def circular_path(radius, spacing):
+    """
+    Closed circular path sampled at a fixed spacing.
+
+    Args:
+        radius (float): Circle radius (meters)
+        spacing (float): Distance between consecutive waypoints (meters)
+
+    Returns:
+        Path: Counter-clockwise loop
+    """
+    num_waypoints = int(round(2 * np.pi * radius / spacing))
+    theta = np.linspace(0.0, 2 * np.pi, num_waypoints, endpoint=False)
+    return Path(radius * np.cos(theta), radius * np.sin(theta), theta + np.pi / 2, closed=True)
+
+
+def main():
+    """
+    Run the benchmark for growing waypoint spacings.
+    """
+    radius = 50.0
+    num_points = 100_000
+    rng = np.random.default_rng(0)
+
+    # Trajectory scattered around the circle like a vehicle in lane
+    theta = rng.uniform(0.0, 2 * np.pi, num_points)
+    offset = rng.normal(scale=0.3, size=num_points)
+    x = (radius + offset) * np.cos(theta)
+    y = (radius + offset) * np.sin(theta)
+
+    print("="*78)
+    print("CROSS-TRACK METRIC BENCHMARK")
+    print("="*78)
+    print(f"{'Spacing (m)':>11} {'Nearest err (m)':>16} {'Proj err (m)':>13} "
+          f"{'Scalar (us)':>12} {'Batch (us)':>11}")
+    print("-"*78)
+
+    for spacing in (0.5, 1.0, 2.0, 4.0):
+        path = circular_path(radius, spacing)
+        idx, nearest_distance = path.index.nearest_batch(x, y)
+
+        start = time.perf_counter()
+        errors, _, _ = path.cross_track_batch(x, y)
+        batch_us = (time.perf_counter() - start) / num_points * 1e6
+
+        sample = range(2000)
+        start = time.perf_counter()
+        scalar = [path.cross_track(x[i], y[i], int(idx[i])) for i in sample]
+        scalar_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+        # Sanity check: per-tick and whole-trajectory results agree
+        assert np.allclose([e for e, _, _ in scalar], errors[:len(sample)])
+
+        # The true distance to the circle is |offset|
+        nearest_bias = np.mean(np.abs(nearest_distance - np.abs(offset)))
+        projection_bias = np.mean(np.abs(np.abs(errors) - np.abs(offset)))
+        assert projection_bias < nearest_bias
+
+        print(f"{spacing:>11.1f} {nearest_bias:>16.3f} {projection_bias:>13.4f} "
+              f"{scalar_us:>12.1f} {batch_us:>11.2f}")
+
+    print("-"*78)
+    print("Errors are mean absolute deviations from the true distance to the circle.")
+
+
+if __name__ == '__main__':
+    main()
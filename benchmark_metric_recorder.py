@@ -0,0 +1,219 @@
+"""
+Metric Logging Benchmark
+Compares logging the extended runner's per-tick metrics into Python lists
+(with a position dict per tick) against the columnar MetricRecorder: per-tick
+cost, summary statistics, export to the binary results format and memory held
+"""
+
+import io
+import json
+import time
+import tracemalloc
+import numpy as np
+
+from experiment_runner_extended import HYBRID_CHANNELS
+from metric_recorder import (PATH_CHANNELS, POSITION_CHANNELS, TRACE_CHANNELS, YAW_CHANNELS,
+                             MetricRecorder, trace_fields)
+from result_format import pack_traces, split_traces
+
+
+# One row of the extended runner, in append order
+CHANNELS = TRACE_CHANNELS + POSITION_CHANNELS + PATH_CHANNELS + YAW_CHANNELS + HYBRID_CHANNELS
+
+# Channels logged as lists next to the position dicts
+LIST_CHANNELS = TRACE_CHANNELS + PATH_CHANNELS + YAW_CHANNELS + HYBRID_CHANNELS
+
+ACTIVE_CONTROLLERS = ('Pure Pursuit', 'Stanley', 'Blended')
+
+
+def make_ticks(num_ticks, seed=0):
+    """
+    Per-tick values with the types the extended runner logs: NumPy scalars
+    for the errors and yaw, Python floats for the rest, and the active
+    controller label.
+
+    Returns:
+        list: One tuple per tick, in CHANNELS order
+    """
+    rng = np.random.default_rng(seed)
+    lateral = rng.random(num_ticks)
+    heading = rng.normal(0.0, 5.0, num_ticks)
+    yaw = rng.uniform(-np.pi, np.pi, num_ticks)
+    values = rng.random((num_ticks, 10)).tolist()
+    active = rng.integers(len(ACTIVE_CONTROLLERS), size=num_ticks).tolist()
+    ticks = []
+    for i in range(num_ticks):
+        steer, speed, elapsed, x, y, z, cross_track, arc_length, curvature, weight = values[i]
+        ticks.append((lateral[i], heading[i], steer, speed, elapsed, x, y, z, cross_track,
+                      arc_length, yaw[i], curvature, ACTIVE_CONTROLLERS[active[i]], weight))
+    return ticks
+
+
+def log_lists(ticks):
+    """
+    Reference logging, as the runners used to do it.
+
+    Returns:
+        dict: Logged traces
+    """
+    metrics = {name: [] for name in LIST_CHANNELS}
+    metrics['positions'] = []
+    for (lateral, heading, steer, speed, elapsed, x, y, z, cross_track, arc_length, yaw,
+         curvature, active, weight) in ticks:
+        metrics['lateral_errors'].append(lateral)
+        metrics['heading_errors'].append(heading)
+        metrics['steering_angles'].append(steer)
+        metrics['speeds'].append(speed)
+        metrics['timestamps'].append(elapsed)
+        metrics['positions'].append({'x': x, 'y': y, 'z': z})
+        metrics['cross_track_errors'].append(cross_track)
+        metrics['arc_lengths'].append(arc_length)
+        metrics['yaws'].append(yaw)
+        metrics['curvatures'].append(curvature)
+        metrics['active_controllers'].append(active)
+        metrics['blend_weights'].append(weight)
+    return metrics
+
+
+def summarize_lists(metrics):
+    """
+    Reference summary statistics and results dict.
+
+    Returns:
+        dict: Metrics with their summary
+    """
+    metrics['summary'] = {
+        'mean_lateral_error': np.mean(metrics['lateral_errors']),
+        'max_lateral_error': np.max(metrics['lateral_errors']),
+        'std_lateral_error': np.std(metrics['lateral_errors']),
+        'mean_abs_heading_error': np.mean(np.abs(metrics['heading_errors'])),
+        'max_abs_heading_error': np.max(np.abs(metrics['heading_errors'])),
+        'steering_smoothness': np.std(np.diff(metrics['steering_angles'])),
+        'mean_speed': np.mean(metrics['speeds']),
+    }
+    return metrics
+
+
+def log_recorder(ticks):
+    """
+    Columnar logging, as the runners do it now.
+
+    Returns:
+        MetricRecorder: Logged traces
+    """
+    recorder = MetricRecorder(CHANNELS, capacity=len(ticks), labels=('active_controllers',))
+    label_code = recorder.label_code
+    for (lateral, heading, steer, speed, elapsed, x, y, z, cross_track, arc_length, yaw,
+         curvature, active, weight) in ticks:
+        recorder.append(lateral, heading, steer, speed, elapsed, x, y, z, cross_track,
+                        arc_length, yaw, curvature, label_code('active_controllers', active),
+                        weight)
+    return recorder
+
+
+def summarize_recorder(recorder):
+    """
+    Summary statistics on the columns and results dict.
+
+    Returns:
+        dict: Metrics with their summary
+    """
+    metrics = trace_fields(recorder)
+    lateral_errors = recorder['lateral_errors']
+    abs_heading_errors = np.abs(recorder['heading_errors'])
+    metrics['summary'] = {
+        'mean_lateral_error': np.mean(lateral_errors),
+        'max_lateral_error': np.max(lateral_errors),
+        'std_lateral_error': np.std(lateral_errors),
+        'mean_abs_heading_error': np.mean(abs_heading_errors),
+        'max_abs_heading_error': np.max(abs_heading_errors),
+        'steering_smoothness': np.std(np.diff(recorder['steering_angles'])),
+        'mean_speed': np.mean(recorder['speeds']),
+    }
+    return metrics
+
+
+def export(metrics):
+    """
+    Serialize a run the way save_result does (JSON sidecar and .npz traces),
+    in memory.
+    """
+    fields, traces = split_traces(metrics)
+    data, channels, labels = pack_traces(traces)
+    json.dumps(dict(fields, traces={'channels': channels, 'labels': labels}), indent=2,
+               default=float)
+    np.savez(io.BytesIO(), traces=data)
+
+
+def measure(log, summarize, ticks, repeats):
+    """
+    Best-of-repeats time of each stage and the memory held by the log.
+
+    Returns:
+        tuple: (log, summary, export seconds, logged bytes)
+    """
+    best = [float('inf')] * 3
+    for _ in range(repeats):
+        start = time.perf_counter()
+        logged = log(ticks)
+        logged_time = time.perf_counter()
+        metrics = summarize(logged)
+        summary_time = time.perf_counter()
+        export(metrics)
+        end = time.perf_counter()
+        stages = (logged_time - start, summary_time - logged_time, end - summary_time)
+        best = [min(b, t) for b, t in zip(best, stages)]
+
+    tracemalloc.start()
+    logged = log(ticks)
+    logged_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (*best, logged_bytes)
+
+
+def main(num_ticks=1200, repeats=20):
+    """
+    Log one 60 s experiment's worth of ticks both ways and report the costs.
+    """
+    ticks = make_ticks(num_ticks)
+
+    reference = summarize_lists(log_lists(ticks))
+    columnar = summarize_recorder(log_recorder(ticks))
+    for name in LIST_CHANNELS:
+        assert reference[name] == columnar[name], name
+    for name in POSITION_CHANNELS:
+        assert [p[name] for p in reference['positions']] == columnar['positions'][name], name
+    for name, value in reference['summary'].items():
+        assert np.isclose(value, columnar['summary'][name]), name
+
+    results = {
+        'Lists': measure(log_lists, summarize_lists, ticks, repeats),
+        'MetricRecorder': measure(log_recorder, summarize_recorder, ticks, repeats),
+    }
+
+    print("="*72)
+    print("METRIC LOGGING BENCHMARK")
+    print("="*72)
+    print(f"{'Method':<16} {'Log/tick (us)':>14} {'Summary (ms)':>13} "
+          f"{'Export (ms)':>12} {'Total/tick (us)':>16}")
+    print("-"*72)
+    for method, (log_time, summary_time, export_time, _) in results.items():
+        total = log_time + summary_time + export_time
+        print(f"{method:<16} {log_time / num_ticks * 1e6:>14.3f} {summary_time * 1e3:>13.3f} "
+              f"{export_time * 1e3:>12.2f} {total / num_ticks * 1e6:>16.2f}")
+    print("-"*72)
+    for method, (*_, logged_bytes) in results.items():
+        print(f"{method:<16} holds {logged_bytes / 1024:8.1f} KB of logged traces")
+
+    # Per-tick cost of one append, and of the whole run, against the lists
+    for stage, index in (('logging', slice(0, 1)), ('total', slice(0, 3))):
+        list_tick = sum(results['Lists'][index]) / num_ticks * 1e6
+        recorder_tick = sum(results['MetricRecorder'][index]) / num_ticks * 1e6
+        change = 'slower' if recorder_tick > list_tick else 'faster'
+        print(f"Per-tick {stage}: MetricRecorder is {abs(recorder_tick - list_tick):.3f} us "
+              f"({abs(recorder_tick / list_tick - 1):.0%}) {change} than lists.")
+    print(f"{num_ticks} ticks, {len(CHANNELS)} channels, best of {repeats}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Result Format Benchmark
+Compares file size and load time of the original all-JSON results (indent=2,
+one position dict per tick) against the binary format of result_format.py,
+on a 60 s hybrid experiment run on the local simulator
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from experiment_runner_extended import ExtendedExperimentRunner
+from hybrid_controller import HybridController
+from result_format import convert_json, load_result_file, trace_file
+
+
+def original_format(metrics):
+    """
+    Metrics as the runners used to save them: a position dict per tick.
+    """
+    positions = metrics['positions']
+    metrics = dict(metrics)
+    metrics['positions'] = [{'x': x, 'y': y, 'z': z}
+                            for x, y, z in zip(positions['x'], positions['y'], positions['z'])]
+    return metrics
+
+
+def best_time(function, repeats):
+    """
+    Best wall time of repeated calls.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(duration=60.0, repeats=20):
+    """
+    Run one experiment, save it in both formats and time loading each.
+    """
+    runner = ExtendedExperimentRunner(backend='local')
+    try:
+        runner.setup_world(town='Town01')
+        runner.generate_waypoints(distance=2.0)
+        runner.spawn_vehicle()
+        metrics = runner.run_experiment(HybridController(mode='adaptive'), 'Hybrid_Adaptive',
+                                        duration=duration)
+    finally:
+        runner.cleanup()
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, 'original.json')
+        binary_file = os.path.join(directory, 'binary.json')
+        with open(json_file, 'w') as f:
+            json.dump(original_format(metrics), f, indent=2)
+        shutil.copyfile(json_file, binary_file)
+        convert_json(binary_file)
+
+        json_size = os.path.getsize(json_file)
+        binary_size = os.path.getsize(binary_file) + os.path.getsize(trace_file(binary_file))
+
+        def load_json():
+            with open(json_file, 'r') as f:
+                return json.load(f)
+
+        loaded = load_result_file(binary_file)
+        assert loaded['summary'] == load_json()['summary']
+        for name in ('lateral_errors', 'heading_errors', 'steering_angles', 'speeds',
+                     'timestamps', 'curvatures', 'blend_weights'):
+            assert np.allclose(loaded[name], metrics[name], rtol=1e-6, atol=1e-5), name
+        assert loaded['active_controllers'] == metrics['active_controllers']
+
+        json_time = best_time(load_json, repeats)
+        binary_time = best_time(lambda: load_result_file(binary_file), repeats)
+
+    print("="*60)
+    print("RESULT FORMAT BENCHMARK")
+    print("="*60)
+    print(f"{'Format':<10} {'Size (KB)':>12} {'Load (ms)':>12}")
+    print("-"*60)
+    print(f"{'JSON':<10} {json_size / 1024:>12.1f} {json_time * 1e3:>12.3f}")
+    print(f"{'Binary':<10} {binary_size / 1024:>12.1f} {binary_time * 1e3:>12.3f}")
+    print("-"*60)
+    print(f"{len(metrics['timestamps'])} ticks. Binary files are "
+          f"{json_size / binary_size:.1f}x smaller and load {json_time / binary_time:.1f}x faster.")
+
+
+if __name__ == '__main__':
+    main()
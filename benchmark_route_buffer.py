@@ -0,0 +1,113 @@
+"""
+Route Buffer Benchmark
+Compares per-tick CARLA calls and time of regenerating the look-ahead waypoints
+against the sliding-window RouteBuffer used by run_experiments_camera.py
+"""
+
+import time
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
+
+from pure_pursuit import PurePursuitController
+from path_query import query_path
+from route_builder import RouteBuffer
+from vehicle_state import VehicleState
+from waypoint_path import ClosestPointTracker, Path
+
+
+def regenerate_waypoints(world, vehicle, num_waypoints=50, distance=2.0):
+    """
+    Reference per-tick regeneration, as the camera runner used to do it.
+
+    Returns:
+        tuple: (Path, number of CARLA calls issued)
+    """
+    current_map = world.get_map()
+    vehicle_location = vehicle.get_location()
+    waypoint = current_map.get_waypoint(vehicle_location)
+    calls = 3
+
+    waypoints = [waypoint]
+    for _ in range(num_waypoints - 1):
+        waypoint_list = waypoint.next(distance)
+        calls += 1
+        if waypoint_list:
+            waypoint = waypoint_list[0]
+            waypoints.append(waypoint)
+        else:
+            break
+
+    return Path.from_waypoints(waypoints), calls
+
+
+def main(ticks=400, num_waypoints=50, distance=2.0):
+    """
+    Drive one vehicle on the buffered route and time both approaches each tick.
+    """
+    client = carla.Client('localhost', 2000)
+    client.set_timeout(10.0)
+    world = client.get_world()
+
+    settings = world.get_settings()
+    settings.synchronous_mode = True
+    settings.fixed_delta_seconds = 0.05
+    world.apply_settings(settings)
+
+    carla_map = world.get_map()
+    blueprint = world.get_blueprint_library().filter('model3')[0]
+    vehicle = world.spawn_actor(blueprint, carla_map.get_spawn_points()[0])
+
+    controller = PurePursuitController()
+    tracker = ClosestPointTracker()
+    route = RouteBuffer(carla_map, num_waypoints=num_waypoints, spacing=distance)
+
+    regenerate_calls = 0
+    regenerate_time = 0.0
+    buffer_time = 0.0
+
+    try:
+        world.tick()
+        path = route.reset(vehicle.get_location())
+        buffer_calls_start = route.rpc_calls
+
+        for _ in range(ticks):
+            world.tick()
+
+            start = time.perf_counter()
+            _, calls = regenerate_waypoints(world, vehicle, num_waypoints, distance)
+            regenerate_time += time.perf_counter() - start
+            regenerate_calls += calls
+
+            state = VehicleState.capture(world, vehicle)
+            query = query_path(state, path, tracker)
+            vehicle.apply_control(controller.run_step_from_state(state, path))
+
+            start = time.perf_counter()
+            path = route.advance(query.closest_idx, query.closest_distance, query.location)
+            buffer_time += time.perf_counter() - start
+    finally:
+        vehicle.destroy()
+        settings.synchronous_mode = False
+        world.apply_settings(settings)
+
+    buffer_calls = route.rpc_calls - buffer_calls_start
+
+    print("="*60)
+    print("LOOK-AHEAD WAYPOINT BENCHMARK")
+    print("="*60)
+    print(f"{'Method':<14} {'Calls/tick':>12} {'Time/tick (ms)':>16}")
+    print("-"*60)
+    print(f"{'Regenerate':<14} {regenerate_calls / ticks:>12.1f} "
+          f"{regenerate_time / ticks * 1e3:>16.3f}")
+    print(f"{'RouteBuffer':<14} {buffer_calls / ticks:>12.1f} "
+          f"{buffer_time / ticks * 1e3:>16.3f}")
+    print("-"*60)
+    print(f"{ticks} ticks, {num_waypoints} waypoints at {distance:g} m spacing. "
+          f"Calls count get_map, get_location, get_waypoint and Waypoint.next.")
+
+
+if __name__ == '__main__':
+    main()
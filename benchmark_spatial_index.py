@@ -0,0 +1,129 @@
+"""
+Spatial Index Benchmark
+Compares per-tick closest-waypoint cost of a linear scan against the grid index
+(alone, and with its vectorized-scan fallback for small indexes)
+"""
+
+import math
+import time
+import numpy as np
+
+from spatial_index import SCAN_THRESHOLD, WaypointIndex
+
+
+def generate_road_network(num_waypoints, spacing=2.0, block=200.0, seed=0):
+    """
+    Generate a synthetic Manhattan-style road network sampled at fixed spacing.
+
+    Args:
+        num_waypoints (int): Approximate number of waypoints to generate
+        spacing (float): Distance between consecutive waypoints (meters)
+        block (float): Distance between parallel roads (meters)
+        seed (int): Random seed for the lane offset jitter
+
+    Returns:
+        tuple: (xs, ys) arrays of waypoint coordinates
+    """
+    rng = np.random.default_rng(seed)
+    # 2 * R roads of length R * block hold 2 * R^2 * block / spacing points
+    roads_per_axis = max(1, math.ceil(math.sqrt(num_waypoints * spacing / (2 * block))))
+    extent = roads_per_axis * block
+
+    xs, ys = [], []
+    along = np.arange(0.0, extent, spacing)
+    for r in range(roads_per_axis):
+        offset = r * block
+        # Horizontal road
+        xs.append(along)
+        ys.append(np.full_like(along, offset))
+        # Vertical road
+        xs.append(np.full_like(along, offset))
+        ys.append(along)
+
+    xs = np.concatenate(xs)[:num_waypoints]
+    ys = np.concatenate(ys)[:num_waypoints]
+    jitter = rng.normal(scale=0.05, size=(2, len(xs)))
+    return xs + jitter[0], ys + jitter[1]
+
+
+def linear_scan(xs, ys, x, y):
+    """Reference O(N) scan, one distance call per waypoint like the original loops."""
+    min_distance = float('inf')
+    closest_idx = 0
+    for i in range(len(xs)):
+        distance = math.hypot(xs[i] - x, ys[i] - y)
+        if distance < min_distance:
+            min_distance = distance
+            closest_idx = i
+    return closest_idx, min_distance
+
+
+def time_queries(fn, queries, repeat=1):
+    """
+    Time a query function.
+
+    Returns:
+        float: Mean time per query in microseconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for qx, qy in queries:
+            fn(qx, qy)
+    elapsed = time.perf_counter() - start
+    return elapsed / (len(queries) * repeat) * 1e6
+
+
+def main():
+    """
+    Run the benchmark for growing waypoint counts.
+    """
+    # Closest-waypoint scans per tick in hybrid blending mode plus runner logging
+    scans_per_tick = 4
+    sizes = [1_000, 3_000, 10_000, 30_000, 100_000]
+    rng = np.random.default_rng(1)
+
+    print("="*89)
+    print("CLOSEST-WAYPOINT QUERY BENCHMARK")
+    print("="*89)
+    print(f"{'Waypoints':>10} {'Build (ms)':>11} {'Scan (us)':>11} {'NumPy (us)':>11} "
+          f"{'Grid (us)':>11} {'Index (us)':>11} {'Tick idx (us)':>14}")
+    print("-"*89)
+
+    for n in sizes:
+        xs, ys = generate_road_network(n)
+        xs_list, ys_list = xs.tolist(), ys.tolist()
+
+        start = time.perf_counter()
+        index = WaypointIndex(xs, ys)
+        build_ms = (time.perf_counter() - start) * 1e3
+        grid = WaypointIndex(xs, ys, scan_threshold=0)
+
+        # Query near random waypoints with a lateral offset, like a vehicle in lane
+        picks = rng.integers(0, len(xs), size=200)
+        queries = list(zip(xs[picks] + rng.normal(scale=1.0, size=200),
+                           ys[picks] + rng.normal(scale=1.0, size=200)))
+
+        # Sanity check against the reference scan
+        for qx, qy in queries[:20]:
+            _, d_ref = linear_scan(xs_list, ys_list, qx, qy)
+            for fn in (index.nearest, grid.nearest):
+                assert abs(d_ref - fn(qx, qy)[1]) < 1e-9
+
+        scan_us = time_queries(lambda qx, qy: linear_scan(xs_list, ys_list, qx, qy),
+                               queries[:20])
+        numpy_us = time_queries(
+            lambda qx, qy: np.argmin((xs - qx)**2 + (ys - qy)**2), queries
+        )
+        grid_us = time_queries(grid.nearest, queries, repeat=5)
+        index_us = time_queries(index.nearest, queries, repeat=5)
+
+        print(f"{len(xs):>10} {build_ms:>11.2f} {scan_us:>11.1f} {numpy_us:>11.1f} "
+              f"{grid_us:>11.1f} {index_us:>11.1f} {index_us * scans_per_tick:>14.1f}")
+
+    print("-"*89)
+    print(f"Index scans below {SCAN_THRESHOLD} waypoints and uses the grid above.")
+    print(f"Tick column assumes {scans_per_tick} closest-waypoint queries per control tick.")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,45 +3,71 @@ Evaluation and Visualization Script
 Generates plots and analysis from experiment results
 """
 
+import math
 import os
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 
+from results_index import ResultsIndex
+
 
 def load_results(results_dir='results'):
     """
-    Load all experiment results from JSON files.
+    Load all experiment results, in the binary format (JSON summaries with
+    .npz traces) or as the original all-JSON files.
+    
+    Summaries come from the results index; the traces of a result are only
+    read when a plot first accesses them.
     
     Args:
         results_dir (str): Directory containing result files
         
     Returns:
-        list: List of metrics dictionaries
+        list: List of metrics mappings
     """
     results = []
+    results_index = ResultsIndex(results_dir)
     
     # Try to load combined results first
     combined_file = os.path.join(results_dir, 'all_experiments.json')
     if os.path.exists(combined_file):
-        with open(combined_file, 'r') as f:
-            results = json.load(f)
+        results = results_index.load('all_experiments.json')
         print(f"Loaded {len(results)} experiments from {combined_file}")
         return results
     
     # Otherwise load individual files
     for filename in os.listdir(results_dir):
         if filename.endswith('.json') and filename != 'all_experiments.json':
-            filepath = os.path.join(results_dir, filename)
-            with open(filepath, 'r') as f:
-                results.append(json.load(f))
+            results.append(results_index.load(filename))
     
     print(f"Loaded {len(results)} experiments from individual files")
     return results
 
 
+def drop_empty_runs(results):
+    """
+    Leave out runs that ended before their first tick. Their statistics are
+    null (NaN in files written before that), so they cannot be plotted or
+    ranked; they are listed as failed instead.
+    
+    Args:
+        results (list): List of metrics mappings
+        
+    Returns:
+        list: Results with at least one logged tick
+    """
+    kept = []
+    for result in results:
+        value = result['summary'].get('mean_lateral_error')
+        if value is None or math.isnan(value):
+            print(f"Skipping {result['experiment_name']}: failed, no ticks logged")
+        else:
+            kept.append(result)
+    return kept
+
+
 def plot_lateral_error_comparison(results, output_dir='plots'):
     """
     Plot lateral error over time for all experiments.
@@ -338,7 +364,7 @@ def main():
     Main function to generate all plots and analysis.
     """
     print("Loading experiment results...")
-    results = load_results('results')
+    results = drop_empty_runs(load_results('results'))
     
     if not results:
         print("No results found! Run experiment_runner.py first.")
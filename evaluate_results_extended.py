@@ -3,45 +3,72 @@ Extended Evaluation and Visualization Script
 Analyzes results including hybrid controller performance
 """
 
+import argparse
+import math
 import os
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')
 
+from results_index import ResultsIndex
+
 
 def load_results(results_dir='results'):
     """
-    Load all experiment results from JSON files.
+    Load all experiment results, in the binary format (JSON summaries with
+    .npz traces) or as the original all-JSON files.
+    
+    Summaries come from the results index; the traces of a result are only
+    read when a plot first accesses them.
     
     Args:
         results_dir (str): Directory containing result files
         
     Returns:
-        list: List of metrics dictionaries
+        list: List of metrics mappings
     """
     results = []
+    results_index = ResultsIndex(results_dir)
     
     # Try to load combined results first
     combined_file = os.path.join(results_dir, 'all_experiments_extended.json')
     if os.path.exists(combined_file):
-        with open(combined_file, 'r') as f:
-            results = json.load(f)
+        results = results_index.load('all_experiments_extended.json')
         print(f"Loaded {len(results)} experiments from {combined_file}")
         return results
     
     # Otherwise load individual files
     for filename in os.listdir(results_dir):
         if filename.endswith('.json') and 'all_experiments' not in filename:
-            filepath = os.path.join(results_dir, filename)
-            with open(filepath, 'r') as f:
-                results.append(json.load(f))
+            results.append(results_index.load(filename))
     
     print(f"Loaded {len(results)} experiments from individual files")
     return results
 
 
+def drop_empty_runs(results):
+    """
+    Leave out runs that ended before their first tick. Their statistics are
+    null (NaN in files written before that), so they cannot be plotted or
+    ranked; they are listed as failed instead.
+    
+    Args:
+        results (list): List of metrics mappings
+        
+    Returns:
+        list: Results with at least one logged tick
+    """
+    kept = []
+    for result in results:
+        value = result['summary'].get('mean_lateral_error')
+        if value is None or math.isnan(value):
+            print(f"Skipping {result['experiment_name']}: failed, no ticks logged")
+        else:
+            kept.append(result)
+    return kept
+
+
 def plot_all_controllers_comparison(results, output_dir='plots'):
     """
     Plot comprehensive comparison including hybrid controllers.
@@ -165,9 +192,9 @@ def plot_hybrid_controller_analysis(results, output_dir='plots'):
     # Plot 1: Curvature over time
     ax = axes[0, 0]
     for i, result in enumerate(hybrid_results):
-        if 'curvatures' in result and result['curvatures']:
+        if 'curvatures' in result and len(result['curvatures']):
             ax.plot(result['timestamps'], result['curvatures'],
-                   label=result['experiment_name'], color=colors[i], linewidth=2)
+                   label=result['experiment_name'], color=colors[i % len(colors)], linewidth=2)
     ax.set_xlabel('Time (s)', fontsize=12)
     ax.set_ylabel('Path Curvature (1/m)', fontsize=12)
     ax.set_title('Path Curvature Detection', fontsize=14, fontweight='bold')
@@ -178,9 +205,9 @@ def plot_hybrid_controller_analysis(results, output_dir='plots'):
     ax = axes[0, 1]
     for i, result in enumerate(hybrid_results):
         if 'blending' in result['experiment_name'].lower():
-            if 'blend_weights' in result and result['blend_weights']:
+            if 'blend_weights' in result and len(result['blend_weights']):
                 ax.plot(result['timestamps'], result['blend_weights'],
-                       label=result['experiment_name'], color=colors[i], linewidth=2)
+                       label=result['experiment_name'], color=colors[i % len(colors)], linewidth=2)
                 ax.axhline(y=0.5, color='gray', linestyle='--', alpha=0.5, label='Equal blend')
                 ax.fill_between(result['timestamps'], 0, result['blend_weights'],
                                alpha=0.3, label='Stanley dominance')
@@ -213,7 +240,7 @@ def plot_hybrid_controller_analysis(results, output_dir='plots'):
     # Plot hybrid
     for i, result in enumerate(hybrid_results):
         ax.plot(result['timestamps'], result['lateral_errors'],
-               label=result['experiment_name'], color=colors[i], linewidth=2.5)
+               label=result['experiment_name'], color=colors[i % len(colors)], linewidth=2.5)
     
     ax.set_xlabel('Time (s)', fontsize=12)
     ax.set_ylabel('Lateral Error (m)', fontsize=12)
@@ -399,8 +426,14 @@ def main():
     """
     Main function to generate all extended plots and analysis.
     """
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--results-dir', default='results',
+                           help='directory with the experiment results (e.g. results/search)')
+    argparser.add_argument('--plots-dir', default='plots', help='output directory')
+    args = argparser.parse_args()
+    
     print("Loading experiment results...")
-    results = load_results('results')
+    results = drop_empty_runs(load_results(args.results_dir))
     
     if not results:
         print("No results found! Run experiment_runner_extended.py first.")
@@ -409,9 +442,9 @@ def main():
     print(f"\nGenerating extended analysis for {len(results)} experiments...")
     
     # Generate all plots
-    plot_all_controllers_comparison(results)
-    plot_hybrid_controller_analysis(results)
-    generate_extended_summary_table(results)
+    plot_all_controllers_comparison(results, args.plots_dir)
+    plot_hybrid_controller_analysis(results, args.plots_dir)
+    generate_extended_summary_table(results, args.plots_dir)
     
     print("\n" + "="*60)
     print("EXTENDED EVALUATION COMPLETE")
@@ -3,11 +3,11 @@ Experiment Runner for Pure Pursuit vs Stanley Controller Comparison
 Runs experiments with different hyperparameters and logs performance metrics
 """
 
+import argparse
 import glob
 import os
 import sys
 import time
-import json
 import numpy as np
 from datetime import datetime
 
@@ -19,10 +19,27 @@ try:
 except IndexError:
     pass
 
-import carla
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
 
+import local_sim
 from pure_pursuit import PurePursuitController
 from stanley import StanleyController
+from path_query import query_path
+from abort_criteria import NO_DATA, AbortCriteria
+from metric_recorder import (PATH_CHANNELS, POSITION_CHANNELS, STREAM_SUFFIX, TRACE_CHANNELS,
+                             TRACE_STREAM_DIR, YAW_CHANNELS, MetricRecorder, StreamingRecorder,
+                             trace_fields)
+from online_stats import RunSummary
+from result_cache import ResultCache, describe_controller, path_hash, source_hash
+from result_format import save_result, save_result_list
+from results_index import ResultsIndex
+from route_builder import load_or_build_route
+from vehicle_state import RpcCounter, VehicleState
+from waypoint_path import ClosestPointTracker
 
 
 class ExperimentRunner:
@@ -31,20 +48,37 @@ class ExperimentRunner:
     Logs metrics for evaluation and comparison.
     """
     
-    def __init__(self, host='localhost', port=2000):
+    def __init__(self, host='localhost', port=2000, backend='carla', result_cache=None,
+                 stream_dir=None):
         """
         Initialize experiment runner.
         
         Args:
             host (str): CARLA server host
             port (int): CARLA server port
+            backend (str): 'carla' for a CARLA server, 'local' for the offline
+                kinematic-bicycle simulator
+            result_cache (ResultCache): Serve unchanged experiments from this
+                cache and add new ones to it (None to always simulate)
+            stream_dir (str): Stream each run's traces to disk in this
+                directory as it proceeds (None to keep them in memory)
         """
-        self.client = carla.Client(host, port)
+        self.backend = backend
+        self.result_cache = result_cache
+        self.stream_dir = stream_dir
+        self.client = local_sim.connect(backend, host, port)
         self.client.set_timeout(10.0)
         self.world = None
         self.vehicle = None
         self.spawn_point = None
-        self.waypoints = []
+        self.spawn_index = 0
+        self.town = None
+        self.path = None
+        self.route_spacing = None
+        self.route_length = None
+        self.vehicle_type = None
+        self.tracker = ClosestPointTracker()
+        self.rpc_counter = RpcCounter()
         
     def setup_world(self, town='Town01', weather=carla.WeatherParameters.ClearNoon):
         """
@@ -56,6 +90,7 @@ class ExperimentRunner:
         """
         print(f"Loading world: {town}")
         self.world = self.client.load_world(town)
+        self.town = town
         self.world.set_weather(weather)
         
         # Set synchronous mode for deterministic simulation
@@ -66,17 +101,26 @@ class ExperimentRunner:
         
         print("World setup complete")
         
-    def generate_waypoints(self, distance=2.0):
+    def generate_waypoints(self, distance=2.0, route_length=1000.0):
         """
-        Generate waypoints along the road using CARLA map.
+        Build an ordered route from the spawn point using CARLA map.
+        
+        The route is cached on disk per backend, town, spawn point and
+        spacing, so repeated runs skip route generation.
         
         Args:
             distance (float): Distance between waypoints
+            route_length (float): Maximum route length (meters)
         """
         print("Generating waypoints...")
-        carla_map = self.world.get_map()
-        self.waypoints = carla_map.generate_waypoints(distance)
-        print(f"Generated {len(self.waypoints)} waypoints")
+        self.route_spacing = distance
+        self.route_length = route_length
+        self.path = load_or_build_route(
+            self.world, self.town, self.spawn_index,
+            spacing=distance, length=route_length, backend=self.backend
+        )
+        loop = " (closed loop)" if self.path.closed else ""
+        print(f"Generated {len(self.path)} waypoints, {self.path.length:.0f} m{loop}")
         
     def spawn_vehicle(self, vehicle_type='vehicle.tesla.model3'):
         """
@@ -90,10 +134,11 @@ class ExperimentRunner:
         
         # Get spawn points
         spawn_points = self.world.get_map().get_spawn_points()
-        self.spawn_point = spawn_points[0]  # Use first spawn point
+        self.spawn_point = spawn_points[self.spawn_index]  # Route starts here
         
         # Spawn vehicle
         self.vehicle = self.world.spawn_actor(vehicle_bp, self.spawn_point)
+        self.vehicle_type = vehicle_type
         print(f"Spawned vehicle: {vehicle_type}")
         
         # Let the vehicle settle
@@ -113,14 +158,18 @@ class ExperimentRunner:
             settings.synchronous_mode = False
             self.world.apply_settings(settings)
     
-    def run_experiment(self, controller, experiment_name, duration=60.0):
+    def run_experiment(self, controller, experiment_name, duration=60.0, num_ticks=None,
+                       abort_criteria=None):
         """
         Run a single experiment with a given controller.
         
         Args:
             controller: Controller instance (PurePursuitController or StanleyController)
             experiment_name (str): Name for this experiment
-            duration (float): Experiment duration in seconds
+            duration (float): Experiment duration in simulated seconds
+            num_ticks (int): Number of simulation ticks (overrides duration)
+            abort_criteria (AbortCriteria): Stop diverged runs early and mark
+                them failed (None to always run the full duration)
             
         Returns:
             dict: Logged metrics
@@ -129,9 +178,34 @@ class ExperimentRunner:
         print(f"Running experiment: {experiment_name}")
         print(f"{'='*60}")
         
+        # Run length in ticks, so it does not depend on how fast the
+        # simulator and client are
+        if num_ticks is None:
+            delta_seconds = self.world.get_settings().fixed_delta_seconds
+            num_ticks = int(round(duration / delta_seconds))
+        
+        # Start from a clean controller
+        if hasattr(controller, 'reset'):
+            controller.reset()
+        
+        # Serve unchanged experiments from the result cache
+        cache_key = None
+        if self.result_cache is not None:
+            cache_fields = self.experiment_key_fields(controller, num_ticks, abort_criteria)
+            cache_key = self.result_cache.key(cache_fields)
+            cached = self.result_cache.load(cache_key)
+            if cached is not None:
+                cached['experiment_name'] = experiment_name
+                print(f"Loaded cached result {cache_key[:12]} "
+                      f"(mean lateral error {cached['summary']['mean_lateral_error']:.3f} m)")
+                return cached
+        
         # Reset vehicle to spawn point
         self.vehicle.set_transform(self.spawn_point)
         
+        # The vehicle was teleported, so drop any warm-started path matches
+        self.tracker.reset()
+        
         # Apply brake to stop vehicle (CARLA 0.9.15 compatible)
         control = carla.VehicleControl()
         control.brake = 1.0
@@ -142,111 +216,192 @@ class ExperimentRunner:
         for _ in range(20):
             self.world.tick()
         
-        # Data logging
+        # Data logging (one preallocated row per tick, or fixed-size chunks
+        # written to disk during the run when streaming)
         metrics = {
             'experiment_name': experiment_name,
             'timestamp': datetime.now().isoformat(),
-            'lateral_errors': [],
-            'heading_errors': [],
-            'steering_angles': [],
-            'speeds': [],
-            'timestamps': [],
-            'positions': [],
+            # Which cached route the trajectory was driven on
+            'route': {
+                'backend': self.backend,
+                'town': self.town,
+                'spawn_index': self.spawn_index,
+                'spacing': self.route_spacing,
+                'length': self.route_length,
+            },
         }
+        if self.stream_dir is None:
+            recorder = MetricRecorder(
+                TRACE_CHANNELS + POSITION_CHANNELS + PATH_CHANNELS + YAW_CHANNELS,
+                capacity=num_ticks
+            )
+        else:
+            recorder = StreamingRecorder(
+                TRACE_CHANNELS + POSITION_CHANNELS + PATH_CHANNELS + YAW_CHANNELS,
+                os.path.join(self.stream_dir, experiment_name + STREAM_SUFFIX),
+                metadata=metrics
+            )
+        
+        # Summary statistics, updated every tick
+        run_summary = RunSummary()
+        
+        # Count CARLA calls from here on (settling ticks excluded)
+        self.rpc_counter.reset()
+        state = VehicleState.capture(self.world, self.vehicle, self.rpc_counter)
+        start_timestamp = state.timestamp
+        
+        if abort_criteria is not None:
+            abort_criteria.reset()
+        failure = None
+        interrupted = False
         
         start_time = time.time()
         step = 0
         
         try:
-            while time.time() - start_time < duration:
+            while step < num_ticks:
                 # Get control command from controller
-                control = controller.run_step(self.vehicle, self.waypoints)
+                control = controller.run_step_from_state(state, self.path)
                 self.vehicle.apply_control(control)
+                self.rpc_counter.add('apply_control')
                 
                 # Tick simulation
                 self.world.tick()
+                self.rpc_counter.tick()
+                
+                # One snapshot per tick: used for logging here and by the
+                # controller on the next iteration
+                state = VehicleState.capture(self.world, self.vehicle, self.rpc_counter)
+                query = query_path(state, self.path, self.tracker)
+                vehicle_transform = query.transform
+                vehicle_location = query.location
+                closest_idx = query.closest_idx
+                
+                # Lateral error (cross-track error), measured to the
+                # path segments rather than to the nearest waypoint
+                cross_track_error, arc_length, path_yaw = self.path.cross_track(
+                    vehicle_location.x, vehicle_location.y, closest_idx
+                )
+                lateral_error = abs(cross_track_error)
                 
-                # Log metrics
-                vehicle_transform = self.vehicle.get_transform()
-                vehicle_location = vehicle_transform.location
+                # Heading error against the path heading at the projection
+                vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
+                heading_error = path_yaw - vehicle_yaw
+                heading_error = np.degrees(np.arctan2(np.sin(heading_error), np.cos(heading_error)))
                 
-                # Find closest waypoint for error calculation
-                min_distance = float('inf')
-                closest_waypoint = None
-                for waypoint in self.waypoints:
-                    distance = vehicle_location.distance(waypoint.transform.location)
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_waypoint = waypoint
+                # Log data
+                recorder.append(
+                    lateral_error, heading_error, control.steer, query.speed,
+                    state.timestamp - start_timestamp,
+                    vehicle_location.x, vehicle_location.y, vehicle_location.z,
+                    cross_track_error, arc_length, vehicle_yaw
+                )
                 
-                if closest_waypoint is not None:
-                    # Lateral error (cross-track error)
-                    lateral_error = min_distance
-                    
-                    # Heading error
-                    vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
-                    waypoint_yaw = np.radians(closest_waypoint.transform.rotation.yaw)
-                    heading_error = waypoint_yaw - vehicle_yaw
-                    heading_error = np.arctan2(np.sin(heading_error), np.cos(heading_error))
-                    
-                    # Log data
-                    metrics['lateral_errors'].append(lateral_error)
-                    metrics['heading_errors'].append(np.degrees(heading_error))
-                    metrics['steering_angles'].append(control.steer)
-                    
-                    velocity = self.vehicle.get_velocity()
-                    speed = np.sqrt(velocity.x**2 + velocity.y**2 + velocity.z**2)
-                    metrics['speeds'].append(speed)
-                    
-                    metrics['timestamps'].append(time.time() - start_time)
-                    metrics['positions'].append({
-                        'x': vehicle_location.x,
-                        'y': vehicle_location.y,
-                        'z': vehicle_location.z
-                    })
+                run_summary.update(lateral_error, heading_error, control.steer, query.speed)
+                
+                if abort_criteria is not None:
+                    failure = abort_criteria.update(lateral_error, heading_error, query.speed)
                 
                 step += 1
                 
+                if failure is not None:
+                    print(f"\nAborting {experiment_name} at step {step}: {failure} bound exceeded")
+                    break
+                
                 # Print progress
                 if step % 50 == 0:
-                    print(f"Step {step}, Time: {time.time() - start_time:.2f}s")
+                    print(f"Step {step}/{num_ticks}, Sim time: {state.timestamp - start_timestamp:.2f}s, "
+                          f"Mean lateral error: {run_summary.lateral_errors.mean:.3f} m")
         
         except KeyboardInterrupt:
             print("\nExperiment interrupted by user")
+            interrupted = True
+        
+        finally:
+            # Writes out the last chunk of a streamed trace, even on errors
+            recorder.close()
         
-        # Compute summary statistics
-        metrics['summary'] = {
-            'mean_lateral_error': np.mean(metrics['lateral_errors']),
-            'max_lateral_error': np.max(metrics['lateral_errors']),
-            'std_lateral_error': np.std(metrics['lateral_errors']),
-            'mean_abs_heading_error': np.mean(np.abs(metrics['heading_errors'])),
-            'max_abs_heading_error': np.max(np.abs(metrics['heading_errors'])),
-            'steering_smoothness': np.std(np.diff(metrics['steering_angles'])) if len(metrics['steering_angles']) > 1 else 0,
-            'mean_speed': np.mean(metrics['speeds']),
+        metrics.update(trace_fields(recorder))
+        
+        # A run without a single logged tick has no statistics (None in the
+        # summary) and counts as failed, so rankings skip it
+        if not run_summary.count and failure is None:
+            failure = NO_DATA
+        
+        metrics['summary'] = run_summary.summary()
+        metrics['summary'].update({
             'total_steps': step,
-            'total_time': time.time() - start_time
-        }
+            'failed': failure is not None,
+            'failure_reason': failure,
+            'total_time': state.timestamp - start_timestamp,
+            'wall_time': time.time() - start_time,
+            'rpcs_per_tick': self.rpc_counter.total_per_tick(),
+            'rpc_calls_per_tick': self.rpc_counter.per_tick()
+        })
         
         print(f"\nExperiment complete: {experiment_name}")
-        print(f"Mean Lateral Error: {metrics['summary']['mean_lateral_error']:.3f} m")
-        print(f"Mean Heading Error: {metrics['summary']['mean_abs_heading_error']:.3f}°")
-        print(f"Steering Smoothness (std): {metrics['summary']['steering_smoothness']:.4f}")
+        if run_summary.count:
+            print(f"Mean Lateral Error: {metrics['summary']['mean_lateral_error']:.3f} m")
+            print(f"Mean Heading Error: {metrics['summary']['mean_abs_heading_error']:.3f}°")
+            print(f"Steering Smoothness (std): {metrics['summary']['steering_smoothness']:.4f}")
+        else:
+            print("No ticks logged")
+        print(f"CARLA calls per tick: {metrics['summary']['rpcs_per_tick']:.2f}")
+        
+        # Partial and empty runs are never cached
+        if cache_key is not None and not interrupted and run_summary.count:
+            self.result_cache.store(cache_key, cache_fields, metrics)
         
         return metrics
     
+    def experiment_key_fields(self, controller, num_ticks, abort_criteria=None):
+        """
+        Everything that determines an experiment's outcome, for its result
+        cache key.
+        
+        Args:
+            controller: Controller instance
+            num_ticks (int): Number of simulation ticks
+            abort_criteria (AbortCriteria): Early termination criteria
+            
+        Returns:
+            dict: JSON-serializable key fields
+        """
+        spawn = self.spawn_point
+        return {
+            'controller': describe_controller(controller),
+            'source': source_hash(type(controller), type(self)),
+            'backend': self.backend,
+            'town': self.town,
+            'spawn_index': self.spawn_index,
+            'spawn_point': [spawn.location.x, spawn.location.y, spawn.location.z,
+                            spawn.rotation.yaw],
+            'route_spacing': self.route_spacing,
+            'route_length': self.route_length,
+            'route': path_hash(self.path),
+            'vehicle': self.vehicle_type,
+            'fixed_delta_seconds': self.world.get_settings().fixed_delta_seconds,
+            'num_ticks': num_ticks,
+            'abort_criteria': None if abort_criteria is None else abort_criteria.config(),
+        }
+    
     def save_metrics(self, metrics, filename):
         """
-        Save metrics to JSON file.
+        Save metrics in the binary results format (result_format.py): a JSON
+        file with the summary and a .npz file with the per-tick traces.
         
         Args:
-            metrics (dict): Metrics dictionary
-            filename (str): Output filename
+            metrics (dict or list): Metrics of one experiment, or a list of
+                them for a combined file
+            filename (str): Output filename (.json)
         """
         os.makedirs('results', exist_ok=True)
         filepath = os.path.join('results', filename)
         
-        with open(filepath, 'w') as f:
-            json.dump(metrics, f, indent=2)
+        if isinstance(metrics, list):
+            save_result_list(metrics, filepath)
+        else:
+            save_result(metrics, filepath)
         
         print(f"Metrics saved to: {filepath}")
 
@@ -255,7 +410,27 @@ def main():
     """
     Main function to run all experiments.
     """
-    runner = ExperimentRunner()
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--backend', choices=local_sim.BACKENDS, default='carla',
+        help="simulator backend: a CARLA server or the offline kinematic-bicycle simulator")
+    argparser.add_argument('--host', default='localhost', help='CARLA server host')
+    argparser.add_argument('--port', type=int, default=2000, help='CARLA server port')
+    argparser.add_argument('--no-abort', action='store_true',
+                           help='run diverging experiments for the full duration')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help='re-simulate experiments that have cached results')
+    argparser.add_argument('--stream', action='store_true',
+                           help='write traces to results/.traces in chunks during each run')
+    args = argparser.parse_args()
+    
+    runner = ExperimentRunner(args.host, args.port, backend=args.backend,
+                              result_cache=None if args.no_cache else ResultCache(),
+                              stream_dir=os.path.join('results', TRACE_STREAM_DIR) if args.stream else None)
+    abort_criteria = None if args.no_abort else AbortCriteria()
+    
+    # Summaries of the saved files, read by the evaluation scripts
+    results_index = ResultsIndex('results')
     
     try:
         # Setup
@@ -276,10 +451,12 @@ def main():
             metrics = runner.run_experiment(
                 controller,
                 f"PurePursuit_Ld{ld}",
-                duration=60.0
+                duration=60.0,
+                abort_criteria=abort_criteria
             )
             all_metrics.append(metrics)
             runner.save_metrics(metrics, f'pure_pursuit_ld{ld}.json')
+            results_index.add_file(f'pure_pursuit_ld{ld}.json')
             time.sleep(2)  # Brief pause between experiments
         
         # Experiment 2: Stanley with different gains
@@ -293,14 +470,17 @@ def main():
             metrics = runner.run_experiment(
                 controller,
                 f"Stanley_K{k}",
-                duration=60.0
+                duration=60.0,
+                abort_criteria=abort_criteria
             )
             all_metrics.append(metrics)
             runner.save_metrics(metrics, f'stanley_k{k}.json')
+            results_index.add_file(f'stanley_k{k}.json')
             time.sleep(2)
         
         # Save combined results
         runner.save_metrics(all_metrics, 'all_experiments.json')
+        results_index.add_file('all_experiments.json')
         
         print("\n" + "="*60)
         print("ALL EXPERIMENTS COMPLETE")
@@ -3,11 +3,11 @@ Extended Experiment Runner with Hybrid Controller
 Runs experiments comparing Pure Pursuit, Stanley, and Hybrid controllers
 """
 
+import argparse
 import glob
 import os
 import sys
 import time
-import json
 import numpy as np
 from datetime import datetime
 
@@ -19,11 +19,31 @@ try:
 except IndexError:
     pass
 
-import carla
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
+
+import local_sim
+from path_query import query_path
+from abort_criteria import NO_DATA, AbortCriteria
+from metric_recorder import (PATH_CHANNELS, POSITION_CHANNELS, STREAM_SUFFIX, TRACE_CHANNELS,
+                             TRACE_STREAM_DIR, YAW_CHANNELS, MetricRecorder, StreamingRecorder,
+                             trace_fields)
+from online_stats import RunningStats, RunSummary
+from result_cache import ResultCache, describe_controller, path_hash, source_hash
+from result_format import save_result, save_result_list
+from results_index import ResultsIndex
+from route_builder import load_or_build_route
+from sweep_executor import SweepExecutor, build_controller, experiment_spec
+from sweep_manifest import SweepManifest
+from vehicle_state import RpcCounter, VehicleState
+from waypoint_path import ClosestPointTracker
 
-from pure_pursuit import PurePursuitController
-from stanley import StanleyController
-from hybrid_controller import HybridController
+
+# Hybrid controller traces logged on top of the common ones
+HYBRID_CHANNELS = ('curvatures', 'active_controllers', 'blend_weights')
 
 
 class ExtendedExperimentRunner:
@@ -32,20 +52,37 @@ class ExtendedExperimentRunner:
     Includes hybrid controller and enhanced logging.
     """
     
-    def __init__(self, host='localhost', port=2000):
+    def __init__(self, host='localhost', port=2000, backend='carla', result_cache=None,
+                 stream_dir=None):
         """
         Initialize experiment runner.
         
         Args:
             host (str): CARLA server host
             port (int): CARLA server port
+            backend (str): 'carla' for a CARLA server, 'local' for the offline
+                kinematic-bicycle simulator
+            result_cache (ResultCache): Serve unchanged experiments from this
+                cache and add new ones to it (None to always simulate)
+            stream_dir (str): Stream each run's traces to disk in this
+                directory as it proceeds (None to keep them in memory)
         """
-        self.client = carla.Client(host, port)
+        self.backend = backend
+        self.result_cache = result_cache
+        self.stream_dir = stream_dir
+        self.client = local_sim.connect(backend, host, port)
         self.client.set_timeout(10.0)
         self.world = None
         self.vehicle = None
         self.spawn_point = None
-        self.waypoints = []
+        self.spawn_index = 0
+        self.town = None
+        self.path = None
+        self.route_spacing = None
+        self.route_length = None
+        self.vehicle_type = None
+        self.tracker = ClosestPointTracker()
+        self.rpc_counter = RpcCounter()
         
     def setup_world(self, town='Town01', weather=carla.WeatherParameters.ClearNoon):
         """
@@ -57,6 +94,7 @@ class ExtendedExperimentRunner:
         """
         print(f"Loading world: {town}")
         self.world = self.client.load_world(town)
+        self.town = town
         self.world.set_weather(weather)
         
         # Set synchronous mode for deterministic simulation
@@ -67,17 +105,26 @@ class ExtendedExperimentRunner:
         
         print("World setup complete")
         
-    def generate_waypoints(self, distance=2.0):
+    def generate_waypoints(self, distance=2.0, route_length=1000.0):
         """
-        Generate waypoints along the road using CARLA map.
+        Build an ordered route from the spawn point using CARLA map.
+        
+        The route is cached on disk per backend, town, spawn point and
+        spacing, so repeated runs skip route generation.
         
         Args:
             distance (float): Distance between waypoints
+            route_length (float): Maximum route length (meters)
         """
         print("Generating waypoints...")
-        carla_map = self.world.get_map()
-        self.waypoints = carla_map.generate_waypoints(distance)
-        print(f"Generated {len(self.waypoints)} waypoints")
+        self.route_spacing = distance
+        self.route_length = route_length
+        self.path = load_or_build_route(
+            self.world, self.town, self.spawn_index,
+            spacing=distance, length=route_length, backend=self.backend
+        )
+        loop = " (closed loop)" if self.path.closed else ""
+        print(f"Generated {len(self.path)} waypoints, {self.path.length:.0f} m{loop}")
         
     def spawn_vehicle(self, vehicle_type='vehicle.tesla.model3'):
         """
@@ -91,10 +138,11 @@ class ExtendedExperimentRunner:
         
         # Get spawn points
         spawn_points = self.world.get_map().get_spawn_points()
-        self.spawn_point = spawn_points[0]  # Use first spawn point
+        self.spawn_point = spawn_points[self.spawn_index]  # Route starts here
         
         # Spawn vehicle
         self.vehicle = self.world.spawn_actor(vehicle_bp, self.spawn_point)
+        self.vehicle_type = vehicle_type
         print(f"Spawned vehicle: {vehicle_type}")
         
         # Let the vehicle settle
@@ -114,14 +162,18 @@ class ExtendedExperimentRunner:
             settings.synchronous_mode = False
             self.world.apply_settings(settings)
     
-    def run_experiment(self, controller, experiment_name, duration=60.0):
+    def run_experiment(self, controller, experiment_name, duration=60.0, num_ticks=None,
+                       abort_criteria=None):
         """
         Run a single experiment with a given controller.
         
         Args:
             controller: Controller instance
             experiment_name (str): Name for this experiment
-            duration (float): Experiment duration in seconds
+            duration (float): Experiment duration in simulated seconds
+            num_ticks (int): Number of simulation ticks (overrides duration)
+            abort_criteria (AbortCriteria): Stop diverged runs early and mark
+                them failed (None to always run the full duration)
             
         Returns:
             dict: Logged metrics
@@ -130,9 +182,34 @@ class ExtendedExperimentRunner:
         print(f"Running experiment: {experiment_name}")
         print(f"{'='*60}")
         
+        # Run length in ticks, so it does not depend on how fast the
+        # simulator and client are
+        if num_ticks is None:
+            delta_seconds = self.world.get_settings().fixed_delta_seconds
+            num_ticks = int(round(duration / delta_seconds))
+        
+        # Start from a clean controller
+        if hasattr(controller, 'reset'):
+            controller.reset()
+        
+        # Serve unchanged experiments from the result cache
+        cache_key = None
+        if self.result_cache is not None:
+            cache_fields = self.experiment_key_fields(controller, num_ticks, abort_criteria)
+            cache_key = self.result_cache.key(cache_fields)
+            cached = self.result_cache.load(cache_key)
+            if cached is not None:
+                cached['experiment_name'] = experiment_name
+                print(f"Loaded cached result {cache_key[:12]} "
+                      f"(mean lateral error {cached['summary']['mean_lateral_error']:.3f} m)")
+                return cached
+        
         # Reset vehicle to spawn point
         self.vehicle.set_transform(self.spawn_point)
         
+        # The vehicle was teleported, so drop any warm-started path matches
+        self.tracker.reset()
+        
         # Apply brake to stop vehicle (CARLA 0.9.15 compatible)
         control = carla.VehicleControl()
         control.brake = 1.0
@@ -143,126 +220,209 @@ class ExtendedExperimentRunner:
         for _ in range(20):
             self.world.tick()
         
-        # Data logging
+        # Data logging (one preallocated row per tick, or fixed-size chunks
+        # written to disk during the run when streaming)
         metrics = {
             'experiment_name': experiment_name,
             'timestamp': datetime.now().isoformat(),
-            'lateral_errors': [],
-            'heading_errors': [],
-            'steering_angles': [],
-            'speeds': [],
-            'timestamps': [],
-            'positions': [],
-            'curvatures': [],  # New: track curvature
-            'active_controllers': [],  # New: for hybrid controller
-            'blend_weights': [],  # New: for hybrid controller
+            # Which cached route the trajectory was driven on
+            'route': {
+                'backend': self.backend,
+                'town': self.town,
+                'spawn_index': self.spawn_index,
+                'spacing': self.route_spacing,
+                'length': self.route_length,
+            },
         }
+        if self.stream_dir is None:
+            recorder = MetricRecorder(
+                TRACE_CHANNELS + POSITION_CHANNELS + PATH_CHANNELS + YAW_CHANNELS + HYBRID_CHANNELS,
+                capacity=num_ticks, labels=('active_controllers',)
+            )
+        else:
+            recorder = StreamingRecorder(
+                TRACE_CHANNELS + POSITION_CHANNELS + PATH_CHANNELS + YAW_CHANNELS + HYBRID_CHANNELS,
+                os.path.join(self.stream_dir, experiment_name + STREAM_SUFFIX),
+                labels=('active_controllers',), metadata=metrics
+            )
+        
+        # Summary statistics, updated every tick
+        run_summary = RunSummary()
+        curvatures = RunningStats()
+        
+        # Count CARLA calls from here on (settling ticks excluded)
+        self.rpc_counter.reset()
+        state = VehicleState.capture(self.world, self.vehicle, self.rpc_counter)
+        start_timestamp = state.timestamp
+        
+        if abort_criteria is not None:
+            abort_criteria.reset()
+        failure = None
+        interrupted = False
         
         start_time = time.time()
         step = 0
         
         try:
-            while time.time() - start_time < duration:
+            while step < num_ticks:
                 # Get control command from controller
-                control = controller.run_step(self.vehicle, self.waypoints)
+                control = controller.run_step_from_state(state, self.path)
                 self.vehicle.apply_control(control)
+                self.rpc_counter.add('apply_control')
                 
                 # Tick simulation
                 self.world.tick()
+                self.rpc_counter.tick()
+                
+                # One snapshot per tick: used for logging here and by the
+                # controller on the next iteration
+                state = VehicleState.capture(self.world, self.vehicle, self.rpc_counter)
+                query = query_path(state, self.path, self.tracker)
+                vehicle_transform = query.transform
+                vehicle_location = query.location
+                closest_idx = query.closest_idx
+                
+                # Lateral error (cross-track error), measured to the
+                # path segments rather than to the nearest waypoint
+                cross_track_error, arc_length, path_yaw = self.path.cross_track(
+                    vehicle_location.x, vehicle_location.y, closest_idx
+                )
+                lateral_error = abs(cross_track_error)
+                
+                # Heading error against the path heading at the projection
+                vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
+                heading_error = path_yaw - vehicle_yaw
+                heading_error = np.degrees(np.arctan2(np.sin(heading_error), np.cos(heading_error)))
+                
+                # Hybrid controller info if available
+                if hasattr(controller, 'get_controller_info'):
+                    info = controller.get_controller_info()
+                    curvature = info.get('curvature', 0.0)
+                    active_controller = info.get('active_controller', 'N/A')
+                    blend_weight = info.get('blend_weight', 0.0)
+                else:
+                    curvature = 0.0
+                    active_controller = experiment_name
+                    blend_weight = 0.0
                 
-                # Log metrics
-                vehicle_transform = self.vehicle.get_transform()
-                vehicle_location = vehicle_transform.location
+                # Log data
+                recorder.append(
+                    lateral_error, heading_error, control.steer, query.speed,
+                    state.timestamp - start_timestamp,
+                    vehicle_location.x, vehicle_location.y, vehicle_location.z,
+                    cross_track_error, arc_length, vehicle_yaw,
+                    curvature, recorder.label_code('active_controllers', active_controller),
+                    blend_weight
+                )
                 
-                # Find closest waypoint for error calculation
-                min_distance = float('inf')
-                closest_waypoint = None
-                for waypoint in self.waypoints:
-                    distance = vehicle_location.distance(waypoint.transform.location)
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_waypoint = waypoint
+                run_summary.update(lateral_error, heading_error, control.steer, query.speed)
+                curvatures.update(curvature)
                 
-                if closest_waypoint is not None:
-                    # Lateral error (cross-track error)
-                    lateral_error = min_distance
-                    
-                    # Heading error
-                    vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
-                    waypoint_yaw = np.radians(closest_waypoint.transform.rotation.yaw)
-                    heading_error = waypoint_yaw - vehicle_yaw
-                    heading_error = np.arctan2(np.sin(heading_error), np.cos(heading_error))
-                    
-                    # Log data
-                    metrics['lateral_errors'].append(lateral_error)
-                    metrics['heading_errors'].append(np.degrees(heading_error))
-                    metrics['steering_angles'].append(control.steer)
-                    
-                    velocity = self.vehicle.get_velocity()
-                    speed = np.sqrt(velocity.x**2 + velocity.y**2 + velocity.z**2)
-                    metrics['speeds'].append(speed)
-                    
-                    metrics['timestamps'].append(time.time() - start_time)
-                    metrics['positions'].append({
-                        'x': vehicle_location.x,
-                        'y': vehicle_location.y,
-                        'z': vehicle_location.z
-                    })
-                    
-                    # Log hybrid controller info if available
-                    if hasattr(controller, 'get_controller_info'):
-                        info = controller.get_controller_info()
-                        metrics['curvatures'].append(info.get('curvature', 0.0))
-                        metrics['active_controllers'].append(info.get('active_controller', 'N/A'))
-                        metrics['blend_weights'].append(info.get('blend_weight', 0.0))
-                    else:
-                        metrics['curvatures'].append(0.0)
-                        metrics['active_controllers'].append(experiment_name)
-                        metrics['blend_weights'].append(0.0)
+                if abort_criteria is not None:
+                    failure = abort_criteria.update(lateral_error, heading_error, query.speed)
                 
                 step += 1
                 
+                if failure is not None:
+                    print(f"\nAborting {experiment_name} at step {step}: {failure} bound exceeded")
+                    break
+                
                 # Print progress
                 if step % 50 == 0:
-                    print(f"Step {step}, Time: {time.time() - start_time:.2f}s")
+                    print(f"Step {step}/{num_ticks}, Sim time: {state.timestamp - start_timestamp:.2f}s, "
+                          f"Mean lateral error: {run_summary.lateral_errors.mean:.3f} m")
         
         except KeyboardInterrupt:
             print("\nExperiment interrupted by user")
+            interrupted = True
+        
+        finally:
+            # Writes out the last chunk of a streamed trace, even on errors
+            recorder.close()
+        
+        metrics.update(trace_fields(recorder))
+        
+        # A run without a single logged tick has no statistics (None in the
+        # summary) and counts as failed, so rankings skip it
+        if not run_summary.count and failure is None:
+            failure = NO_DATA
         
-        # Compute summary statistics
-        metrics['summary'] = {
-            'mean_lateral_error': np.mean(metrics['lateral_errors']),
-            'max_lateral_error': np.max(metrics['lateral_errors']),
-            'std_lateral_error': np.std(metrics['lateral_errors']),
-            'mean_abs_heading_error': np.mean(np.abs(metrics['heading_errors'])),
-            'max_abs_heading_error': np.max(np.abs(metrics['heading_errors'])),
-            'steering_smoothness': np.std(np.diff(metrics['steering_angles'])) if len(metrics['steering_angles']) > 1 else 0,
-            'mean_speed': np.mean(metrics['speeds']),
+        metrics['summary'] = run_summary.summary()
+        metrics['summary'].update({
             'total_steps': step,
-            'total_time': time.time() - start_time,
-            'mean_curvature': np.mean(metrics['curvatures']) if metrics['curvatures'] else 0.0,
-        }
+            'failed': failure is not None,
+            'failure_reason': failure,
+            'total_time': state.timestamp - start_timestamp,
+            'wall_time': time.time() - start_time,
+            'rpcs_per_tick': self.rpc_counter.total_per_tick(),
+            'rpc_calls_per_tick': self.rpc_counter.per_tick(),
+            'mean_curvature': curvatures.mean if curvatures.count else 0.0,
+        })
         
         print(f"\nExperiment complete: {experiment_name}")
-        print(f"Mean Lateral Error: {metrics['summary']['mean_lateral_error']:.3f} m")
-        print(f"Mean Heading Error: {metrics['summary']['mean_abs_heading_error']:.3f}°")
-        print(f"Steering Smoothness (std): {metrics['summary']['steering_smoothness']:.4f}")
+        if run_summary.count:
+            print(f"Mean Lateral Error: {metrics['summary']['mean_lateral_error']:.3f} m")
+            print(f"Mean Heading Error: {metrics['summary']['mean_abs_heading_error']:.3f}°")
+            print(f"Steering Smoothness (std): {metrics['summary']['steering_smoothness']:.4f}")
+        else:
+            print("No ticks logged")
+        print(f"CARLA calls per tick: {metrics['summary']['rpcs_per_tick']:.2f}")
+        
+        # Partial and empty runs are never cached
+        if cache_key is not None and not interrupted and run_summary.count:
+            self.result_cache.store(cache_key, cache_fields, metrics)
         
         return metrics
     
-    def save_metrics(self, metrics, filename):
+    def experiment_key_fields(self, controller, num_ticks, abort_criteria=None):
         """
-        Save metrics to JSON file.
+        Everything that determines an experiment's outcome, for its result
+        cache key.
         
         Args:
-            metrics (dict): Metrics dictionary
-            filename (str): Output filename
+            controller: Controller instance
+            num_ticks (int): Number of simulation ticks
+            abort_criteria (AbortCriteria): Early termination criteria
+            
+        Returns:
+            dict: JSON-serializable key fields
+        """
+        spawn = self.spawn_point
+        return {
+            'controller': describe_controller(controller),
+            'source': source_hash(type(controller), type(self)),
+            'backend': self.backend,
+            'town': self.town,
+            'spawn_index': self.spawn_index,
+            'spawn_point': [spawn.location.x, spawn.location.y, spawn.location.z,
+                            spawn.rotation.yaw],
+            'route_spacing': self.route_spacing,
+            'route_length': self.route_length,
+            'route': path_hash(self.path),
+            'vehicle': self.vehicle_type,
+            'fixed_delta_seconds': self.world.get_settings().fixed_delta_seconds,
+            'num_ticks': num_ticks,
+            'abort_criteria': None if abort_criteria is None else abort_criteria.config(),
+        }
+    
+    @staticmethod
+    def save_metrics(metrics, filename):
+        """
+        Save metrics in the binary results format (result_format.py): a JSON
+        file with the summary and a .npz file with the per-tick traces.
+        
+        Args:
+            metrics (dict or list): Metrics of one experiment, or a list of
+                them for a combined file
+            filename (str): Output filename (.json)
         """
         os.makedirs('results', exist_ok=True)
         filepath = os.path.join('results', filename)
         
-        with open(filepath, 'w') as f:
-            json.dump(metrics, f, indent=2)
+        if isinstance(metrics, list):
+            save_result_list(metrics, filepath)
+        else:
+            save_result(metrics, filepath)
         
         print(f"Metrics saved to: {filepath}")
 
@@ -271,108 +431,101 @@ def main():
     """
     Main function to run all experiments including hybrid controllers.
     """
-    runner = ExtendedExperimentRunner()
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--backend', choices=local_sim.BACKENDS, default='carla',
+        help="simulator backend: a CARLA server or the offline kinematic-bicycle simulator")
+    argparser.add_argument('--host', default='localhost', help='CARLA server host')
+    argparser.add_argument('--port', type=int, default=2000,
+                           help='CARLA server port (worker i uses port + 2*i)')
+    argparser.add_argument('--workers', type=int, default=1,
+                           help='parallel workers, each with its own simulator')
+    argparser.add_argument('--no-abort', action='store_true',
+                           help='run diverging experiments for the full duration')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help='re-simulate experiments that have cached results')
+    argparser.add_argument('--restart', action='store_true',
+                           help='ignore the sweep manifest and run every experiment again')
+    argparser.add_argument('--rebuild', action='store_true',
+                           help='only rebuild the combined results file from the per-run files')
+    argparser.add_argument('--stream', action='store_true',
+                           help='write traces to results/.traces in chunks during each run')
+    args = argparser.parse_args()
     
-    try:
-        # Setup
-        runner.setup_world(town='Town01')
-        runner.generate_waypoints(distance=2.0)
-        runner.spawn_vehicle()
-        
-        all_metrics = []
-        
-        # Experiment 1: Pure Pursuit with different lookahead distances
-        print("\n" + "="*60)
-        print("PURE PURSUIT ABLATION STUDY")
-        print("="*60)
-        
-        lookahead_distances = [2.0, 3.0, 5.0]
-        for ld in lookahead_distances:
-            controller = PurePursuitController(lookahead_distance=ld)
-            metrics = runner.run_experiment(
-                controller,
-                f"PurePursuit_Ld{ld}",
-                duration=60.0
-            )
-            all_metrics.append(metrics)
-            runner.save_metrics(metrics, f'pure_pursuit_ld{ld}.json')
-            time.sleep(2)
-        
-        # Experiment 2: Stanley with different gains
-        print("\n" + "="*60)
-        print("STANLEY CONTROLLER ABLATION STUDY")
-        print("="*60)
-        
-        k_values = [0.5, 1.0, 2.0]
-        for k in k_values:
-            controller = StanleyController(k=k)
-            metrics = runner.run_experiment(
-                controller,
-                f"Stanley_K{k}",
-                duration=60.0
-            )
-            all_metrics.append(metrics)
-            runner.save_metrics(metrics, f'stanley_k{k}.json')
-            time.sleep(2)
-        
-        # Experiment 3: Hybrid Controllers (NEW!)
-        print("\n" + "="*60)
-        print("HYBRID CONTROLLER EXPERIMENTS")
-        print("="*60)
-        
-        # Hybrid Mode 1: Switching
-        print("\nTesting Hybrid Controller - Switching Mode")
-        controller = HybridController(
-            pp_lookahead=3.0,
-            stanley_k=0.5,
-            curvature_threshold=0.05,
-            mode='switching'
-        )
-        metrics = runner.run_experiment(
-            controller,
-            "Hybrid_Switching",
-            duration=60.0
-        )
-        all_metrics.append(metrics)
-        runner.save_metrics(metrics, 'hybrid_switching.json')
-        time.sleep(2)
-        
-        # Hybrid Mode 2: Blending
-        print("\nTesting Hybrid Controller - Blending Mode")
-        controller = HybridController(
-            pp_lookahead=3.0,
-            stanley_k=0.5,
-            curvature_threshold=0.05,
-            mode='blending'
-        )
-        metrics = runner.run_experiment(
-            controller,
-            "Hybrid_Blending",
-            duration=60.0
-        )
-        all_metrics.append(metrics)
-        runner.save_metrics(metrics, 'hybrid_blending.json')
-        time.sleep(2)
-        
-        # Hybrid Mode 3: Adaptive (with speed adaptation)
-        print("\nTesting Hybrid Controller - Adaptive Mode")
-        controller = HybridController(
-            pp_lookahead=3.0,
-            stanley_k=0.5,
-            curvature_threshold=0.05,
-            mode='adaptive'
-        )
-        metrics = runner.run_experiment(
-            controller,
-            "Hybrid_Adaptive",
-            duration=60.0
+    executor = SweepExecutor(
+        num_workers=args.workers,
+        backend=args.backend,
+        host=args.host,
+        port=args.port,
+        town='Town01',
+        spacing=2.0,
+        abort_criteria=None if args.no_abort else AbortCriteria(),
+        result_cache=None if args.no_cache else ResultCache(),
+        stream_dir=os.path.join('results', TRACE_STREAM_DIR) if args.stream else None,
+    )
+    
+    # Experiment 1: Pure Pursuit with different lookahead distances
+    specs = [
+        experiment_spec(f"PurePursuit_Ld{ld}", 'pure_pursuit', {'lookahead_distance': ld},
+                        duration=60.0, filename=f'pure_pursuit_ld{ld}.json')
+        for ld in [2.0, 3.0, 5.0]
+    ]
+    
+    # Experiment 2: Stanley with different gains
+    specs += [
+        experiment_spec(f"Stanley_K{k}", 'stanley', {'k': k},
+                        duration=60.0, filename=f'stanley_k{k}.json')
+        for k in [0.5, 1.0, 2.0]
+    ]
+    
+    # Experiment 3: Hybrid Controllers (switching, blending, adaptive)
+    specs += [
+        experiment_spec(
+            f"Hybrid_{mode.capitalize()}", 'hybrid',
+            {'pp_lookahead': 3.0, 'stanley_k': 0.5, 'curvature_threshold': 0.05, 'mode': mode},
+            duration=60.0, filename=f'hybrid_{mode}.json'
         )
-        all_metrics.append(metrics)
-        runner.save_metrics(metrics, 'hybrid_adaptive.json')
-        time.sleep(2)
+        for mode in ['switching', 'blending', 'adaptive']
+    ]
+    
+    # Completed experiments are recorded as they finish, so an interrupted
+    # sweep resumes from the first unfinished one. Entries are keyed on the
+    # settings and code that produce the results, like the result cache.
+    manifest = SweepManifest('all_experiments_extended', results_dir='results', settings={
+        'backend': args.backend,
+        'town': executor.town,
+        'spacing': executor.spacing,
+        'abort_criteria': None if executor.abort_criteria is None else executor.abort_criteria.config(),
+        'source': source_hash(ExtendedExperimentRunner, build_controller),
+    })
+    results_index = ResultsIndex('results')
+    # A finished sweep is run again from scratch
+    if args.restart or (manifest.finished and not args.rebuild):
+        manifest.reset()
+    pending = [] if args.rebuild else manifest.pending(specs)
+    pending_specs = [specs[i] for i in pending]
+    
+    def record(index, metrics):
+        manifest.mark_complete(pending_specs[index], metrics)
+        results_index.add_file(pending_specs[index]['filename'])
+    
+    print("\n" + "="*60)
+    print(f"RUNNING {len(pending)} OF {len(specs)} EXPERIMENTS ON {args.workers} WORKER(S)")
+    print("="*60)
+    if len(pending) < len(specs) and not args.rebuild:
+        print(f"Resuming sweep: {len(specs) - len(pending)} experiments already complete")
+    
+    try:
+        executor.run(pending_specs, on_result=record)
         
-        # Save combined results
-        runner.save_metrics(all_metrics, 'all_experiments_extended.json')
+        # Save combined results, rebuilt from the per-run files
+        all_metrics = manifest.load_results(specs)
+        ExtendedExperimentRunner.save_metrics(all_metrics, 'all_experiments_extended.json')
+        results_index.add_file('all_experiments_extended.json')
+        if len(all_metrics) < len(specs):
+            print(f"Combined file holds {len(all_metrics)} of {len(specs)} experiments")
+            return
+        manifest.finish()
         
         print("\n" + "="*60)
         print("ALL EXPERIMENTS COMPLETE")
@@ -385,13 +538,15 @@ def main():
         print("  - 3 Hybrid controller modes")
         print(f"  Total: {len(all_metrics)} experiments")
         
+    except KeyboardInterrupt:
+        print(f"\nSweep interrupted: {len(manifest.pending(specs))} experiments left. "
+              f"Run again to resume.")
+    
     except Exception as e:
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
-    
-    finally:
-        runner.cleanup()
+        print(f"{len(manifest.pending(specs))} experiments left. Run again to resume.")
 
 
 if __name__ == '__main__':
@@ -4,9 +4,16 @@ Intelligently combines Pure Pursuit and Stanley controllers based on driving con
 """
 
 import numpy as np
-import carla
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
 from pure_pursuit import PurePursuitController
 from stanley import StanleyController
+from path_query import query_path
+from vehicle_state import VehicleState
+from waypoint_path import BatchClosestPointTracker, ClosestPointTracker, as_path
 
 
 class HybridController:
@@ -25,7 +32,9 @@ class HybridController:
                  stanley_k=0.5,
                  curvature_threshold=0.05,
                  blend_zone=0.02,
-                 mode='adaptive'):
+                 mode='adaptive',
+                 curvature_horizon=20.0,
+                 speed_adaptive=True):
         """
         Initialize Hybrid controller.
         
@@ -35,7 +44,15 @@ class HybridController:
             curvature_threshold (float): Curvature above which to prefer Stanley
             blend_zone (float): Curvature range for smooth blending
             mode (str): 'adaptive', 'switching', or 'blending'
+            curvature_horizon (float): Path length ahead averaged into the
+                preview curvature (meters)
+            speed_adaptive (bool): Adapt the lookahead, Stanley gain and blend
+                weight to the vehicle speed (overrides pp_lookahead and stanley_k)
         """
+        # Constructor values (speed adaptation changes the sub-controllers')
+        self.pp_lookahead = pp_lookahead
+        self.stanley_k = stanley_k
+        
         # Initialize both controllers with optimal parameters
         self.pure_pursuit = PurePursuitController(lookahead_distance=pp_lookahead)
         self.stanley = StanleyController(k=stanley_k)
@@ -44,75 +61,69 @@ class HybridController:
         self.curvature_threshold = curvature_threshold
         self.blend_zone = blend_zone
         self.mode = mode
+        self.curvature_horizon = curvature_horizon
         
         # Adaptive parameters
-        self.speed_adaptive = True
+        self.speed_adaptive = speed_adaptive
         
         # Logging
         self.active_controller = "Hybrid"
         self.blend_weight = 0.5
         self.current_curvature = 0.0
         
-    def estimate_path_curvature(self, vehicle_location, waypoints, lookahead_points=10):
+        # Warm-started closest-waypoint search for curvature estimation
+        self.tracker = ClosestPointTracker()
+        self.batch_tracker = BatchClosestPointTracker()
+        
+    def reset(self):
+        """
+        Reset per-run state (call after the vehicle is teleported).
+        """
+        self.tracker.reset()
+        self.batch_tracker.reset()
+        self.pure_pursuit.reset()
+        self.stanley.reset()
+    
+    def params(self):
+        """
+        Constructor parameters (identify the configuration, not its state).
+        
+        Returns:
+            dict: Keyword arguments that rebuild this controller
+        """
+        return {
+            'pp_lookahead': self.pp_lookahead,
+            'stanley_k': self.stanley_k,
+            'curvature_threshold': self.curvature_threshold,
+            'blend_zone': self.blend_zone,
+            'mode': self.mode,
+            'curvature_horizon': self.curvature_horizon,
+            'speed_adaptive': self.speed_adaptive,
+        }
+    
+    def estimate_path_curvature(self, vehicle_location, path, closest_idx=None):
         """
         Estimate the upcoming path curvature.
         
+        Reads the path's precomputed preview curvature profile, so the cost
+        per tick is a single lookup by arc length.
+        
         Args:
             vehicle_location: Current vehicle location
-            waypoints: List of waypoints
-            lookahead_points: Number of points ahead to consider
+            path (Path): Array-backed path
+            closest_idx (int): Closest waypoint index if already known
             
         Returns:
-            float: Estimated curvature (1/radius)
+            float: Mean absolute curvature over the horizon ahead (1/radius)
         """
         # Find closest waypoint
-        min_distance = float('inf')
-        closest_idx = 0
-        
-        for i, waypoint in enumerate(waypoints):
-            distance = vehicle_location.distance(waypoint.transform.location)
-            if distance < min_distance:
-                min_distance = distance
-                closest_idx = i
-        
-        # Get lookahead points
-        end_idx = min(closest_idx + lookahead_points, len(waypoints) - 1)
-        
-        if end_idx - closest_idx < 3:
-            return 0.0  # Not enough points to estimate curvature
-        
-        # Extract waypoint positions
-        points = []
-        for i in range(closest_idx, end_idx):
-            wp = waypoints[i].transform.location
-            points.append([wp.x, wp.y])
-        
-        points = np.array(points)
-        
-        # Fit a circle through the points to estimate curvature
-        # Simple approximation: use change in heading over distance
-        if len(points) < 3:
-            return 0.0
-        
-        # Calculate heading changes
-        dx = np.diff(points[:, 0])
-        dy = np.diff(points[:, 1])
-        headings = np.arctan2(dy, dx)
-        
-        # Curvature = change in heading / arc length
-        if len(headings) > 1:
-            heading_change = np.abs(np.diff(headings))
-            # Normalize heading change to [-pi, pi]
-            heading_change = np.arctan2(np.sin(heading_change), np.cos(heading_change))
-            
-            distances = np.sqrt(dx[:-1]**2 + dy[:-1]**2)
-            total_distance = np.sum(distances)
-            
-            if total_distance > 0.1:
-                curvature = np.sum(np.abs(heading_change)) / total_distance
-                return curvature
+        if closest_idx is None:
+            closest_idx, _ = self.tracker.find(
+                path, vehicle_location.x, vehicle_location.y
+            )
         
-        return 0.0
+        profile = path.curvature_profile(self.curvature_horizon)
+        return profile.at(path.s[closest_idx])
     
     def compute_blend_weight(self, curvature, speed=None):
         """
@@ -155,29 +166,31 @@ class HybridController:
         Compute speed-adaptive lookahead distance for Pure Pursuit.
         
         Args:
-            speed (float): Vehicle speed in m/s
+            speed (float or np.ndarray): Vehicle speed in m/s
             
         Returns:
-            float: Lookahead distance in meters
+            float or np.ndarray: Lookahead distance in meters
         """
         base_lookahead = 2.0
         speed_factor = 0.3  # Additional meters per m/s
         max_lookahead = 6.0
         
         lookahead = base_lookahead + speed * speed_factor
-        return min(lookahead, max_lookahead)
+        return np.minimum(lookahead, max_lookahead)
     
     def adaptive_stanley_gain(self, speed):
         """
         Compute speed-adaptive gain for Stanley controller.
         
         Args:
-            speed (float): Vehicle speed in m/s
+            speed (float or np.ndarray): Vehicle speed in m/s
             
         Returns:
-            float: Stanley gain K
+            float or np.ndarray: Stanley gain K
         """
         # Lower gain at higher speeds to reduce oscillation
+        if np.ndim(speed) > 0:
+            return np.where(speed < 5.0, 1.0, np.where(speed < 10.0, 0.7, 0.5))
         if speed < 5.0:
             return 1.0
         elif speed < 10.0:
@@ -185,23 +198,109 @@ class HybridController:
         else:
             return 0.5
     
-    def run_step(self, vehicle, waypoints):
+    def compute_steering_batch(self, x, y, yaw, speed, path, closest_idx=None):
+        """
+        Vectorized hybrid steering for many vehicle states at once.
+        
+        Matches the steering of run_step_from_state per state. The
+        curvature_threshold and blend_zone attributes (and the sub-controller
+        parameters when speed adaptation is off) may be scalars or arrays
+        with one entry per state. current_curvature and blend_weight are set
+        to per-state arrays for logging.
+        
+        Args:
+            x, y (np.ndarray): Vehicle positions (meters)
+            yaw (np.ndarray): Vehicle headings (radians)
+            speed (np.ndarray): Vehicle speeds (m/s)
+            path (Path): Array-backed path
+            closest_idx (np.ndarray): Closest waypoint indices if already known
+            
+        Returns:
+            np.ndarray: Steering commands normalized to [-1, 1]
+        """
+        path = as_path(path)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        speed = np.asarray(speed, dtype=np.float64)
+        if closest_idx is None:
+            closest_idx, _ = self.batch_tracker.find(path, x, y)
+        
+        profile = path.curvature_profile(self.curvature_horizon)
+        curvature = profile.at_batch(path.s[closest_idx])
+        self.current_curvature = curvature
+        
+        if self.speed_adaptive:
+            self.pure_pursuit.lookahead_distance = self.adaptive_lookahead(speed)
+            self.stanley.k = self.adaptive_stanley_gain(speed)
+        
+        pp_steering = self.pure_pursuit.compute_steering_batch(
+            x, y, yaw, speed, path, closest_idx
+        )
+        stanley_steering = self.stanley.compute_steering_batch(
+            x, y, yaw, speed, path, closest_idx
+        )
+        
+        threshold = self.curvature_threshold
+        if self.mode == 'switching':
+            weight = (curvature > threshold).astype(np.float64)
+        elif self.mode == 'blending':
+            low = threshold - self.blend_zone
+            high = threshold + self.blend_zone
+            weight = np.clip((curvature - low) / (2 * self.blend_zone), 0.0, 1.0)
+            weight = np.where(curvature < low, 0.0, np.where(curvature > high, 1.0, weight))
+            if self.speed_adaptive:
+                speed_factor = np.clip(speed / 15.0, 0.0, 1.0)
+                weight = weight * (1.0 - 0.3 * speed_factor)
+        else:
+            use_stanley = ((curvature > threshold + self.blend_zone) |
+                           ((curvature > threshold) & (speed < 8.0)))
+            weight = use_stanley.astype(np.float64)
+        self.blend_weight = weight
+        
+        steering = (1 - weight) * pp_steering + weight * stanley_steering
+        return np.clip(steering, -1.0, 1.0)
+    
+    def run_step(self, vehicle, path):
         """
         Execute one control step using hybrid approach.
         
+        Reads the vehicle state from the world snapshot; runners that already
+        captured it this tick should call run_step_from_state instead.
+        
         Args:
             vehicle: CARLA vehicle actor
-            waypoints: List of waypoints representing the path
+            path (Path): Array-backed path (a list of waypoints is also accepted)
+            
+        Returns:
+            carla.VehicleControl: Control command for the vehicle
+        """
+        state = VehicleState.capture(vehicle.get_world(), vehicle)
+        return self.run_step_from_state(state, path)
+    
+    def run_step_from_state(self, state, path):
+        """
+        Execute one control step using hybrid approach from a captured
+        vehicle state.
+        
+        Args:
+            state (VehicleState): Vehicle state for the current frame
+            path (Path): Array-backed path (a list of waypoints is also accepted)
             
         Returns:
             carla.VehicleControl: Control command for the vehicle
         """
-        vehicle_transform = vehicle.get_transform()
-        vehicle_location = vehicle_transform.location
-        vehicle_speed = self.get_speed(vehicle)
+        path = as_path(path)
+        
+        # Closest match, computed once this tick and reused by both
+        # sub-controllers and the runner's metric logging
+        query = query_path(state, path, self.tracker)
+        vehicle_location = query.location
+        vehicle_speed = query.speed
         
         # Estimate path curvature
-        curvature = self.estimate_path_curvature(vehicle_location, waypoints)
+        curvature = self.estimate_path_curvature(
+            vehicle_location, path, closest_idx=query.closest_idx
+        )
         self.current_curvature = curvature
         
         # Adapt controller parameters based on speed
@@ -213,16 +312,16 @@ class HybridController:
         if self.mode == 'switching':
             if curvature > self.curvature_threshold:
                 self.active_controller = "Stanley"
-                return self.stanley.run_step(vehicle, waypoints)
+                return self.stanley.run_step_from_state(state, path)
             else:
                 self.active_controller = "Pure Pursuit"
-                return self.pure_pursuit.run_step(vehicle, waypoints)
+                return self.pure_pursuit.run_step_from_state(state, path)
         
         # Mode 2: Smooth blending
         elif self.mode == 'blending':
             # Get control from both controllers
-            pp_control = self.pure_pursuit.run_step(vehicle, waypoints)
-            stanley_control = self.stanley.run_step(vehicle, waypoints)
+            pp_control = self.pure_pursuit.run_step_from_state(state, path)
+            stanley_control = self.stanley.run_step_from_state(state, path)
             
             # Compute blend weight
             weight = self.compute_blend_weight(curvature, vehicle_speed)
@@ -267,11 +366,11 @@ class HybridController:
             if use_stanley:
                 self.active_controller = "Stanley"
                 self.blend_weight = 1.0
-                return self.stanley.run_step(vehicle, waypoints)
+                return self.stanley.run_step_from_state(state, path)
             else:
                 self.active_controller = "Pure Pursuit"
                 self.blend_weight = 0.0
-                return self.pure_pursuit.run_step(vehicle, waypoints)
+                return self.pure_pursuit.run_step_from_state(state, path)
     
     @staticmethod
     def get_speed(vehicle):
@@ -0,0 +1,472 @@
+"""
+Hyperparameter Search
+Successive halving and Hyperband over the Pure Pursuit, Stanley and Hybrid
+parameter spaces: many configurations get a short simulated budget and only
+the best by lateral error and steering smoothness are promoted to longer runs
+"""
+
+import argparse
+import json
+import math
+import os
+import numpy as np
+
+import local_sim
+from abort_criteria import AbortCriteria
+from batch_sim import BatchSimulation, load_local_route
+from result_cache import ResultCache
+from result_format import save_result, save_result_list
+from results_index import ResultsIndex
+from sweep_executor import SweepExecutor, experiment_spec
+
+
+# Search ranges: (low, high, scale) for continuous parameters, a list for
+# categorical ones
+SEARCH_SPACES = {
+    'pure_pursuit': {
+        'lookahead_distance': (1.0, 10.0, 'log'),
+    },
+    'stanley': {
+        'k': (0.1, 5.0, 'log'),
+    },
+    'hybrid': {
+        'pp_lookahead': (1.5, 8.0, 'log'),
+        'stanley_k': (0.1, 3.0, 'log'),
+        'curvature_threshold': (0.01, 0.15, 'log'),
+        'blend_zone': (0.005, 0.05, 'log'),
+        'mode': ['switching', 'blending', 'adaptive'],
+        'speed_adaptive': [True, False],
+    },
+}
+
+
+def sample_configs(controller, num_configs, rng):
+    """
+    Draw random configurations from a controller's search space.
+
+    Continuous values are rounded to three significant digits so experiment
+    names stay readable. Speed-adaptive Hybrid configurations drop
+    pp_lookahead and stanley_k, which speed adaptation overrides.
+
+    Args:
+        controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+        num_configs (int): Number of configurations
+        rng (np.random.Generator): Random number generator
+
+    Returns:
+        list: Controller constructor parameter dicts
+    """
+    space = SEARCH_SPACES[controller]
+    configs = []
+    for _ in range(num_configs):
+        params = {}
+        for name, domain in space.items():
+            if isinstance(domain, list):
+                params[name] = domain[rng.integers(len(domain))]
+                continue
+            low, high, scale = domain
+            if scale == 'log':
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                value = rng.uniform(low, high)
+            params[name] = float(f"{value:.3g}")
+        if params.get('speed_adaptive'):
+            del params['pp_lookahead'], params['stanley_k']
+        configs.append(params)
+    return configs
+
+
+def config_name(controller, params):
+    """
+    Experiment name of a configuration, in the runners' naming style.
+
+    Args:
+        controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+        params (dict): Controller constructor parameters
+
+    Returns:
+        str: Experiment name
+    """
+    if controller == 'pure_pursuit':
+        return f"PurePursuit_Ld{params['lookahead_distance']:g}"
+    if controller == 'stanley':
+        return f"Stanley_K{params['k']:g}"
+    name = f"Hybrid_{params['mode'].capitalize()}"
+    if params['speed_adaptive']:
+        name += "_SA"
+    else:
+        name += f"_Ld{params['pp_lookahead']:g}_K{params['stanley_k']:g}"
+    return name + f"_T{params['curvature_threshold']:g}_B{params['blend_zone']:g}"
+
+
+def rank_key(entry):
+    """
+    Sort key of a (score, params, metrics) entry: aborted runs rank after
+    every completed run, then lower scores first.
+    """
+    return entry[2]['summary'].get('failed', False), entry[0]
+
+
+def score(summary, smoothness_weight=1.0):
+    """
+    Search objective (lower is better).
+
+    Args:
+        summary (dict): Experiment summary
+        smoothness_weight (float): Weight of steering_smoothness relative to
+            mean_lateral_error (meters)
+
+    Returns:
+        float: mean_lateral_error + smoothness_weight * steering_smoothness
+            (infinite for runs that logged no ticks)
+    """
+    if summary['mean_lateral_error'] is None:
+        return math.inf
+    return float(summary['mean_lateral_error'] + smoothness_weight * summary['steering_smoothness'])
+
+
+def rung_durations(min_duration, max_duration, eta):
+    """
+    Simulated duration of each successive-halving rung.
+
+    Returns:
+        list: min_duration * eta**i below max_duration, then max_duration
+    """
+    durations = []
+    duration = min_duration
+    while duration < max_duration:
+        durations.append(duration)
+        duration *= eta
+    durations.append(max_duration)
+    return durations
+
+
+def curve_start_index(path, lead_in=20.0, min_curvature=0.02):
+    """
+    Waypoint a short lead-in before the first curve of a path.
+
+    Runs that start on a long straight score zero until they reach a curve,
+    so the short rungs start here to measure tracking from the first ticks.
+
+    Args:
+        path (Path): Route
+        lead_in (float): Distance to start before the curve (meters)
+        min_curvature (float): Absolute curvature where a curve begins (1/m)
+
+    Returns:
+        int: Waypoint index (0 if the path has no curve)
+    """
+    curved = np.abs(path.curvature) >= min_curvature
+    # A loop's first waypoint can lie in the corner that closes it, so look
+    # for where a curve begins
+    entries = np.flatnonzero(curved[1:] & ~curved[:-1]) + 1
+    if len(entries) == 0:
+        return 0
+    s = max(path.s[entries[0]] - lead_in, 0.0)
+    return int(np.searchsorted(path.s, s, side='right') - 1)
+
+
+class BatchEvaluator:
+    """
+    Evaluate configurations on local_sim, all configurations of a rung in
+    lockstep with batch_sim.
+
+    Every rung starts shortly before the first curve of the route, so even
+    the shortest rung separates configurations by how they track a curve.
+    """
+
+    def __init__(self, town='Town01', spacing=2.0, dt=0.05, abort_criteria=None,
+                 lead_in=20.0):
+        """
+        Initialize the evaluator.
+
+        Args:
+            town (str): local_sim town
+            spacing (float): Route waypoint spacing (meters)
+            dt (float): Simulation step (seconds)
+            abort_criteria (AbortCriteria): Early termination of diverging
+                configurations (None to run every configuration in full)
+            lead_in (float): Distance the runs start before the first curve
+                (meters)
+        """
+        self.path = load_local_route(town, spacing=spacing)
+        self.start_index = curve_start_index(self.path, lead_in)
+        self.dt = dt
+        self.abort_criteria = abort_criteria
+
+    def evaluate(self, controller, configs, duration):
+        """
+        Run every configuration for one duration.
+
+        Args:
+            controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+            configs (list): Controller constructor parameter dicts
+            duration (float): Simulated seconds
+
+        Returns:
+            list: Metrics of each configuration, in config order
+        """
+        num_ticks = int(round(duration / self.dt))
+
+        # Mode and speed adaptation are shared by a batch
+        groups = {}
+        for i, params in enumerate(configs):
+            key = (params.get('mode', 'adaptive'), params.get('speed_adaptive', True))
+            groups.setdefault(key, []).append(i)
+
+        results = [None] * len(configs)
+        for (mode, speed_adaptive), indices in groups.items():
+            batch_params = {}
+            for name in SEARCH_SPACES[controller]:
+                values = [configs[i][name] for i in indices if name in configs[i]]
+                if values and name not in ('mode', 'speed_adaptive'):
+                    batch_params[name] = values
+            batch = BatchSimulation(self.path, controller, batch_params, mode=mode,
+                                    speed_adaptive=speed_adaptive, dt=self.dt)
+            log = batch.run(num_ticks, abort_criteria=self.abort_criteria,
+                            start_index=self.start_index)
+            for i, metrics in zip(indices, batch.metrics(log)):
+                metrics['experiment_name'] = config_name(controller, configs[i])
+                results[i] = metrics
+        return results
+
+
+class SweepEvaluator:
+    """
+    Evaluate configurations with the experiment runner, one experiment per
+    configuration, on a SweepExecutor worker pool (CARLA or local_sim).
+    """
+
+    def __init__(self, executor):
+        """
+        Initialize the evaluator.
+
+        Args:
+            executor (SweepExecutor): Worker pool
+        """
+        self.executor = executor
+
+    def evaluate(self, controller, configs, duration):
+        """
+        Run every configuration for one duration.
+
+        Args:
+            controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+            configs (list): Controller constructor parameter dicts
+            duration (float): Simulated seconds
+
+        Returns:
+            list: Metrics of each configuration, in config order
+        """
+        specs = [experiment_spec(config_name(controller, params), controller, params,
+                                 duration=duration)
+                 for params in configs]
+        return self.executor.run(specs)
+
+
+def successive_halving(evaluator, controller, configs, durations, eta=3,
+                       smoothness_weight=1.0, bracket=0, history=None):
+    """
+    Successive halving: run all configurations for the first duration, keep
+    the best 1/eta, run those for the next duration, and so on.
+
+    Args:
+        evaluator: BatchEvaluator or SweepEvaluator
+        controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+        configs (list): Controller constructor parameter dicts
+        durations (list): Simulated seconds of each rung
+        eta (int): Reduction factor between rungs
+        smoothness_weight (float): See score
+        bracket (int): Bracket number recorded in the history
+        history (list): If given, one record per evaluation is appended
+
+    Returns:
+        list: (score, params, metrics) of the configurations that reached the
+            last rung, best first
+    """
+    survivors = list(configs)
+    ranked = []
+    for rung, duration in enumerate(durations):
+        results = evaluator.evaluate(controller, survivors, duration)
+        # Stable sort, so ties keep the sampling order
+        ranked = sorted(
+            ((score(metrics['summary'], smoothness_weight), params, metrics)
+             for params, metrics in zip(survivors, results)),
+            key=rank_key
+        )
+        num_failed = sum(metrics['summary'].get('failed', False) for _, _, metrics in ranked)
+        print(f"  {controller} bracket {bracket} rung {rung}: {len(survivors)} configs x "
+              f"{duration:g}s ({num_failed} aborted), best {ranked[0][2]['experiment_name']} "
+              f"(score {ranked[0][0]:.4f})")
+
+        if history is not None:
+            for entry_score, params, metrics in ranked:
+                history.append({
+                    'controller': controller,
+                    'bracket': bracket,
+                    'rung': rung,
+                    'duration': duration,
+                    'experiment_name': metrics['experiment_name'],
+                    'params': params,
+                    # JSON has no infinity
+                    'score': entry_score if math.isfinite(entry_score) else None,
+                    'summary': metrics['summary'],
+                })
+
+        if rung < len(durations) - 1:
+            survivors = [params for _, params, _ in ranked[:max(1, len(ranked) // eta)]]
+    return ranked
+
+
+def hyperband(evaluator, controller, num_configs, durations, eta=3, rng=None,
+              smoothness_weight=1.0, history=None):
+    """
+    Hyperband: successive halving brackets from most exploratory (num_configs
+    configurations starting at the shortest duration) to a plain random search
+    at the longest duration.
+
+    Args:
+        evaluator: BatchEvaluator or SweepEvaluator
+        controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+        num_configs (int): Configurations in the most exploratory bracket
+        durations (list): Simulated seconds of each rung
+        eta (int): Reduction factor between rungs
+        rng (np.random.Generator): Random number generator
+        smoothness_weight (float): See score
+        history (list): If given, one record per evaluation is appended
+
+    Returns:
+        list: (score, params, metrics) of the configurations that reached the
+            longest duration in any bracket, best first
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    s_max = len(durations) - 1
+    finalists = []
+    for bracket, s in enumerate(range(s_max, -1, -1)):
+        n = math.ceil(num_configs * eta**(s - s_max) * (s_max + 1) / (s + 1))
+        configs = sample_configs(controller, n, rng)
+        finalists += successive_halving(evaluator, controller, configs, durations[s_max - s:],
+                                        eta, smoothness_weight, bracket, history)
+
+    # A configuration may reach the last rung in several brackets
+    unique = {}
+    for entry in sorted(finalists, key=rank_key):
+        unique.setdefault(entry[2]['experiment_name'], entry)
+    return list(unique.values())
+
+
+def save_results(ranked, history, output_dir, top_k=3):
+    """
+    Save the best configurations in the runners' results format.
+
+    Writes one file per configuration, all_experiments_extended.json (read
+    by evaluate_results_extended.py), the results index, and
+    search_history.jsonl with the summary of every evaluation, one JSON
+    record per line.
+
+    Args:
+        ranked (dict): Controller -> (score, params, metrics) list, best first
+        history (list): Evaluation records
+        output_dir (str): Results directory
+        top_k (int): Configurations kept per controller
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_metrics = []
+    filenames = []
+    for controller, entries in ranked.items():
+        for entry_score, params, metrics in entries[:top_k]:
+            metrics = dict(metrics, params=params, search_score=entry_score)
+            all_metrics.append(metrics)
+            filenames.append(f"{metrics['experiment_name']}.json")
+            save_result(metrics, os.path.join(output_dir, filenames[-1]))
+
+    save_result_list(all_metrics, os.path.join(output_dir, 'all_experiments_extended.json'))
+    ResultsIndex(output_dir).add_files(filenames + ['all_experiments_extended.json'])
+    with open(os.path.join(output_dir, 'search_history.jsonl'), 'w') as f:
+        for record in history:
+            f.write(json.dumps(record) + '\n')
+    print(f"Results saved in '{output_dir}'")
+
+
+def main():
+    """
+    Search each controller's parameter space and save the best configurations.
+    """
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--controllers', nargs='+', choices=list(SEARCH_SPACES),
+                           default=list(SEARCH_SPACES))
+    argparser.add_argument('--method', choices=('hyperband', 'successive_halving'),
+                           default='hyperband')
+    argparser.add_argument('--num-configs', type=int, default=81,
+                           help='configurations in the first (largest) rung')
+    argparser.add_argument('--min-duration', type=float, default=10.0,
+                           help='simulated seconds of the first rung')
+    argparser.add_argument('--max-duration', type=float, default=60.0,
+                           help='simulated seconds of the last rung')
+    argparser.add_argument('--eta', type=int, default=3, help='reduction factor between rungs')
+    argparser.add_argument('--smoothness-weight', type=float, default=1.0,
+                           help='weight of steering_smoothness in the objective')
+    argparser.add_argument('--top-k', type=int, default=3,
+                           help='configurations saved per controller')
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--output-dir', default=os.path.join('results', 'search'))
+    argparser.add_argument(
+        '--backend', choices=local_sim.BACKENDS, default='local',
+        help="'local' runs each rung as one local_sim batch; 'carla' runs the experiment "
+             "runner on --workers CARLA servers")
+    argparser.add_argument('--town', default='Town01')
+    argparser.add_argument('--host', default='localhost', help='CARLA server host')
+    argparser.add_argument('--port', type=int, default=2000,
+                           help='CARLA server port (worker i uses port + 2*i)')
+    argparser.add_argument('--workers', type=int, default=1,
+                           help='parallel workers, each with its own simulator')
+    argparser.add_argument('--no-abort', action='store_true',
+                           help='run diverging configurations for the full duration')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help="re-simulate experiments that have cached results "
+                                "(--backend carla)")
+    args = argparser.parse_args()
+
+    abort_criteria = None if args.no_abort else AbortCriteria()
+    if args.backend == 'local':
+        evaluator = BatchEvaluator(town=args.town, abort_criteria=abort_criteria)
+    else:
+        evaluator = SweepEvaluator(SweepExecutor(
+            num_workers=args.workers, backend=args.backend, host=args.host,
+            port=args.port, town=args.town, abort_criteria=abort_criteria,
+            result_cache=None if args.no_cache else ResultCache(),
+        ))
+
+    durations = rung_durations(args.min_duration, args.max_duration, args.eta)
+    rng = np.random.default_rng(args.seed)
+    history = []
+    ranked = {}
+
+    print("="*78)
+    print(f"HYPERPARAMETER SEARCH ({args.method}, rungs {', '.join(f'{d:g}s' for d in durations)})")
+    print("="*78)
+
+    for controller in args.controllers:
+        if args.method == 'hyperband':
+            ranked[controller] = hyperband(evaluator, controller, args.num_configs, durations,
+                                           args.eta, rng, args.smoothness_weight, history)
+        else:
+            configs = sample_configs(controller, args.num_configs, rng)
+            ranked[controller] = successive_halving(evaluator, controller, configs, durations,
+                                                    args.eta, args.smoothness_weight,
+                                                    history=history)
+
+    print("-"*78)
+    print(f"{'Experiment':<50} {'Mean Lat (m)':>12} {'Smoothness':>12}")
+    print("-"*78)
+    for controller, entries in ranked.items():
+        for _, _, metrics in entries[:args.top_k]:
+            print(f"{metrics['experiment_name']:<50} "
+                  f"{metrics['summary']['mean_lateral_error']:>12.3f} "
+                  f"{metrics['summary']['steering_smoothness']:>12.4f}")
+
+    save_results(ranked, history, args.output_dir, args.top_k)
+
+
+if __name__ == '__main__':
+    main()
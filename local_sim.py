@@ -0,0 +1,759 @@
+"""
+Offline Kinematic-Bicycle Simulator
+Pure-NumPy stand-in for the subset of the CARLA client API used by the
+controllers and experiment runners, driving on synthetic closed-loop roads
+"""
+
+import fnmatch
+import math
+import numpy as np
+
+from spatial_index import WaypointIndex
+
+
+BACKENDS = ('carla', 'local')
+
+# Simulation step used when the world has no fixed_delta_seconds
+DEFAULT_DELTA_SECONDS = 0.05
+
+# Longest integration step; longer ticks are split into substeps (seconds)
+MAX_SUBSTEP = 0.01
+
+# Vehicle model parameters (Tesla Model 3 class sedan)
+VEHICLE_PARAMS = {
+    'wheelbase': 2.875,                    # meters
+    'max_steer_angle': math.radians(70.0), # front wheel angle at steer=1
+    'steer_time_constant': 0.1,            # steering actuator lag (seconds)
+    'max_acceleration': 5.0,               # at throttle=1 (m/s^2)
+    'max_deceleration': 8.0,               # at brake=1 (m/s^2)
+    'rolling_resistance': 0.15,            # m/s^2
+    'drag_coefficient': 0.0012,            # 1/m, deceleration = c * v^2
+}
+
+
+def connect(backend='carla', host='localhost', port=2000):
+    """
+    Create a simulator client for a backend.
+
+    Args:
+        backend (str): 'carla' for a CARLA server, 'local' for this simulator
+        host (str): CARLA server host
+        port (int): CARLA server port
+
+    Returns:
+        Client: carla.Client or local_sim.Client
+    """
+    if backend == 'local':
+        return Client(host, port)
+    if backend != 'carla':
+        raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+
+    import carla
+    return carla.Client(host, port)
+
+
+def bicycle_step(x, y, yaw, speed, wheel_angle, steer, throttle, brake, dt,
+                 params=VEHICLE_PARAMS):
+    """
+    Advance kinematic bicycle states by one step.
+
+    The reference point is the center of gravity, halfway along the
+    wheelbase. All state and control arguments may be scalars or arrays of
+    equal shape, so any number of vehicles is stepped in one call.
+
+    Args:
+        x, y (np.ndarray): Position (meters)
+        yaw (np.ndarray): Heading (radians)
+        speed (np.ndarray): Forward speed (m/s)
+        wheel_angle (np.ndarray): Current front wheel angle (radians)
+        steer (np.ndarray): Steering command in [-1, 1]
+        throttle (np.ndarray): Throttle command in [0, 1]
+        brake (np.ndarray): Brake command in [0, 1]
+        dt (float): Step length (seconds)
+        params (dict): Vehicle model parameters
+
+    Returns:
+        tuple: (x, y, yaw, speed, wheel_angle) after the step
+    """
+    substeps = max(1, int(math.ceil(dt / MAX_SUBSTEP - 1e-9)))
+    h = dt / substeps
+
+    target_angle = np.clip(steer, -1.0, 1.0) * params['max_steer_angle']
+    accel = (np.clip(throttle, 0.0, 1.0) * params['max_acceleration'] -
+             np.clip(brake, 0.0, 1.0) * params['max_deceleration'])
+    steer_alpha = min(h / params['steer_time_constant'], 1.0)
+    half_wheelbase = 0.5 * params['wheelbase']
+
+    for _ in range(substeps):
+        wheel_angle = wheel_angle + steer_alpha * (target_angle - wheel_angle)
+
+        # Slip angle of the center of gravity
+        beta = np.arctan(0.5 * np.tan(wheel_angle))
+        x = x + speed * np.cos(yaw + beta) * h
+        y = y + speed * np.sin(yaw + beta) * h
+        yaw = yaw + speed / half_wheelbase * np.sin(beta) * h
+
+        resistance = params['rolling_resistance'] + params['drag_coefficient'] * speed**2
+        speed = np.maximum(speed + (accel - np.where(speed > 0.0, resistance, 0.0)) * h, 0.0)
+
+    yaw = np.arctan2(np.sin(yaw), np.cos(yaw))
+    return x, y, yaw, speed, wheel_angle
+
+
+# ==============================================================================
+# -- Basic types ---------------------------------------------------------------
+# ==============================================================================
+
+
+class Vector3D:
+    """3D vector (carla.Vector3D)."""
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def length(self):
+        return math.sqrt(self.x**2 + self.y**2 + self.z**2)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(x={self.x:.6f}, y={self.y:.6f}, z={self.z:.6f})"
+
+
+class Location(Vector3D):
+    """3D location in meters (carla.Location)."""
+
+    def distance(self, other):
+        return math.sqrt((self.x - other.x)**2 + (self.y - other.y)**2 +
+                         (self.z - other.z)**2)
+
+
+class Rotation:
+    """Rotation in degrees (carla.Rotation)."""
+
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        self.pitch = float(pitch)
+        self.yaw = float(yaw)
+        self.roll = float(roll)
+
+    def get_forward_vector(self):
+        yaw = math.radians(self.yaw)
+        return Vector3D(math.cos(yaw), math.sin(yaw), 0.0)
+
+    def __repr__(self):
+        return f"Rotation(pitch={self.pitch:.6f}, yaw={self.yaw:.6f}, roll={self.roll:.6f})"
+
+
+class Transform:
+    """Location and rotation (carla.Transform)."""
+
+    def __init__(self, location=None, rotation=None):
+        self.location = location if location is not None else Location()
+        self.rotation = rotation if rotation is not None else Rotation()
+
+    def get_forward_vector(self):
+        return self.rotation.get_forward_vector()
+
+    def __repr__(self):
+        return f"Transform({self.location}, {self.rotation})"
+
+
+class VehicleControl:
+    """Vehicle control command (carla.VehicleControl)."""
+
+    def __init__(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False,
+                 reverse=False, manual_gear_shift=False, gear=0):
+        self.throttle = throttle
+        self.steer = steer
+        self.brake = brake
+        self.hand_brake = hand_brake
+        self.reverse = reverse
+        self.manual_gear_shift = manual_gear_shift
+        self.gear = gear
+
+
+class WeatherParameters:
+    """Weather settings (carla.WeatherParameters). Stored but not simulated."""
+
+    def __init__(self, cloudiness=0.0, precipitation=0.0, sun_altitude_angle=45.0,
+                 **kwargs):
+        self.cloudiness = cloudiness
+        self.precipitation = precipitation
+        self.sun_altitude_angle = sun_altitude_angle
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+
+WeatherParameters.ClearNoon = WeatherParameters()
+WeatherParameters.CloudyNoon = WeatherParameters(cloudiness=60.0)
+WeatherParameters.WetNoon = WeatherParameters(precipitation_deposits=50.0)
+WeatherParameters.HardRainNoon = WeatherParameters(cloudiness=100.0, precipitation=100.0)
+WeatherParameters.ClearSunset = WeatherParameters(sun_altitude_angle=15.0)
+
+
+class WorldSettings:
+    """World settings (carla.WorldSettings)."""
+
+    def __init__(self, synchronous_mode=False, no_rendering_mode=False,
+                 fixed_delta_seconds=None):
+        self.synchronous_mode = synchronous_mode
+        self.no_rendering_mode = no_rendering_mode
+        self.fixed_delta_seconds = fixed_delta_seconds
+
+
+class Timestamp:
+    """Simulation time of a frame (carla.Timestamp)."""
+
+    def __init__(self, frame, elapsed_seconds, delta_seconds):
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = elapsed_seconds
+
+
+class ActorSnapshot:
+    """State of one actor in a world snapshot (carla.ActorSnapshot)."""
+
+    def __init__(self, actor_id, transform, velocity):
+        self.id = actor_id
+        self._transform = transform
+        self._velocity = velocity
+
+    def get_transform(self):
+        return self._transform
+
+    def get_velocity(self):
+        return self._velocity
+
+
+class WorldSnapshot:
+    """State of all vehicles at one frame (carla.WorldSnapshot)."""
+
+    def __init__(self, world):
+        self.frame = world.frame
+        self.timestamp = Timestamp(world.frame, world.elapsed_seconds, world.delta_seconds)
+        self._actors = {vehicle.id: ActorSnapshot(vehicle.id, vehicle.get_transform(),
+                                                  vehicle.get_velocity())
+                        for vehicle in world._vehicles}
+
+    @property
+    def id(self):
+        return self.frame
+
+    def find(self, actor_id):
+        return self._actors.get(actor_id)
+
+    def has_actor(self, actor_id):
+        return actor_id in self._actors
+
+    def __len__(self):
+        return len(self._actors)
+
+    def __iter__(self):
+        return iter(self._actors.values())
+
+
+# ==============================================================================
+# -- Roads and map -------------------------------------------------------------
+# ==============================================================================
+
+
+class Road:
+    """
+    Closed single-lane road sampled on a uniform arc-length grid.
+
+    Attributes:
+        x, y (np.ndarray): Centerline samples (meters)
+        yaw (np.ndarray): Unwrapped centerline heading (radians)
+        length (float): Road length (meters)
+        resolution (float): Arc-length spacing of the samples (meters)
+    """
+
+    def __init__(self, x, y, yaw, resolution, length):
+        self.x = x
+        self.y = y
+        self.yaw = yaw
+        self.resolution = resolution
+        self.length = length
+        self.index = WaypointIndex(x, y)
+
+    @classmethod
+    def from_segments(cls, segments, resolution=0.1):
+        """
+        Build a road from straight and arc segments, starting at the origin
+        heading along +x.
+
+        Args:
+            segments (list): ('straight', length) or ('arc', radius, degrees)
+                tuples; positive angles turn toward +yaw
+            resolution (float): Arc-length spacing of the samples (meters)
+
+        Returns:
+            Road: Sampled road
+        """
+        xs, ys, yaws = [], [], []
+        x0, y0, yaw0 = 0.0, 0.0, 0.0
+        total = 0.0
+
+        for segment in segments:
+            length = segment[1] if segment[0] == 'straight' else segment[1] * math.radians(abs(segment[2]))
+            # Samples fall on the global grid 0, resolution, 2 * resolution, ...
+            first = math.ceil(total / resolution - 1e-9) * resolution - total
+            u = np.arange(first, length - 1e-9, resolution)
+
+            if segment[0] == 'straight':
+                xs.append(x0 + u * math.cos(yaw0))
+                ys.append(y0 + u * math.sin(yaw0))
+                yaws.append(np.full_like(u, yaw0))
+                x0 += length * math.cos(yaw0)
+                y0 += length * math.sin(yaw0)
+            else:
+                radius, angle = segment[1], math.radians(segment[2])
+                turn = math.copysign(1.0, angle)
+                heading = yaw0 + turn * u / radius
+                # Center of the arc is to the left (turn > 0) or right of travel
+                cx = x0 - turn * radius * math.sin(yaw0)
+                cy = y0 + turn * radius * math.cos(yaw0)
+                xs.append(cx + turn * radius * np.sin(heading))
+                ys.append(cy - turn * radius * np.cos(heading))
+                yaws.append(heading)
+                yaw0 += angle
+                x0 = cx + turn * radius * math.sin(yaw0)
+                y0 = cy - turn * radius * math.cos(yaw0)
+            total += length
+
+        return cls(np.concatenate(xs), np.concatenate(ys), np.concatenate(yaws),
+                   resolution, total)
+
+    @classmethod
+    def from_polar(cls, radius, amplitude, lobes, resolution=0.1, samples=20000):
+        """
+        Build a road along the polar curve r = radius * (1 + amplitude * sin(lobes * theta)).
+
+        Args:
+            radius (float): Mean radius (meters)
+            amplitude (float): Relative radius variation
+            lobes (int): Number of bulges around the loop
+            resolution (float): Arc-length spacing of the samples (meters)
+            samples (int): Angular samples used before resampling
+
+        Returns:
+            Road: Sampled road
+        """
+        theta = np.linspace(0.0, 2.0 * np.pi, samples + 1)
+        r = radius * (1.0 + amplitude * np.sin(lobes * theta))
+        px, py = r * np.cos(theta), r * np.sin(theta)
+        s = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(px), np.diff(py)))))
+
+        grid = np.arange(0.0, s[-1] - 1e-9, resolution)
+        x = np.interp(grid, s, px)
+        y = np.interp(grid, s, py)
+        heading = np.unwrap(np.arctan2(np.gradient(py), np.gradient(px)))
+        yaw = np.interp(grid, s, heading)
+        return cls(x, y, yaw, resolution, float(s[-1]))
+
+    def pose_at(self, s):
+        """
+        Interpolate the centerline pose at an arc length (wraps around).
+
+        Args:
+            s (float): Arc length (meters)
+
+        Returns:
+            tuple: (x, y, yaw in radians)
+        """
+        n = len(self.x)
+        s %= self.length
+        i = min(int(s / self.resolution), n - 1)
+        j = (i + 1) % n
+        # The last sample connects back to the first over a shorter gap
+        gap = self.resolution if j else self.length - i * self.resolution
+        t = (s - i * self.resolution) / gap
+        dyaw = math.remainder(self.yaw[j] - self.yaw[i], 2.0 * math.pi)
+        return (float(self.x[i] + t * (self.x[j] - self.x[i])),
+                float(self.y[i] + t * (self.y[j] - self.y[i])),
+                float(self.yaw[i] + t * dyaw))
+
+    def project(self, x, y):
+        """
+        Arc length of the centerline sample closest to a point.
+
+        The samples are at most half a resolution step from the true
+        projection, which is far below the waypoint spacing.
+
+        Args:
+            x, y (float): Point (meters)
+
+        Returns:
+            float: Arc length (meters)
+        """
+        idx, _ = self.index.nearest(x, y)
+        return idx * self.resolution
+
+
+def _town01():
+    # City block: long straights joined by tight 90 degree corners
+    return Road.from_segments([
+        ('straight', 180.0), ('arc', 10.0, 90.0),
+        ('straight', 100.0), ('arc', 10.0, 90.0),
+        ('straight', 180.0), ('arc', 10.0, 90.0),
+        ('straight', 100.0), ('arc', 10.0, 90.0),
+    ])
+
+
+def _town02():
+    # Small block with shorter straights
+    return Road.from_segments([
+        ('straight', 100.0), ('arc', 8.0, 90.0),
+        ('straight', 60.0), ('arc', 8.0, 90.0),
+        ('straight', 100.0), ('arc', 8.0, 90.0),
+        ('straight', 60.0), ('arc', 8.0, 90.0),
+    ])
+
+
+def _town03():
+    # Winding loop with left and right curves of varying radius
+    return Road.from_polar(radius=80.0, amplitude=0.2, lobes=3)
+
+
+# Synthetic stand-ins for the towns the runners load. They share only the
+# character of the CARLA maps (grid corners or winding roads), not the layout.
+TOWNS = {
+    'Town01': _town01,
+    'Town02': _town02,
+    'Town03': _town03,
+}
+
+
+class Waypoint:
+    """Point on the road centerline (carla.Waypoint)."""
+
+    lane_id = -1
+    section_id = 0
+    lane_width = 3.5
+    is_junction = False
+
+    def __init__(self, road, s, road_id=1):
+        self._road = road
+        self.s = s % road.length
+        self.road_id = road_id
+        self.id = hash((road_id, round(self.s, 3)))
+        x, y, yaw = road.pose_at(self.s)
+        self.transform = Transform(Location(x, y, 0.0),
+                                   Rotation(yaw=math.degrees(math.remainder(yaw, 2.0 * math.pi))))
+
+    def next(self, distance):
+        return [Waypoint(self._road, self.s + distance, self.road_id)]
+
+    def previous(self, distance):
+        return [Waypoint(self._road, self.s - distance, self.road_id)]
+
+    def __repr__(self):
+        return f"Waypoint(road_id={self.road_id}, s={self.s:.2f})"
+
+
+class Map:
+    """Road network of a synthetic town (carla.Map)."""
+
+    def __init__(self, name, road, spawn_spacing=50.0):
+        self.name = f"Carla/Maps/{name}"
+        self.road = road
+        self.spawn_spacing = spawn_spacing
+
+    def get_waypoint(self, location, project_to_road=True, lane_type=None):
+        return Waypoint(self.road, self.road.project(location.x, location.y))
+
+    def generate_waypoints(self, distance):
+        return [Waypoint(self.road, s) for s in np.arange(0.0, self.road.length, distance)]
+
+    def get_spawn_points(self):
+        spawn_points = []
+        for s in np.arange(0.0, self.road.length, self.spawn_spacing):
+            transform = Waypoint(self.road, s).transform
+            transform.location.z = 0.5
+            spawn_points.append(transform)
+        return spawn_points
+
+
+# ==============================================================================
+# -- Actors --------------------------------------------------------------------
+# ==============================================================================
+
+
+class ActorBlueprint:
+    """Blueprint used to spawn an actor (carla.ActorBlueprint)."""
+
+    def __init__(self, blueprint_id, tags, attributes=None):
+        self.id = blueprint_id
+        self.tags = list(tags)
+        self._attributes = dict(attributes or {})
+
+    def has_tag(self, tag):
+        return tag in self.tags
+
+    def has_attribute(self, name):
+        return name in self._attributes
+
+    def set_attribute(self, name, value):
+        self._attributes[name] = value
+
+    def get_attribute(self, name):
+        return self._attributes[name]
+
+
+class BlueprintLibrary:
+    """Available blueprints (carla.BlueprintLibrary)."""
+
+    def __init__(self):
+        self._blueprints = [
+            ActorBlueprint('vehicle.tesla.model3', ['vehicle', 'tesla', 'model3']),
+            ActorBlueprint('vehicle.lincoln.mkz_2020', ['vehicle', 'lincoln', 'mkz_2020']),
+            ActorBlueprint('sensor.camera.rgb', ['sensor', 'camera', 'rgb'],
+                           {'image_size_x': '800', 'image_size_y': '600', 'fov': '90'}),
+        ]
+
+    def filter(self, wildcard_pattern):
+        return [bp for bp in self._blueprints
+                if fnmatch.fnmatch(bp.id, wildcard_pattern) or
+                any(fnmatch.fnmatch(tag, wildcard_pattern) for tag in bp.tags)]
+
+    def find(self, blueprint_id):
+        for bp in self._blueprints:
+            if bp.id == blueprint_id:
+                return bp
+        raise IndexError(f"blueprint '{blueprint_id}' not found")
+
+    def __iter__(self):
+        return iter(self._blueprints)
+
+    def __len__(self):
+        return len(self._blueprints)
+
+
+class Actor:
+    """Base actor (carla.Actor)."""
+
+    def __init__(self, world, actor_id, type_id):
+        self._world = world
+        self.id = actor_id
+        self.type_id = type_id
+        self.is_alive = True
+
+    def get_world(self):
+        return self._world
+
+    def get_location(self):
+        return self.get_transform().location
+
+    def destroy(self):
+        if not self.is_alive:
+            return False
+        self.is_alive = False
+        self._world._remove(self)
+        return True
+
+
+class Vehicle(Actor):
+    """Vehicle driven by the kinematic bicycle model (carla.Vehicle)."""
+
+    def __init__(self, world, actor_id, type_id, row):
+        super().__init__(world, actor_id, type_id)
+        self._row = row
+        self._control = VehicleControl()
+
+    def get_transform(self):
+        x, y, yaw = self._world._state[self._row, :3]
+        return Transform(Location(x, y, 0.0), Rotation(yaw=math.degrees(yaw)))
+
+    def get_velocity(self):
+        _, _, yaw, speed, _ = self._world._state[self._row]
+        return Vector3D(speed * math.cos(yaw), speed * math.sin(yaw), 0.0)
+
+    def get_control(self):
+        return self._control
+
+    def apply_control(self, control):
+        self._control = control
+        self._world._controls[self._row] = (control.steer, control.throttle, control.brake)
+
+    def set_transform(self, transform):
+        # Teleporting leaves the vehicle at rest with straight wheels
+        self._world._state[self._row] = (transform.location.x, transform.location.y,
+                                         math.radians(transform.rotation.yaw), 0.0, 0.0)
+        self._world._snapshot = None
+
+
+class Sensor(Actor):
+    """Sensor attached to an actor (carla.Sensor). Produces no data offline."""
+
+    def __init__(self, world, actor_id, type_id, transform, parent):
+        super().__init__(world, actor_id, type_id)
+        self._transform = transform
+        self.parent = parent
+        self.is_listening = False
+
+    def get_transform(self):
+        if self.parent is not None:
+            return self.parent.get_transform()
+        return self._transform
+
+    def listen(self, callback):
+        self.is_listening = True
+
+    def stop(self):
+        self.is_listening = False
+
+
+# ==============================================================================
+# -- World and client ----------------------------------------------------------
+# ==============================================================================
+
+
+class World:
+    """
+    Simulated world (carla.World).
+
+    Vehicle states live in one array with a row per vehicle, so a tick steps
+    every vehicle with a single vectorized bicycle_step call.
+    """
+
+    def __init__(self, town_map):
+        self._map = town_map
+        self._settings = WorldSettings()
+        self._weather = WeatherParameters.ClearNoon
+        self._blueprints = BlueprintLibrary()
+
+        self.frame = 0
+        self.elapsed_seconds = 0.0
+        self.delta_seconds = 0.0
+
+        # Rows: x, y, yaw, speed, wheel angle | steer, throttle, brake
+        self._state = np.zeros((0, 5))
+        self._controls = np.zeros((0, 3))
+        self._vehicles = []
+        self._sensors = []
+        self._next_id = 1
+        self._snapshot = None
+
+    def get_map(self):
+        return self._map
+
+    def get_settings(self):
+        return WorldSettings(self._settings.synchronous_mode,
+                             self._settings.no_rendering_mode,
+                             self._settings.fixed_delta_seconds)
+
+    def apply_settings(self, settings):
+        self._settings = WorldSettings(settings.synchronous_mode,
+                                       settings.no_rendering_mode,
+                                       settings.fixed_delta_seconds)
+        return self.frame
+
+    def get_weather(self):
+        return self._weather
+
+    def set_weather(self, weather):
+        self._weather = weather
+
+    def get_blueprint_library(self):
+        return self._blueprints
+
+    def get_actors(self):
+        return list(self._vehicles) + list(self._sensors)
+
+    def get_snapshot(self):
+        if self._snapshot is None or self._snapshot.frame != self.frame:
+            self._snapshot = WorldSnapshot(self)
+        return self._snapshot
+
+    def spawn_actor(self, blueprint, transform, attach_to=None):
+        actor_id = self._next_id
+        self._next_id += 1
+
+        if blueprint.id.startswith('sensor.'):
+            sensor = Sensor(self, actor_id, blueprint.id, transform, attach_to)
+            self._sensors.append(sensor)
+            return sensor
+
+        vehicle = Vehicle(self, actor_id, blueprint.id, len(self._vehicles))
+        self._state = np.vstack((self._state, np.zeros(5)))
+        self._controls = np.vstack((self._controls, np.zeros(3)))
+        self._vehicles.append(vehicle)
+        vehicle.set_transform(transform)
+        self._snapshot = None
+        return vehicle
+
+    def try_spawn_actor(self, blueprint, transform, attach_to=None):
+        return self.spawn_actor(blueprint, transform, attach_to)
+
+    def _remove(self, actor):
+        if isinstance(actor, Sensor):
+            self._sensors.remove(actor)
+            return
+        row = actor._row
+        self._state = np.delete(self._state, row, axis=0)
+        self._controls = np.delete(self._controls, row, axis=0)
+        del self._vehicles[row]
+        for vehicle in self._vehicles[row:]:
+            vehicle._row -= 1
+        self._snapshot = None
+
+    def tick(self, seconds=10.0):
+        """
+        Advance the simulation by one step.
+
+        Returns:
+            int: New frame id
+        """
+        dt = self._settings.fixed_delta_seconds or DEFAULT_DELTA_SECONDS
+
+        if self._vehicles:
+            state = self._state
+            controls = self._controls
+            (state[:, 0], state[:, 1], state[:, 2],
+             state[:, 3], state[:, 4]) = bicycle_step(
+                state[:, 0], state[:, 1], state[:, 2], state[:, 3], state[:, 4],
+                controls[:, 0], controls[:, 1], controls[:, 2], dt
+            )
+
+        self.frame += 1
+        self.elapsed_seconds += dt
+        self.delta_seconds = dt
+        return self.frame
+
+    def wait_for_tick(self, seconds=10.0):
+        self.tick()
+        return self.get_snapshot()
+
+
+class Client:
+    """Client for the offline simulator (carla.Client)."""
+
+    def __init__(self, host='localhost', port=2000, worker_threads=0):
+        self.host = host
+        self.port = port
+        self._world = None
+
+    def set_timeout(self, seconds):
+        pass
+
+    def get_client_version(self):
+        return 'local'
+
+    def get_server_version(self):
+        return 'local'
+
+    def get_available_maps(self):
+        return [f"/Game/Carla/Maps/{name}" for name in TOWNS]
+
+    def load_world(self, map_name):
+        name = map_name.rsplit('/', 1)[-1]
+        if name not in TOWNS:
+            raise RuntimeError(f"map '{map_name}' not found")
+        self._world = World(Map(name, TOWNS[name]()))
+        return self._world
+
+    def get_world(self):
+        if self._world is None:
+            self.load_world('Town01')
+        return self._world
@@ -0,0 +1,443 @@
+"""
+Columnar Metric Recorder
+Logs per-tick experiment metrics into preallocated NumPy arrays (one per
+channel) instead of growing Python lists, so summary statistics run directly
+on the columns and a run's traces take 8 bytes per value. Logging a tick costs
+more than the list appends it replaces (see benchmark_metric_recorder.py); the
+gain is memory. StreamingRecorder writes long runs to disk in fixed-size chunks
+instead
+"""
+
+import json
+import os
+import queue
+import threading
+import numpy as np
+
+from online_stats import LATERAL_ERROR_QUANTILES, quantile_key
+
+
+# Per-tick traces logged by every runner, in the order they are saved
+TRACE_CHANNELS = ('lateral_errors', 'heading_errors', 'steering_angles', 'speeds', 'timestamps')
+
+# Vehicle position, saved as {'x': [...], 'y': [...], 'z': [...]}
+POSITION_CHANNELS = ('x', 'y', 'z')
+
+# Projection onto the path: signed cross-track error and arc length
+PATH_CHANNELS = ('cross_track_errors', 'arc_lengths')
+
+# Vehicle heading (radians). With the positions, the trajectory that
+# recompute_metrics.py derives the tracking metrics from
+YAW_CHANNELS = ('yaws',)
+
+# Streamed traces live next to the results, out of the result loaders' way
+TRACE_STREAM_DIR = '.traces'
+STREAM_SUFFIX = '.trace'
+
+
+class MetricRecorder:
+    """
+    Growable float64 columns, one preallocated array per logged channel.
+
+    The columns are allocated for the expected number of ticks and double
+    when they fill up. Each append writes one value into every column, which
+    makes logging a tick about 3x as expensive as the list appends it
+    replaces (1-1.5 microseconds more for the extended runner's 14 channels);
+    the cheaper summary and export do not make up for it. The recorder pays
+    off in memory only: about 2.4x less for the extended runner's traces.
+
+    Text channels (e.g. the active sub-controller of the hybrid) are stored
+    as integer codes into a per-channel label list.
+    """
+
+    def __init__(self, channels, capacity=1024, labels=()):
+        """
+        Initialize the recorder.
+
+        Args:
+            channels (sequence): Channel names, in the order append takes them
+            capacity (int): Number of rows to preallocate
+            labels (sequence): Channels holding text labels (logged with
+                label_code)
+        """
+        self.channels = tuple(channels)
+        self.columns = {name: i for i, name in enumerate(self.channels)}
+        self.labels = {name: [] for name in labels}
+        self._label_codes = {name: {} for name in labels}
+        self._rows = 0
+        self._capacity = 0
+        self._data = []
+        self._allocate(max(int(capacity), 1))
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def append(self, *values):
+        """
+        Log one tick.
+
+        Args:
+            *values: One number per channel, in channel order
+        """
+        if len(values) != len(self._data):
+            raise ValueError(f"Expected {len(self._data)} values per row, got {len(values)}")
+        if self._rows >= self._capacity:
+            self._allocate(2 * self._capacity)
+        row = self._rows
+        for column, value in zip(self._data, values):
+            column[row] = value
+        self._rows = row + 1
+
+    def close(self):
+        """
+        Finish logging (nothing to do for an in-memory recorder).
+        """
+
+    def label_code(self, channel, label):
+        """
+        Numeric code of a text label, to pass to append.
+
+        Args:
+            channel (str): Label channel
+            label (str): Text value
+
+        Returns:
+            int: Index of the label in self.labels[channel]
+        """
+        codes = self._label_codes[channel]
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(self.labels[channel])
+            self.labels[channel].append(label)
+        return code
+
+    def column(self, name):
+        """
+        Logged values of one channel.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            np.ndarray: View of the logged rows (not a copy)
+        """
+        return self._data[self.columns[name]][:self._rows]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def to_dict(self, channels=None):
+        """
+        Logged channels as JSON-serializable lists.
+
+        Args:
+            channels (sequence): Channels to export (default: all)
+
+        Returns:
+            dict: Channel name -> list of floats (label channels -> list of
+                labels)
+        """
+        exported = {}
+        for name in channels if channels is not None else self.channels:
+            values = self.column(name)
+            if name in self.labels:
+                labels = self.labels[name]
+                exported[name] = [labels[code] for code in values.astype(np.intp).tolist()]
+            else:
+                exported[name] = values.tolist()
+        return exported
+
+    def _allocate(self, capacity):
+        """
+        Move the logged rows into new columns with room for capacity rows.
+        """
+        data = [np.empty(capacity) for _ in self.channels]
+        for column, logged in zip(data, self._data):
+            column[:self._rows] = logged[:self._rows]
+        self._data = data
+        self._capacity = capacity
+
+
+class StreamingRecorder(MetricRecorder):
+    """
+    MetricRecorder that keeps only one chunk of rows in memory.
+
+    Every time the chunk fills up it is handed to a background thread, which
+    appends it to a raw float64 file and syncs it to disk while the run
+    carries on. A JSON header next to the data file describes the channels
+    and text labels. Memory stays bounded by a few chunks however long the
+    run, and if the process dies, all fully written rows can be read back
+    with StreamingRecorder.open.
+
+    Columns can only be read after close(). They are then memory-mapped from
+    the data file rather than loaded.
+    """
+
+    def __init__(self, channels, filepath, chunk_rows=1024, labels=(), metadata=None):
+        """
+        Start a trace stream (an existing one at filepath is replaced).
+
+        Args:
+            channels (sequence): Channel names, in the order append takes them
+            filepath (str): Data file (the header is written next to it)
+            chunk_rows (int): Rows per chunk written to disk
+            labels (sequence): Channels holding text labels
+            metadata (dict): JSON-serializable run description stored in the
+                header (e.g. the experiment name)
+        """
+        super().__init__(channels, capacity=chunk_rows, labels=labels)
+        self.filepath = filepath
+        self.metadata = dict(metadata or {})
+        self.closed = False
+        self._rows_written = 0
+        self._label_count = 0
+        self._error = None
+
+        # At most two chunks queued: a slow disk stalls the run instead of
+        # letting memory grow
+        self._queue = queue.Queue(maxsize=2)
+
+        # Unlink rather than truncate: an earlier run of the same name may
+        # still be memory-mapped, and truncating under a mapping crashes it
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        self._write_header(self.labels, complete=False)
+        open(filepath, 'wb').close()
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def header_file(filepath):
+        """
+        Header that belongs to a trace data file.
+        """
+        return os.path.splitext(filepath)[0] + '.json'
+
+    @classmethod
+    def open(cls, filepath):
+        """
+        Read back a trace stream, complete or cut short by a crash.
+
+        Args:
+            filepath (str): Data file
+
+        Returns:
+            StreamingRecorder: Closed recorder over the fully written rows
+        """
+        with open(cls.header_file(filepath), 'r') as f:
+            header = json.load(f)
+
+        recorder = cls.__new__(cls)
+        MetricRecorder.__init__(recorder, header['channels'], capacity=1,
+                                labels=tuple(header['labels']))
+        recorder.filepath = filepath
+        recorder.metadata = header['metadata']
+        recorder.complete = header['complete']
+        for channel, labels in header['labels'].items():
+            for label in labels:
+                recorder.label_code(channel, label)
+        recorder._map_rows()
+        return recorder
+
+    def __len__(self):
+        return self._rows_written + self._rows
+
+    def append(self, *values):
+        """
+        Log one tick.
+
+        Args:
+            *values: One number per channel, in channel order
+        """
+        if len(values) != len(self._data):
+            raise ValueError(f"Expected {len(self._data)} values per row, got {len(values)}")
+        if self._rows >= self._capacity:
+            self._flush_chunk()
+        row = self._rows
+        for column, value in zip(self._data, values):
+            column[row] = value
+        self._rows = row + 1
+
+    def close(self):
+        """
+        Write the last partial chunk, stop the writer thread and map the
+        written rows for reading.
+        """
+        if self.closed:
+            return
+        self._flush_chunk()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        self._write_header(self.labels, complete=True)
+        self.complete = True
+        self._map_rows()
+
+    def column(self, name):
+        """
+        Logged values of one channel.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            np.ndarray: View of the memory-mapped data file
+        """
+        if not self.closed:
+            raise RuntimeError("Close the trace stream before reading its columns")
+        return super().column(name)
+
+    def to_dict(self, channels=None):
+        """
+        Logged channels, as arrays mapped from the data file (label channels
+        as lists of labels), to keep long traces out of memory.
+
+        Args:
+            channels (sequence): Channels to export (default: all)
+
+        Returns:
+            dict: Channel name -> values
+        """
+        exported = {}
+        for name in channels if channels is not None else self.channels:
+            values = self.column(name)
+            if name in self.labels:
+                labels = self.labels[name]
+                values = [labels[code] for code in values.astype(np.intp).tolist()]
+            exported[name] = values
+        return exported
+
+    def _flush_chunk(self):
+        """
+        Hand the current chunk to the writer thread and start a new one.
+        """
+        if self._error is not None:
+            raise self._error
+        rows = self._rows
+        if not rows:
+            return
+
+        # Send the labels along whenever new ones appeared, so the header on
+        # disk always covers the codes in the data
+        labels = None
+        label_count = sum(len(names) for names in self.labels.values())
+        if label_count != self._label_count:
+            labels = {channel: list(names) for channel, names in self.labels.items()}
+            self._label_count = label_count
+
+        # Rows are interleaved into a new array, so the columns can be
+        # reused for the next chunk right away
+        chunk = np.column_stack([column[:rows] for column in self._data])
+        self._queue.put((chunk, labels))
+        self._rows_written += rows
+        self._rows = 0
+
+    def _write_chunks(self):
+        """
+        Writer thread: append queued chunks to the data file until closed.
+        """
+        try:
+            with open(self.filepath, 'ab') as f:
+                while True:
+                    item = self._queue.get()
+                    if item is None:
+                        return
+                    chunk, labels = item
+                    if labels is not None:
+                        self._write_header(labels, complete=False)
+                    f.write(chunk.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException as error:
+            self._error = error
+            # Keep draining so the run never blocks on a full queue
+            while self._queue.get() is not None:
+                pass
+
+    def _write_header(self, labels, complete):
+        """
+        Atomically replace the header file.
+        """
+        header = {
+            'channels': list(self.channels),
+            'labels': labels,
+            'dtype': np.dtype(np.float64).str,
+            'complete': complete,
+            'metadata': self.metadata,
+        }
+        filepath = self.header_file(self.filepath)
+        tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_filepath, 'w') as f:
+            json.dump(header, f, indent=2)
+        os.replace(tmp_filepath, filepath)
+
+    def _map_rows(self):
+        """
+        Memory-map the fully written rows of the data file.
+        """
+        width = len(self.channels)
+        rows = os.path.getsize(self.filepath) // (8 * width)
+        if rows:
+            data = np.memmap(self.filepath, dtype=np.float64, mode='r', shape=(rows, width))
+        else:
+            data = np.empty((0, width))
+        self._data = [data[:, i] for i in range(width)]
+        self._rows_written = 0
+        self._rows = self._capacity = rows
+        self.closed = True
+
+
+def trace_fields(recorder):
+    """
+    Logged traces in the layout the runners save (positions grouped).
+
+    Args:
+        recorder (MetricRecorder): Recorder with the TRACE_CHANNELS
+
+    Returns:
+        dict: Field name -> trace
+    """
+    fields = {}
+    for name, values in recorder.to_dict().items():
+        if name in POSITION_CHANNELS:
+            fields.setdefault('positions', {})[name] = values
+        else:
+            fields[name] = values
+    return fields
+
+
+def summarize(recorder):
+    """
+    Summary statistics of the common traces, computed on the columns, for
+    runs whose summary was not kept during the run (e.g. recovered streams).
+    Quantiles are exact here, where the runners' online ones are estimates.
+
+    Args:
+        recorder (MetricRecorder): Recorder with the TRACE_CHANNELS
+
+    Returns:
+        dict: Runners' summary keys for the tracking errors, steering and
+            speed
+    """
+    lateral_errors = recorder['lateral_errors']
+    abs_heading_errors = np.abs(recorder['heading_errors'])
+    steering_angles = recorder['steering_angles']
+    summary = {
+        'mean_lateral_error': np.mean(lateral_errors),
+        'max_lateral_error': np.max(lateral_errors),
+        'std_lateral_error': np.std(lateral_errors),
+        'mean_abs_heading_error': np.mean(abs_heading_errors),
+        'max_abs_heading_error': np.max(abs_heading_errors),
+        'steering_smoothness': np.std(np.diff(steering_angles)) if len(steering_angles) > 1 else 0,
+        'mean_speed': np.mean(recorder['speeds']),
+    }
+    quantiles = np.percentile(lateral_errors, [100 * p for p in LATERAL_ERROR_QUANTILES])
+    for p, value in zip(LATERAL_ERROR_QUANTILES, quantiles):
+        summary[quantile_key(p)] = value
+    return summary
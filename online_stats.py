@@ -0,0 +1,250 @@
+"""
+Online Run Statistics
+Summary statistics updated one tick at a time in constant memory: Welford
+mean/variance with running extrema, and P² streaming quantile estimates. The
+runners update a RunSummary every tick, so a run's summary is available live
+and does not need the full traces
+"""
+
+import math
+
+
+# Lateral error quantiles reported in the summaries
+LATERAL_ERROR_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def quantile_key(p):
+    """
+    Summary key of a lateral error quantile, e.g. 'p95_lateral_error'.
+    """
+    return f"p{p * 100:g}_lateral_error"
+
+
+class RunningStats:
+    """
+    Count, mean, variance and extrema of a stream of values (Welford's
+    algorithm, numerically stable for long runs). Statistics of an empty
+    stream are NaN (the variance 0).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+
+    def update(self, value):
+        """
+        Add one value.
+
+        Args:
+            value (float): New observation
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+    @property
+    def mean(self):
+        return self._mean if self.count else math.nan
+
+    @property
+    def min(self):
+        return self._min if self.count else math.nan
+
+    @property
+    def max(self):
+        return self._max if self.count else math.nan
+
+    @property
+    def variance(self):
+        """
+        Population variance (as np.var), 0 before the first value.
+        """
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        """
+        Population standard deviation (as np.std).
+        """
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P² algorithm (Jain and
+    Chlamtac, 1985).
+
+    Five markers track the minimum, the quantile, the maximum and two points
+    in between. Each new value shifts marker positions, and the middle
+    markers' heights are adjusted with a piecewise-parabolic fit, so the
+    estimate needs constant memory and time per value. The first five values
+    are kept and give the exact quantile.
+    """
+
+    def __init__(self, p):
+        """
+        Args:
+            p (float): Quantile to estimate, in (0, 1)
+        """
+        if not 0.0 < p < 1.0:
+            raise ValueError(f"Quantile must be in (0, 1), got {p}")
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self._increments = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+
+    def update(self, value):
+        """
+        Add one value.
+
+        Args:
+            value (float): New observation
+        """
+        value = float(value)
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        # Cell the value falls into, stretching the extreme markers
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions = self._positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        desired = self._desired
+        for i in range(5):
+            desired[i] += self._increments[i]
+
+        # Move the middle markers one position towards where they should be
+        for i in (1, 2, 3):
+            offset = desired[i] - positions[i]
+            if ((offset >= 1 and positions[i + 1] - positions[i] > 1) or
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        """
+        Piecewise-parabolic prediction of marker i's height after a move.
+        """
+        q = self._heights
+        n = self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        """
+        Current quantile estimate (exact, as np.percentile, for up to five
+        values; NaN before the first).
+        """
+        if self.count > 5:
+            return self._heights[2]
+        if not self.count:
+            return math.nan
+        rank = self.p * (self.count - 1)
+        lower = int(rank)
+        upper = min(lower + 1, self.count - 1)
+        return self._heights[lower] + (rank - lower) * (self._heights[upper] - self._heights[lower])
+
+
+class RunSummary:
+    """
+    Summary of one run, updated every tick.
+
+    Tracks the lateral error (mean, std, max and quantiles), the absolute
+    heading error, the tick-to-tick steering change (its std is the
+    steering smoothness) and the speed. summary() returns the runners'
+    summary keys at any point of the run; before the first tick every value
+    is None (null in the results JSON, where NaN is not valid).
+    """
+
+    def __init__(self, quantiles=LATERAL_ERROR_QUANTILES):
+        """
+        Args:
+            quantiles (sequence): Lateral error quantiles to estimate
+        """
+        self.lateral_errors = RunningStats()
+        self.abs_heading_errors = RunningStats()
+        self.steering_changes = RunningStats()
+        self.speeds = RunningStats()
+        self.lateral_quantiles = [P2Quantile(p) for p in quantiles]
+        self._last_steering = None
+
+    def update(self, lateral_error, heading_error, steering, speed):
+        """
+        Add one tick.
+
+        Args:
+            lateral_error (float): Lateral (cross-track) error
+            heading_error (float): Heading error (sign ignored)
+            steering (float): Steering command
+            speed (float): Vehicle speed
+        """
+        self.lateral_errors.update(lateral_error)
+        self.abs_heading_errors.update(abs(heading_error))
+        self.speeds.update(speed)
+        for quantile in self.lateral_quantiles:
+            quantile.update(lateral_error)
+        if self._last_steering is not None:
+            self.steering_changes.update(steering - self._last_steering)
+        self._last_steering = steering
+
+    @property
+    def count(self):
+        return self.lateral_errors.count
+
+    def summary(self):
+        """
+        Summary statistics of the ticks so far.
+
+        Returns:
+            dict: mean/max/std lateral error, mean/max absolute heading
+                error, steering smoothness, mean speed and lateral error
+                quantiles (p50_lateral_error, ...); None values if no tick
+                was added
+        """
+        summary = {
+            'mean_lateral_error': self.lateral_errors.mean,
+            'max_lateral_error': self.lateral_errors.max,
+            'std_lateral_error': self.lateral_errors.std,
+            'mean_abs_heading_error': self.abs_heading_errors.mean,
+            'max_abs_heading_error': self.abs_heading_errors.max,
+            'steering_smoothness': self.steering_changes.std,
+            'mean_speed': self.speeds.mean,
+        }
+        for quantile in self.lateral_quantiles:
+            summary[quantile_key(quantile.p)] = quantile.value
+        if not self.count:
+            return dict.fromkeys(summary)
+        return summary
@@ -0,0 +1,57 @@
+"""
+Per-tick Path Query Cache
+Computes the closest-path match for a vehicle state once and shares it
+between controllers, sub-controllers and runner logging
+"""
+
+
+class PathQuery:
+    """
+    Vehicle state and closest-waypoint match for one simulation frame.
+    """
+
+    __slots__ = ('frame', 'vehicle_id', 'path', 'state', 'transform', 'location',
+                 'yaw', 'speed', 'closest_idx', 'closest_distance')
+
+    def __init__(self, state, path, closest_idx, closest_distance):
+        self.frame = state.frame
+        self.vehicle_id = state.vehicle_id
+        self.path = path
+        self.state = state
+        self.transform = state.transform
+        self.location = state.location
+        self.yaw = state.yaw
+        self.speed = state.speed
+        self.closest_idx = closest_idx
+        self.closest_distance = closest_distance
+
+
+def query_path(state, path, tracker):
+    """
+    Return the closest path match for a vehicle state.
+
+    The first caller for a state pays for the closest-waypoint search; later
+    callers with the same state (sub-controllers, runner logging) reuse the
+    result. The result is kept on the state itself, and the runners capture
+    a new state every tick and after every teleport, so it never outlives
+    the vehicle position it was computed for.
+
+    Args:
+        state (VehicleState): Vehicle state for the current frame
+        path (Path): Array-backed path
+        tracker (ClosestPointTracker): Caller's warm-started search state
+
+    Returns:
+        PathQuery: Shared query result for the state
+    """
+    query = state.path_query
+    if query is not None and query.path is path:
+        # Keep the caller's tracker warm for frames where it searches itself
+        tracker.sync(path, query.closest_idx)
+        return query
+
+    closest_idx, closest_distance = tracker.find(path, state.x, state.y)
+
+    query = PathQuery(state, path, closest_idx, closest_distance)
+    state.path_query = query
+    return query
@@ -4,7 +4,15 @@ Implements geometric path tracking using lookahead distance
 """
 
 import numpy as np
-import carla
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
+
+from path_query import query_path
+from vehicle_state import VehicleState
+from waypoint_path import BatchClosestPointTracker, ClosestPointTracker, as_path
 
 
 class PurePursuitController:
@@ -26,53 +34,63 @@ class PurePursuitController:
         self.lookahead_distance = lookahead_distance
         self.wheelbase = wheelbase
         self.target_speed = 30.0  # km/h
+        self.tracker = ClosestPointTracker()
+        self.batch_tracker = BatchClosestPointTracker()
+        
+    def reset(self):
+        """
+        Reset per-run state (call after the vehicle is teleported).
+        """
+        self.tracker.reset()
+        self.batch_tracker.reset()
+    
+    def params(self):
+        """
+        Constructor parameters (identify the configuration, not its state).
         
-    def find_lookahead_point(self, vehicle_location, vehicle_transform, waypoints):
+        Returns:
+            dict: Keyword arguments that rebuild this controller
+        """
+        return {'lookahead_distance': self.lookahead_distance, 'wheelbase': self.wheelbase}
+    
+    def find_lookahead_point(self, vehicle_location, vehicle_transform, path,
+                             closest_idx=None):
         """
         Find the lookahead point on the path.
         
+        The vehicle is projected onto the path and the target is interpolated
+        one lookahead distance further along the arc length, so the target
+        moves continuously between waypoints regardless of their spacing.
+        
         Args:
             vehicle_location: Current vehicle location (carla.Location)
             vehicle_transform: Current vehicle transform (carla.Transform)
-            waypoints: List of waypoints representing the path
+            path (Path): Array-backed path
+            closest_idx (int): Closest waypoint index if already known
             
         Returns:
-            carla.Location: The lookahead point, or None if not found
+            tuple: (x, y) of the lookahead point
         """
-        # Get vehicle's forward vector
-        vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
-        
-        min_distance = float('inf')
-        closest_waypoint_idx = 0
+        vehicle_x = vehicle_location.x
+        vehicle_y = vehicle_location.y
         
         # Find closest waypoint
-        for i, waypoint in enumerate(waypoints):
-            distance = vehicle_location.distance(waypoint.transform.location)
-            if distance < min_distance:
-                min_distance = distance
-                closest_waypoint_idx = i
-        
-        # Search forward from closest waypoint for lookahead point
-        for i in range(closest_waypoint_idx, min(closest_waypoint_idx + 50, len(waypoints))):
-            waypoint = waypoints[i]
-            distance = vehicle_location.distance(waypoint.transform.location)
-            
-            if distance >= self.lookahead_distance:
-                return waypoint.transform.location
+        if closest_idx is None:
+            closest_idx, _ = self.tracker.find(path, vehicle_x, vehicle_y)
         
-        # If no point found at exact lookahead distance, return furthest point
-        if closest_waypoint_idx + 30 < len(waypoints):
-            return waypoints[closest_waypoint_idx + 30].transform.location
-        else:
-            return waypoints[-1].transform.location
+        # Arc length of the vehicle's projection onto the path
+        vehicle_s = path.project(vehicle_x, vehicle_y, closest_idx)
+        
+        # Target point one lookahead distance further along the path
+        return path.interpolate(vehicle_s + self.lookahead_distance)
     
-    def compute_steering(self, vehicle_transform, target_location):
+    def compute_steering(self, vehicle_transform, target_point):
         """
         Compute steering angle using Pure Pursuit algorithm.
         
         Args:
             vehicle_transform: Current vehicle transform (carla.Transform)
-            target_location: Target lookahead point (carla.Location)
+            target_point (tuple): Target lookahead point (x, y)
             
         Returns:
             float: Steering angle in radians (normalized to [-1, 1] for CARLA)
@@ -82,8 +100,8 @@ class PurePursuitController:
         vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
         
         # Vector from vehicle to target
-        dx = target_location.x - vehicle_location.x
-        dy = target_location.y - vehicle_location.y
+        dx = target_point[0] - vehicle_location.x
+        dy = target_point[1] - vehicle_location.y
         
         # Transform to vehicle's local coordinate frame
         local_x = dx * np.cos(vehicle_yaw) + dy * np.sin(vehicle_yaw)
@@ -102,34 +120,94 @@ class PurePursuitController:
         
         return normalized_steering
     
-    def run_step(self, vehicle, waypoints):
+    def compute_steering_batch(self, x, y, yaw, speed, path, closest_idx=None):
+        """
+        Vectorized Pure Pursuit steering for many vehicle states at once.
+        
+        Matches find_lookahead_point + compute_steering per state. The
+        lookahead_distance and wheelbase attributes may be scalars or arrays
+        with one entry per state.
+        
+        Args:
+            x, y (np.ndarray): Vehicle positions (meters)
+            yaw (np.ndarray): Vehicle headings (radians)
+            speed (np.ndarray): Vehicle speeds (m/s), unused by Pure Pursuit
+            path (Path): Array-backed path
+            closest_idx (np.ndarray): Closest waypoint indices if already known
+            
+        Returns:
+            np.ndarray: Steering commands normalized to [-1, 1]
+        """
+        path = as_path(path)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        yaw = np.asarray(yaw, dtype=np.float64)
+        if closest_idx is None:
+            closest_idx, _ = self.batch_tracker.find(path, x, y)
+        
+        # Lookahead points one lookahead distance past each projection
+        vehicle_s = path.project_batch(x, y, closest_idx)
+        target_x, target_y = path.interpolate_batch(vehicle_s + self.lookahead_distance)
+        
+        # Transform to each vehicle's local coordinate frame
+        dx = target_x - x
+        dy = target_y - y
+        local_x = dx * np.cos(yaw) + dy * np.sin(yaw)
+        local_y = -dx * np.sin(yaw) + dy * np.cos(yaw)
+        
+        ld_squared = local_x**2 + local_y**2
+        valid = ld_squared > 0.01
+        curvature = np.where(valid, 2.0 * local_y / np.where(valid, ld_squared, 1.0), 0.0)
+        
+        steering_angle = np.arctan(curvature * self.wheelbase)
+        max_steering_angle = np.radians(70)
+        return np.clip(steering_angle / max_steering_angle, -1.0, 1.0)
+    
+    def run_step(self, vehicle, path):
         """
         Execute one control step.
         
+        Reads the vehicle state from the world snapshot; runners that already
+        captured it this tick should call run_step_from_state instead.
+        
         Args:
             vehicle: CARLA vehicle actor
-            waypoints: List of waypoints representing the path
+            path (Path): Array-backed path (a list of waypoints is also accepted)
             
         Returns:
             carla.VehicleControl: Control command for the vehicle
         """
-        vehicle_transform = vehicle.get_transform()
-        vehicle_location = vehicle_transform.location
+        state = VehicleState.capture(vehicle.get_world(), vehicle)
+        return self.run_step_from_state(state, path)
+    
+    def run_step_from_state(self, state, path):
+        """
+        Execute one control step from a captured vehicle state.
+        
+        Args:
+            state (VehicleState): Vehicle state for the current frame
+            path (Path): Array-backed path (a list of waypoints is also accepted)
+            
+        Returns:
+            carla.VehicleControl: Control command for the vehicle
+        """
+        path = as_path(path)
+        
+        # Closest match (shared with other users this tick)
+        query = query_path(state, path, self.tracker)
+        vehicle_transform = query.transform
+        vehicle_location = query.location
         
         # Find lookahead point
-        target_location = self.find_lookahead_point(
-            vehicle_location, vehicle_transform, waypoints
+        target_point = self.find_lookahead_point(
+            vehicle_location, vehicle_transform, path, query.closest_idx
         )
         
-        if target_location is None:
-            # No valid target, return zero control
-            return carla.VehicleControl(throttle=0.0, steer=0.0, brake=1.0)
-        
         # Compute steering
-        steering = self.compute_steering(vehicle_transform, target_location)
+        steering = self.compute_steering(vehicle_transform, target_point)
         
         # Simple speed control
-        current_speed = self.get_speed(vehicle)
+        current_speed = query.speed
         if current_speed < self.target_speed / 3.6:  # Convert km/h to m/s
             throttle = 0.5
             brake = 0.0
@@ -0,0 +1,366 @@
+"""
+Offline Metric Recomputation
+Recomputes the tracking metrics of saved runs from their trajectories and the
+cached route geometry instead of re-simulating them. All runs on one route
+are projected onto it in a single vectorized pass, and the results files are
+split across worker processes
+
+Usage (rewrites the results files and their index in place):
+    python recompute_metrics.py results
+    python recompute_metrics.py results/all_experiments_extended.json --dry-run
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import numpy as np
+
+import local_sim
+from online_stats import LATERAL_ERROR_QUANTILES, quantile_key
+from result_format import load_result_file, save_result, save_result_list
+from results_index import ResultsIndex
+from route_builder import ROUTE_CACHE_DIR, load_route, route_cache_file
+
+
+# Route of results saved before runs recorded theirs (the runners' defaults)
+DEFAULT_ROUTE = {'backend': 'carla', 'town': 'Town01', 'spawn_index': 0, 'spacing': 2.0,
+                 'length': 1000.0}
+
+
+def trajectory(metrics):
+    """
+    Logged vehicle positions of a run.
+
+    Args:
+        metrics (dict): Loaded metrics of one run
+
+    Returns:
+        tuple: (x, y) arrays, or None if the run saved no positions
+    """
+    positions = metrics.get('positions')
+    if not positions:
+        return None
+    if isinstance(positions, dict):
+        x = np.asarray(positions['x'], dtype=np.float64)
+        y = np.asarray(positions['y'], dtype=np.float64)
+    else:
+        # Original format: one {'x', 'y', 'z'} dict per tick
+        x = np.array([p['x'] for p in positions], dtype=np.float64)
+        y = np.array([p['y'] for p in positions], dtype=np.float64)
+    return (x, y) if len(x) else None
+
+
+def vehicle_yaws(metrics, path, reference_yaw, idx):
+    """
+    Vehicle heading of a run at every tick.
+
+    Runs saved before the heading was logged get it back from their heading
+    error, using the path heading it was measured against: the projected
+    heading when the run also logged cross-track errors, the heading of the
+    nearest waypoint before that.
+
+    Args:
+        metrics (dict): Loaded metrics of one run
+        path (Path): Route the run was driven on
+        reference_yaw (np.ndarray): Path heading at the projected points
+        idx (np.ndarray): Nearest waypoint of each position
+
+    Returns:
+        np.ndarray: Vehicle yaw (radians)
+    """
+    if 'yaws' in metrics:
+        return np.asarray(metrics['yaws'], dtype=np.float64)
+    if 'cross_track_errors' not in metrics:
+        reference_yaw = path.yaw[idx]
+    return reference_yaw - np.radians(np.asarray(metrics['heading_errors'], dtype=np.float64))
+
+
+def summarize_runs(run_ids, counts, lateral_errors, heading_errors, steering_angles,
+                   speeds, arc_lengths, path):
+    """
+    Summary metrics of many runs whose traces are concatenated.
+
+    Every statistic is one array operation over all runs (grouped by run
+    id), and the quantiles are exact rather than the runners' streaming
+    estimates.
+
+    Args:
+        run_ids (np.ndarray): Run of each tick (runs are contiguous)
+        counts (np.ndarray): Ticks per run (all at least one)
+        lateral_errors (np.ndarray): Lateral errors (meters)
+        heading_errors (np.ndarray): Heading errors (degrees)
+        steering_angles (np.ndarray): Steering commands
+        speeds (np.ndarray): Vehicle speeds
+        arc_lengths (np.ndarray): Arc length of the projected positions
+        path (Path): Route the runs were driven on
+
+    Returns:
+        dict: Summary key -> array with one value per run
+    """
+    num_runs = len(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    def mean(values):
+        return np.bincount(run_ids, weights=values, minlength=num_runs) / counts
+
+    def std(values, ids, n):
+        sums = np.bincount(ids, weights=values, minlength=num_runs)
+        means = np.divide(sums, n, out=np.zeros(num_runs), where=n > 0)
+        squares = np.bincount(ids, weights=(values - means[ids])**2, minlength=num_runs)
+        return np.sqrt(np.divide(squares, n, out=np.zeros(num_runs), where=n > 0))
+
+    abs_heading_errors = np.abs(heading_errors)
+    summary = {
+        'mean_lateral_error': mean(lateral_errors),
+        'max_lateral_error': np.maximum.reduceat(lateral_errors, starts),
+        'std_lateral_error': std(lateral_errors, run_ids, counts),
+        'mean_abs_heading_error': mean(abs_heading_errors),
+        'max_abs_heading_error': np.maximum.reduceat(abs_heading_errors, starts),
+        'mean_speed': mean(speeds),
+    }
+
+    # Tick-to-tick changes, without the steps from one run into the next
+    same_run = run_ids[1:] == run_ids[:-1]
+    change_ids = run_ids[1:][same_run]
+    steering_changes = np.diff(steering_angles)[same_run]
+    summary['steering_smoothness'] = std(steering_changes, change_ids, counts - 1)
+
+    # Distance driven along the route, across the seam of a loop
+    progress = np.diff(arc_lengths)[same_run]
+    if path.closed:
+        half = 0.5 * path.length
+        progress = np.mod(progress + half, path.length) - half
+    summary['path_progress'] = np.bincount(change_ids, weights=progress, minlength=num_runs)
+
+    # Exact quantiles (linear interpolation, as np.percentile) of every run
+    # from one sort of all lateral errors
+    ordered = lateral_errors[np.lexsort((lateral_errors, run_ids))]
+    for p in LATERAL_ERROR_QUANTILES:
+        rank = p * (counts - 1)
+        lower = np.floor(rank).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        low = ordered[starts + lower]
+        high = ordered[starts + upper]
+        summary[quantile_key(p)] = low + (rank - lower) * (high - low)
+
+    return summary
+
+
+def recompute_runs(runs, path):
+    """
+    Recompute the tracking metrics of runs driven on one route.
+
+    The positions of all runs are projected onto the route in one pass.
+    Traces of the lateral and heading error are replaced, the cross-track
+    error, arc length and vehicle heading traces are (re)written, and the
+    summary metrics are updated in place.
+
+    Args:
+        runs (list): Loaded metrics of runs with saved positions
+        path (Path): Route the runs were driven on
+    """
+    trajectories = [trajectory(metrics) for metrics in runs]
+    counts = np.array([len(x) for x, _ in trajectories])
+    run_ids = np.repeat(np.arange(len(runs)), counts)
+    x = np.concatenate([x for x, _ in trajectories])
+    y = np.concatenate([y for _, y in trajectories])
+
+    idx, _ = path.index.nearest_batch(x, y)
+    cross_track_errors, arc_lengths, path_yaws = path.cross_track_batch(x, y, idx)
+    bounds = np.cumsum(counts)[:-1]
+
+    yaws = np.concatenate([
+        vehicle_yaws(metrics, path, reference, nearest)
+        for metrics, reference, nearest in zip(runs, np.split(path_yaws, bounds),
+                                               np.split(idx, bounds))
+    ])
+    heading_errors = path_yaws - yaws
+    heading_errors = np.degrees(np.arctan2(np.sin(heading_errors), np.cos(heading_errors)))
+    lateral_errors = np.abs(cross_track_errors)
+
+    steering_angles = np.concatenate([np.asarray(m['steering_angles'], dtype=np.float64)
+                                      for m in runs])
+    speeds = np.concatenate([np.asarray(m['speeds'], dtype=np.float64) for m in runs])
+    summaries = summarize_runs(run_ids, counts, lateral_errors, heading_errors,
+                               steering_angles, speeds, arc_lengths, path)
+
+    traces = {
+        'lateral_errors': np.split(lateral_errors, bounds),
+        'heading_errors': np.split(heading_errors, bounds),
+        'cross_track_errors': np.split(cross_track_errors, bounds),
+        'arc_lengths': np.split(arc_lengths, bounds),
+        'yaws': np.split(yaws, bounds),
+    }
+    for i, metrics in enumerate(runs):
+        for name, values in traces.items():
+            metrics[name] = values[i]
+        summary = metrics.setdefault('summary', {})
+        summary.update({key: float(values[i]) for key, values in summaries.items()})
+        summary['recomputed'] = True
+
+
+def recompute_files(filepaths, route_cache_dir=ROUTE_CACHE_DIR, default_route=None,
+                    dry_run=False):
+    """
+    Recompute the runs of several results files, vectorized over every run
+    that shares a route, and save the files back.
+
+    Args:
+        filepaths (list): Per-run or combined results files
+        route_cache_dir (str): Directory holding the cached routes
+        default_route (dict): Route of runs that did not record theirs
+            (route_cache_file arguments, default DEFAULT_ROUTE)
+        dry_run (bool): Only report the new metrics, leave the files alone
+
+    Returns:
+        list: (filepath, experiment name, mean lateral error before, after)
+            per run; after is None for runs that could not be recomputed
+    """
+    default_route = dict(default_route or DEFAULT_ROUTE)
+    files = []
+    by_route = {}
+    for filepath in filepaths:
+        content = load_result_file(filepath)
+        runs = content if isinstance(content, list) else [content]
+        before = [run.get('summary', {}).get('mean_lateral_error', math.nan) for run in runs]
+        files.append((filepath, content, runs, before))
+        for run in runs:
+            if trajectory(run) is None:
+                continue
+            # Routes recorded without their backend were driven on CARLA
+            route = dict(DEFAULT_ROUTE, **run['route']) if run.get('route') else default_route
+            key = tuple(sorted(route.items()))
+            by_route.setdefault(key, []).append(run)
+
+    recomputed = set()
+    for key, runs in by_route.items():
+        route_filepath = route_cache_file(cache_dir=route_cache_dir, **dict(key))
+        if not os.path.exists(route_filepath):
+            print(f"No cached route {route_filepath}: skipping {len(runs)} runs "
+                  f"(run any experiment on that route once to cache it)")
+            continue
+        recompute_runs(runs, load_route(route_filepath))
+        recomputed.update(id(run) for run in runs)
+
+    rows = []
+    for filepath, content, runs, before in files:
+        changed = [id(run) in recomputed for run in runs]
+        if any(changed) and not dry_run:
+            if isinstance(content, list):
+                save_result_list(content, filepath)
+            else:
+                save_result(content, filepath)
+        for run, old, done in zip(runs, before, changed):
+            after = run['summary']['mean_lateral_error'] if done else None
+            rows.append((filepath, run.get('experiment_name', '?'), old, after))
+    return rows
+
+
+def _recompute_chunk(args):
+    """
+    Worker entry point: recompute one chunk of files.
+    """
+    return recompute_files(*args)
+
+
+def recompute_parallel(filepaths, workers=None, route_cache_dir=ROUTE_CACHE_DIR,
+                       default_route=None, dry_run=False):
+    """
+    Recompute results files on a pool of worker processes.
+
+    Files are dealt out to the workers (largest first) so each worker
+    vectorizes over all the runs of its files.
+
+    Args:
+        filepaths (list): Per-run or combined results files
+        workers (int): Worker processes (default: one per CPU, at most one
+            per file)
+        route_cache_dir (str): Directory holding the cached routes
+        default_route (dict): Route of runs that did not record theirs
+        dry_run (bool): Only report the new metrics, leave the files alone
+
+    Returns:
+        list: Rows as returned by recompute_files
+    """
+    workers = min(workers or os.cpu_count() or 1, len(filepaths))
+    if workers <= 1:
+        return recompute_files(filepaths, route_cache_dir, default_route, dry_run)
+
+    by_size = sorted(filepaths, key=os.path.getsize, reverse=True)
+    chunks = [(by_size[i::workers], route_cache_dir, default_route, dry_run)
+              for i in range(workers)]
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers) as pool:
+        return [row for rows in pool.map(_recompute_chunk, chunks) for row in rows]
+
+
+def results_files(paths):
+    """
+    Results files given on the command line (directories are expanded to
+    the .json files they hold).
+    """
+    filepaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            filepaths.extend(os.path.join(path, filename)
+                             for filename in sorted(os.listdir(path))
+                             if filename.endswith('.json'))
+        else:
+            filepaths.append(path)
+    return filepaths
+
+
+def main():
+    """
+    Recompute the results files or directories given on the command line.
+    """
+    argparser = argparse.ArgumentParser(
+        description='Recompute tracking metrics from saved trajectories')
+    argparser.add_argument('paths', nargs='*', default=['results'],
+                           help='results files or directories')
+    argparser.add_argument('--workers', type=int, default=None,
+                           help='worker processes (default: one per CPU)')
+    argparser.add_argument('--route-cache', default=ROUTE_CACHE_DIR,
+                           help='directory holding the cached routes')
+    argparser.add_argument('--backend', choices=local_sim.BACKENDS, default=DEFAULT_ROUTE['backend'],
+                           help='simulator backend of runs that did not record their route')
+    argparser.add_argument('--town', default=DEFAULT_ROUTE['town'],
+                           help='town of runs that did not record their route')
+    argparser.add_argument('--spawn-index', type=int, default=DEFAULT_ROUTE['spawn_index'],
+                           help='spawn point of runs that did not record their route')
+    argparser.add_argument('--spacing', type=float, default=DEFAULT_ROUTE['spacing'],
+                           help='waypoint spacing of runs that did not record their route')
+    argparser.add_argument('--length', type=float, default=DEFAULT_ROUTE['length'],
+                           help='route length of runs that did not record their route')
+    argparser.add_argument('--dry-run', action='store_true',
+                           help='print the new metrics without saving them')
+    args = argparser.parse_args()
+
+    filepaths = results_files(args.paths)
+    if not filepaths:
+        print("No results files found")
+        return
+
+    default_route = {'backend': args.backend, 'town': args.town, 'spawn_index': args.spawn_index,
+                     'spacing': args.spacing, 'length': args.length}
+    rows = recompute_parallel(filepaths, args.workers, args.route_cache, default_route,
+                              args.dry_run)
+
+    print(f"{'File':<40} {'Experiment':<36} {'Lat. err before':>15} {'after':>8}")
+    for filepath, name, before, after in rows:
+        after = 'skipped' if after is None else f"{after:.3f}"
+        print(f"{os.path.basename(filepath):<40} {name:<36} {before:>15.3f} {after:>8}")
+
+    if not args.dry_run:
+        # Keep the results indexes in step with the rewritten files
+        by_dir = {}
+        for filepath, _, _, after in rows:
+            if after is not None:
+                by_dir.setdefault(os.path.dirname(filepath), set()).add(os.path.basename(filepath))
+        for results_dir, filenames in by_dir.items():
+            ResultsIndex(results_dir or '.').add_files(sorted(filenames))
+
+
+if __name__ == '__main__':
+    main()
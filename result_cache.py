@@ -0,0 +1,182 @@
+"""
+Content-addressed Experiment Result Cache
+Stores finished experiments under a hash of everything that determines their
+outcome (controller, parameters, route, simulation settings and source code),
+so unchanged configurations are never simulated twice
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+import numpy as np
+
+from result_format import load_result_file, save_result, trace_file
+
+
+RESULT_CACHE_DIR = os.path.join('cache', 'results')
+
+# Bump to invalidate every cached result
+CACHE_VERSION = 2
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def describe_controller(controller):
+    """
+    Controller class and constructor parameters as a JSON-serializable dict.
+
+    Only the controller's params() are recorded, never its runtime state
+    (active controller, adapted gains, tracker windows), so the same
+    configuration has the same description before and after a run.
+
+    Args:
+        controller: Controller instance with a params() method
+
+    Returns:
+        dict: {'class': class name, 'params': constructor parameters}
+    """
+    params = {}
+    for name, value in sorted(controller.params().items()):
+        if isinstance(value, (bool, np.bool_)):
+            params[name] = bool(value)
+        elif isinstance(value, (int, float, np.integer, np.floating)):
+            params[name] = float(value)
+        elif isinstance(value, np.ndarray):
+            params[name] = value.astype(np.float64).tolist()
+        else:
+            params[name] = value
+    return {'class': type(controller).__qualname__, 'params': params}
+
+
+def source_hash(*objects):
+    """
+    Hash of the source files of this project that the given objects depend on.
+
+    Starting from the modules defining the objects, every project module they
+    reference (directly or through imported names) is included, so editing a
+    controller, its helpers or the runner invalidates the cached results.
+
+    Args:
+        *objects: Classes, functions, instances or modules
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    def module_of(obj):
+        if inspect.ismodule(obj):
+            return obj
+        if not inspect.isclass(obj) and not inspect.isroutine(obj):
+            obj = type(obj)
+        return sys.modules.get(getattr(obj, '__module__', None))
+
+    file_hashes = {}
+    stack = [module_of(obj) for obj in objects]
+    while stack:
+        module = stack.pop()
+        filename = getattr(module, '__file__', None)
+        if filename is None:
+            continue
+        filename = os.path.abspath(filename)
+        if os.path.dirname(filename) != _PACKAGE_DIR or filename in file_hashes:
+            continue
+        with open(filename, 'rb') as f:
+            file_hashes[filename] = hashlib.sha256(f.read()).hexdigest()
+        for value in vars(module).values():
+            if inspect.ismodule(value) or inspect.isclass(value) or inspect.isroutine(value):
+                stack.append(module_of(value))
+
+    digest = hashlib.sha256()
+    for filename in sorted(file_hashes, key=os.path.basename):
+        digest.update(f"{os.path.basename(filename)}:{file_hashes[filename]}\n".encode())
+    return digest.hexdigest()
+
+
+def path_hash(path):
+    """
+    Hash of a route's geometry.
+
+    Args:
+        path (Path): Array-backed route
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    for column in (path.x, path.y, path.z, path.yaw):
+        digest.update(np.ascontiguousarray(column, dtype=np.float64).tobytes())
+    digest.update(b'closed' if path.closed else b'open')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Directory of finished experiments keyed by a hash of their inputs.
+
+    Each entry is saved in the binary results format (result_format.py): a
+    JSON sidecar with the summary and the key fields the metrics were
+    produced from, and a .npz file with the per-tick traces. Both files are
+    written to a temporary file and renamed into place, traces first, so
+    concurrent sweep workers and crashes never leave a truncated entry.
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir (str): Directory holding cached results
+        """
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(fields):
+        """
+        Cache key of an experiment.
+
+        Args:
+            fields (dict): JSON-serializable description of everything that
+                determines the experiment's outcome
+
+        Returns:
+            str: SHA-256 hex digest
+        """
+        payload = json.dumps(dict(fields, cache_version=CACHE_VERSION), sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def entry_file(self, key):
+        """
+        JSON sidecar of the entry for a key (its traces are next to it).
+        """
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def load(self, key):
+        """
+        Look up a finished experiment.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            dict: Cached metrics (traces as arrays), or None on a miss
+        """
+        filepath = self.entry_file(key)
+        if not os.path.exists(filepath) or not os.path.exists(trace_file(filepath)):
+            return None
+        metrics = load_result_file(filepath)
+        metrics.pop('cache', None)
+        return metrics
+
+    def store(self, key, fields, metrics):
+        """
+        Add a finished experiment.
+
+        Args:
+            key (str): Cache key
+            fields (dict): Key fields (saved alongside for inspection)
+            metrics (dict): Logged metrics
+        """
+        filepath = self.entry_file(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        save_result(dict(metrics, cache={'key': key, 'fields': fields}), filepath)
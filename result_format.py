@@ -0,0 +1,449 @@
+"""
+Binary Result Format
+Saves experiment results as a small JSON sidecar (name, summary, parameters)
+plus a .npz file holding the per-tick traces as float32 columns, and reads
+both this format and the original all-JSON result files
+
+Usage (convert existing JSON results in place):
+    python result_format.py results/*.json
+
+Recover the runs of a crashed --stream sweep from their streamed traces:
+    python result_format.py --recover results/.traces/*.trace
+"""
+
+import argparse
+import json
+import os
+from collections.abc import Mapping
+import numpy as np
+
+from metric_recorder import StreamingRecorder, summarize, trace_fields
+
+
+TRACE_SUFFIX = '.npz'
+
+# Traces are kept for plotting and offline analysis: float32 (about 7
+# significant digits) halves the files, and leaving them uncompressed keeps
+# loading fast. Summaries are computed from the full-precision traces before
+# saving and stored exactly in the sidecar.
+TRACE_DTYPE = np.float32
+
+# Nested trace channels (e.g. positions x/y/z) are stored as 'group/channel'
+GROUP_SEPARATOR = '/'
+
+
+def is_trace(value):
+    """
+    Whether a metrics value is a per-tick trace (or a group of traces).
+    """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return True
+    return (isinstance(value, dict) and len(value) > 0 and
+            all(isinstance(v, (list, tuple, np.ndarray)) for v in value.values()))
+
+
+def split_traces(metrics):
+    """
+    Separate the per-tick traces of an experiment from its other fields.
+
+    Args:
+        metrics (dict): Logged metrics (traces as lists or arrays)
+
+    Returns:
+        tuple: (fields dict, channel name -> trace dict)
+    """
+    fields = {}
+    traces = {}
+    for name, value in metrics.items():
+        if not is_trace(value):
+            fields[name] = value
+        elif isinstance(value, dict):
+            for channel, values in value.items():
+                traces[f"{name}{GROUP_SEPARATOR}{channel}"] = values
+        elif len(value) and isinstance(value[0], dict):
+            # Original format: one {'x', 'y', 'z'} dict per tick
+            for channel in value[0]:
+                traces[f"{name}{GROUP_SEPARATOR}{channel}"] = [row[channel] for row in value]
+        else:
+            traces[name] = value
+    return fields, traces
+
+
+def pack_traces(traces):
+    """
+    Stack the traces of one experiment into a single TRACE_DTYPE array.
+
+    Text traces are stored as integer codes into a label list.
+
+    Args:
+        traces (dict): Channel name -> trace
+
+    Returns:
+        tuple: (array of shape (ticks, channels), channel names, labels dict)
+    """
+    channels = list(traces)
+    labels = {}
+    columns = []
+    for name in channels:
+        values = traces[name]
+        if len(values) and isinstance(values[0], str):
+            codes = {}
+            column = [codes.setdefault(label, len(codes)) for label in values]
+            labels[name] = list(codes)
+            values = column
+        columns.append(np.asarray(values, dtype=TRACE_DTYPE))
+
+    lengths = {len(column) for column in columns}
+    if len(lengths) > 1:
+        raise ValueError(f"Trace channels have different lengths: {sorted(lengths)}")
+    num_ticks = lengths.pop() if lengths else 0
+
+    data = np.empty((num_ticks, len(channels)), dtype=TRACE_DTYPE)
+    for i, column in enumerate(columns):
+        data[:, i] = column
+    return data, channels, labels
+
+
+def unpack_traces(data, channels, labels):
+    """
+    Rebuild the metrics trace fields from a packed array.
+
+    Returns:
+        dict: Field name -> np.ndarray (label channels -> list of str,
+            grouped channels -> dict of arrays)
+    """
+    traces = {}
+    for i, name in enumerate(channels):
+        values = data[:, i]
+        if name in labels:
+            names = labels[name]
+            values = [names[code] for code in values.astype(np.intp).tolist()]
+        group, _, channel = name.rpartition(GROUP_SEPARATOR)
+        if group:
+            traces.setdefault(group, {})[channel] = values
+        else:
+            traces[name] = values
+    return traces
+
+
+def is_record(metrics):
+    """
+    Whether a results entry is a sidecar record (traces in a .npz file).
+    """
+    pointer = metrics.get('traces')
+    return isinstance(pointer, dict) and 'file' in pointer
+
+
+def trace_file(filepath):
+    """
+    Trace file that belongs to a JSON sidecar.
+    """
+    return os.path.splitext(filepath)[0] + TRACE_SUFFIX
+
+
+def _replace_file(filepath, write):
+    """
+    Write a file through a temporary file renamed into place.
+    """
+    tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_filepath, 'wb') as f:
+        write(f)
+    os.replace(tmp_filepath, filepath)
+
+
+def _write_json(filepath, payload):
+    _replace_file(filepath, lambda f: f.write(json.dumps(payload, indent=2).encode()))
+
+
+def _trace_record(fields, traces, trace_filename, prefix=''):
+    """
+    Sidecar record of one experiment: its fields plus where its traces live.
+    """
+    data, channels, labels = pack_traces(traces)
+    record = dict(fields)
+    record['traces'] = {
+        'file': trace_filename,
+        'key': f"{prefix}traces",
+        'channels': channels,
+        'labels': labels,
+        'ticks': len(data),
+    }
+    return record, data
+
+
+def save_result(metrics, filepath):
+    """
+    Save one experiment: traces to <name>.npz, everything else (with a
+    pointer to the traces) to the JSON sidecar at filepath.
+
+    Args:
+        metrics (dict): Logged metrics
+        filepath (str): JSON sidecar path, e.g. results/stanley_k1.0.json
+
+    """
+    fields, traces = split_traces(metrics)
+    trace_filepath = trace_file(filepath)
+    record, data = _trace_record(fields, traces, os.path.basename(trace_filepath))
+
+    # Traces first, so a sidecar never points at a missing trace file
+    _replace_file(trace_filepath, lambda f: np.savez(f, traces=data))
+    _write_json(filepath, record)
+
+
+def save_result_list(results, filepath):
+    """
+    Save several experiments as one combined results file: a JSON list of
+    sidecar records and one .npz holding the traces of all of them.
+
+    The combined file keeps its own copy of the traces because the runners
+    reuse per-run file names, so a per-run file may since have been
+    overwritten by another sweep.
+
+    Args:
+        results (list): Logged metrics dicts
+        filepath (str): JSON path of the combined file
+    """
+    trace_filepath = trace_file(filepath)
+    records = []
+    arrays = {}
+    for i, metrics in enumerate(results):
+        fields, traces = split_traces(metrics)
+        record, data = _trace_record(fields, traces, os.path.basename(trace_filepath), f"{i}/")
+        records.append(record)
+        arrays[record['traces']['key']] = data
+
+    _replace_file(trace_filepath, lambda f: np.savez(f, **arrays))
+    _write_json(filepath, records)
+
+
+def load_traces(pointer, directory, trace_cache=None):
+    """
+    Traces a sidecar record points at.
+
+    Args:
+        pointer (dict): The record's 'traces' entry
+        directory (str): Directory the trace file is relative to
+        trace_cache (dict): Open trace files by path, shared across records
+
+    Returns:
+        dict: Field name -> trace (see unpack_traces)
+    """
+    trace_filepath = os.path.join(directory, pointer['file'])
+    if trace_cache is None:
+        with np.load(trace_filepath) as archive:
+            data = archive[pointer['key']]
+    else:
+        if trace_filepath not in trace_cache:
+            trace_cache[trace_filepath] = np.load(trace_filepath)
+        data = trace_cache[trace_filepath][pointer['key']]
+
+    if data.shape != (pointer['ticks'], len(pointer['channels'])):
+        raise ValueError(f"{trace_filepath} does not hold the traces described by its "
+                         f"JSON file (it was overwritten or truncated)")
+    return unpack_traces(data, pointer['channels'], pointer['labels'])
+
+
+def load_record(record, directory, trace_cache=None):
+    """
+    Full metrics of a sidecar record, with its traces loaded.
+
+    Args:
+        record (dict): Sidecar record (original all-JSON results are
+            returned unchanged)
+        directory (str): Directory the record's trace file is relative to
+        trace_cache (dict): Open trace files by path, shared across records
+
+    Returns:
+        dict: Metrics with the traces as NumPy arrays
+    """
+    if not is_record(record):
+        return record
+    metrics = {name: value for name, value in record.items() if name != 'traces'}
+    metrics.update(load_traces(record['traces'], directory, trace_cache))
+    return metrics
+
+
+class LazyResult(Mapping):
+    """
+    Read-only metrics of a sidecar record that load the traces on first use.
+
+    The summary and other fields are available straight away. The first
+    access to any trace field (e.g. result['lateral_errors']) reads all the
+    record's traces from its .npz file, so code that only needs summaries
+    never touches the trace files.
+    """
+
+    def __init__(self, record, directory):
+        """
+        Args:
+            record (dict): Sidecar record
+            directory (str): Directory the record's trace file is relative to
+        """
+        self._fields = {name: value for name, value in record.items() if name != 'traces'}
+        self._pointer = record['traces']
+        self._directory = directory
+        self._traces = None
+
+        # Field names the traces unpack to (groups such as positions once)
+        self._trace_names = list(dict.fromkeys(
+            name.partition(GROUP_SEPARATOR)[0] for name in self._pointer['channels']))
+
+    @property
+    def loaded(self):
+        """
+        Whether the traces have been read.
+        """
+        return self._traces is not None
+
+    def __getitem__(self, name):
+        if name in self._fields:
+            return self._fields[name]
+        if name not in self._trace_names:
+            raise KeyError(name)
+        if self._traces is None:
+            self._traces = load_traces(self._pointer, self._directory)
+        return self._traces[name]
+
+    def __iter__(self):
+        yield from self._fields
+        yield from self._trace_names
+
+    def __len__(self):
+        return len(self._fields) + len(self._trace_names)
+
+    def __repr__(self):
+        return f"LazyResult({self._fields.get('experiment_name')!r}, loaded={self.loaded})"
+
+
+def load_result_file(filepath, lazy=False):
+    """
+    Load a results file in either format.
+
+    Args:
+        filepath (str): JSON sidecar, combined file or original JSON results
+        lazy (bool): Return LazyResult objects that read the traces on first
+            use (original all-JSON results are always loaded in full)
+
+    Returns:
+        dict or list: Metrics (a list for combined files)
+    """
+    with open(filepath, 'r') as f:
+        content = json.load(f)
+    directory = os.path.dirname(filepath)
+    if lazy:
+        results = [LazyResult(record, directory) if is_record(record) else record
+                   for record in (content if isinstance(content, list) else [content])]
+        return results if isinstance(content, list) else results[0]
+    if isinstance(content, dict):
+        return load_record(content, directory)
+
+    trace_cache = {}
+    try:
+        return [load_record(record, directory, trace_cache) for record in content]
+    finally:
+        for archive in trace_cache.values():
+            archive.close()
+
+
+def convert_json(filepath):
+    """
+    Convert an all-JSON results file to the binary format in place.
+
+    The JSON file is replaced by its sidecar, next to a new .npz file.
+
+    Args:
+        filepath (str): Per-run or combined JSON results file
+
+    Returns:
+        tuple: (bytes before, bytes after), or None if already converted
+    """
+    with open(filepath, 'r') as f:
+        content = json.load(f)
+    records = content if isinstance(content, list) else [content]
+    if all(is_record(record) for record in records):
+        return None
+
+    size_before = os.path.getsize(filepath)
+    if isinstance(content, dict):
+        save_result(content, filepath)
+    else:
+        save_result_list(content, filepath)
+
+    size_after = os.path.getsize(filepath)
+    if os.path.exists(trace_file(filepath)):
+        size_after += os.path.getsize(trace_file(filepath))
+    return size_before, size_after
+
+
+def recover_stream(filepath, results_dir=None):
+    """
+    Save the rows of a streamed trace as a regular result, e.g. after the
+    process running it died.
+
+    Args:
+        filepath (str): Streamed trace data file (results/.traces/<name>.trace)
+        results_dir (str): Where to save the result (default: the directory
+            above the trace directory)
+
+    Returns:
+        str: Path of the saved JSON sidecar, or None if no row was written
+    """
+    recorder = StreamingRecorder.open(filepath)
+    if not len(recorder):
+        return None
+
+    metrics = dict(recorder.metadata)
+    metrics.update(trace_fields(recorder))
+    metrics['summary'] = summarize(recorder)
+    metrics['summary'].update({
+        'total_steps': len(recorder),
+        'total_time': float(recorder['timestamps'][-1]),
+        'partial': not recorder.complete,
+    })
+
+    if results_dir is None:
+        results_dir = os.path.dirname(os.path.dirname(os.path.abspath(filepath)))
+    name = metrics.get('experiment_name', os.path.splitext(os.path.basename(filepath))[0])
+    result_filepath = os.path.join(results_dir, f"{name}.json")
+    save_result(metrics, result_filepath)
+    return result_filepath
+
+
+def main():
+    """
+    Convert JSON results files, or recover streamed traces, given on the
+    command line.
+    """
+    argparser = argparse.ArgumentParser(description='Convert JSON results to the binary format')
+    argparser.add_argument('files', nargs='+',
+                           help='JSON results files to convert in place (.trace files with --recover)')
+    argparser.add_argument('--recover', action='store_true',
+                           help='save streamed traces as results, e.g. after a crash')
+    args = argparser.parse_args()
+
+    if args.recover:
+        for filepath in args.files:
+            result_filepath = recover_stream(filepath)
+            if result_filepath is None:
+                print(f"{filepath}: no rows written")
+            else:
+                print(f"{filepath} -> {result_filepath}")
+        return
+
+    total_before = total_after = 0
+    for filepath in args.files:
+        sizes = convert_json(filepath)
+        if sizes is None:
+            print(f"{filepath}: already converted")
+            continue
+        total_before += sizes[0]
+        total_after += sizes[1]
+        print(f"{filepath}: {sizes[0] / 1024:.1f} KB -> {sizes[1] / 1024:.1f} KB")
+
+    if total_after:
+        print(f"Total: {total_before / 1024:.1f} KB -> {total_after / 1024:.1f} KB "
+              f"({total_before / total_after:.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main()
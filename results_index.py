@@ -0,0 +1,157 @@
+"""
+Results Index
+One small JSON table of every results file in a results directory: the
+sidecar records of each file (name, summary, parameters and where its traces
+are). The evaluation scripts read all summaries from it in one go and only
+load the traces of the plots that draw them
+
+Usage (index the results files already in a directory):
+    python results_index.py results
+"""
+
+import argparse
+import json
+import os
+
+from result_format import LazyResult, is_record, load_result_file
+
+
+# The index lives in a subdirectory so result loaders never mistake it for
+# an experiment file
+INDEX_DIR = '.index'
+INDEX_FILENAME = 'results.json'
+
+
+class ResultsIndex:
+    """
+    Sidecar records of the results files in a directory, keyed by file name.
+
+    Each entry also holds the file's modification time when it was indexed.
+    A file changed or added behind the index's back is read from disk
+    instead, so the index can lag behind the results but never serves stale
+    summaries. Only files in the binary format are indexed; original
+    all-JSON results are always read in full.
+    """
+
+    def __init__(self, results_dir='results'):
+        """
+        Open (or start) the index of a results directory.
+
+        Args:
+            results_dir (str): Directory holding the results files
+        """
+        self.results_dir = results_dir
+        self.filepath = os.path.join(results_dir, INDEX_DIR, INDEX_FILENAME)
+        self.files = {}
+        if os.path.exists(self.filepath):
+            with open(self.filepath, 'r') as f:
+                self.files = json.load(f)['files']
+
+    def __contains__(self, filename):
+        return filename in self.files
+
+    def add_file(self, filename):
+        """
+        Index (or re-index) one saved results file.
+
+        Args:
+            filename (str): Per-run or combined results file, relative to
+                the results directory
+        """
+        self.add_files([filename])
+
+    def add_files(self, filenames):
+        """
+        Index several saved results files, writing the index once.
+
+        Args:
+            filenames (list): Results files, relative to the results directory
+        """
+        for filename in filenames:
+            entry = self._read_entry(filename)
+            if entry is None:
+                self.files.pop(filename, None)
+            else:
+                self.files[filename] = entry
+        self._write()
+
+    def rebuild(self):
+        """
+        Index every results file in the directory from scratch.
+
+        Returns:
+            int: Number of files indexed
+        """
+        self.files = {}
+        filenames = sorted(filename for filename in os.listdir(self.results_dir)
+                           if filename.endswith('.json'))
+        self.add_files(filenames)
+        return len(self.files)
+
+    def load(self, filename):
+        """
+        Results of one file, with traces loaded on first use.
+
+        Args:
+            filename (str): Results file, relative to the results directory
+
+        Returns:
+            dict or list: LazyResult (a list of them for combined files),
+                or the fully loaded metrics of original all-JSON results
+        """
+        filepath = os.path.join(self.results_dir, filename)
+        entry = self.files.get(filename)
+        if entry is None or entry['mtime'] != os.stat(filepath).st_mtime_ns:
+            entry = self._read_entry(filename)
+            if entry is None:
+                return load_result_file(filepath)
+
+        results = [LazyResult(record, self.results_dir) for record in entry['records']]
+        return results if entry['combined'] else results[0]
+
+    def _read_entry(self, filename):
+        """
+        Index entry of a results file, or None if it is not in the binary
+        format.
+        """
+        filepath = os.path.join(self.results_dir, filename)
+        mtime = os.stat(filepath).st_mtime_ns
+        with open(filepath, 'r') as f:
+            content = json.load(f)
+        records = content if isinstance(content, list) else [content]
+        if not records or not all(isinstance(record, dict) and is_record(record)
+                                  for record in records):
+            return None
+        return {
+            'mtime': mtime,
+            'combined': isinstance(content, list),
+            'records': records,
+        }
+
+    def _write(self):
+        """
+        Atomically replace the index file.
+        """
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        tmp_filepath = f"{self.filepath}.{os.getpid()}.tmp"
+        with open(tmp_filepath, 'w') as f:
+            json.dump({'files': self.files}, f, separators=(',', ':'))
+        os.replace(tmp_filepath, self.filepath)
+
+
+def main():
+    """
+    Rebuild the index of the results directories given on the command line.
+    """
+    argparser = argparse.ArgumentParser(description='Index the results files of a directory')
+    argparser.add_argument('results_dirs', nargs='*', default=['results'],
+                           help='results directories to index')
+    args = argparser.parse_args()
+
+    for results_dir in args.results_dirs:
+        count = ResultsIndex(results_dir).rebuild()
+        print(f"{results_dir}: indexed {count} results files")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Ordered Route Builder with On-disk Cache
+Chains Waypoint.next from a spawn point into an ordered, loop-closed route
+and caches it per simulator backend, town, spawn point and spacing
+"""
+
+import os
+import tempfile
+import numpy as np
+
+from waypoint_path import Path
+
+
+ROUTE_CACHE_DIR = os.path.join('cache', 'routes')
+
+
+def build_route(carla_map, start_location, length=1000.0, spacing=2.0):
+    """
+    Build an ordered route by following the lane from a start location.
+
+    At junctions the first successor is taken, so the same inputs always
+    produce the same route. Building stops when the route returns to its
+    start (a closed loop), reaches a dead end, or reaches the requested length.
+
+    Args:
+        carla_map: CARLA map (carla.Map)
+        start_location: Location to start the route from (carla.Location)
+        length (float): Maximum route length (meters)
+        spacing (float): Distance between waypoints (meters)
+
+    Returns:
+        Path: Ordered array-backed route
+    """
+    start = carla_map.get_waypoint(start_location)
+    start_location = start.transform.location
+    start_yaw = np.radians(start.transform.rotation.yaw)
+    start_dir = (np.cos(start_yaw), np.sin(start_yaw))
+
+    waypoints = [start]
+    waypoint = start
+    closed = False
+
+    for step in range(1, int(length / spacing)):
+        candidates = waypoint.next(spacing)
+        if not candidates:
+            break
+        waypoint = candidates[0]
+        location = waypoint.transform.location
+
+        # Loop closure: back near the start, driving in the same direction
+        if step > 2 and location.distance(start_location) < spacing:
+            yaw = np.radians(waypoint.transform.rotation.yaw)
+            if np.cos(yaw - start_yaw) > np.cos(np.radians(45.0)):
+                # Keep a point that falls just short of the start so the
+                # closing segment is never longer than the spacing
+                dx = location.x - start_location.x
+                dy = location.y - start_location.y
+                if dx * start_dir[0] + dy * start_dir[1] < 0.0:
+                    waypoints.append(waypoint)
+                closed = True
+                break
+
+        waypoints.append(waypoint)
+
+    return Path.from_waypoints(waypoints, closed=closed)
+
+
+def route_cache_file(town, spawn_index, spacing, length, backend='carla',
+                     cache_dir=ROUTE_CACHE_DIR):
+    """
+    Cache file name for a route.
+
+    The backend is part of the name: a local_sim town is a synthetic stand-in
+    that shares only its name with the CARLA map.
+
+    Args:
+        town (str): CARLA town/map name
+        spawn_index (int): Index of the spawn point the route starts from
+        spacing (float): Distance between waypoints (meters)
+        length (float): Maximum route length (meters)
+        backend (str): Simulator backend the town was loaded on ('carla' or 'local')
+        cache_dir (str): Directory holding cached routes
+
+    Returns:
+        str: Path of the .npz cache file
+    """
+    filename = f"{backend}_{town}_spawn{spawn_index}_d{spacing:g}_l{length:g}.npz"
+    return os.path.join(cache_dir, filename)
+
+
+def save_route(path, filepath):
+    """
+    Save a route as a compressed .npz file (float32 columns).
+
+    The file is written to a temporary file of its own and renamed into
+    place, so a crash never leaves a truncated cache entry and sweep workers
+    building the same route at once never share a temporary file. The route
+    is deterministic, so if another process wins the race its file is kept.
+
+    Args:
+        path (Path): Route to save
+        filepath (str): Destination .npz file
+    """
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_filepath = tempfile.mkstemp(
+        prefix=f"{os.path.basename(filepath)}.{os.getpid()}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(
+                f,
+                x=path.x.astype(np.float32),
+                y=path.y.astype(np.float32),
+                z=path.z.astype(np.float32),
+                yaw=path.yaw.astype(np.float32),
+                closed=np.array(path.closed),
+            )
+        os.replace(tmp_filepath, filepath)
+    except OSError:
+        # Replacing a file another process has open fails on some platforms
+        if not os.path.exists(filepath):
+            raise
+    finally:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+
+
+def load_route(filepath):
+    """
+    Load a route saved with save_route.
+
+    Args:
+        filepath (str): Route .npz file
+
+    Returns:
+        Path: Array-backed route
+    """
+    with np.load(filepath) as data:
+        return Path(data['x'], data['y'], data['yaw'], z=data['z'],
+                    closed=bool(data['closed']))
+
+
+def load_or_build_route(world, town, spawn_index=0, spacing=2.0, length=1000.0,
+                        backend='carla', cache_dir=ROUTE_CACHE_DIR):
+    """
+    Load a cached route, building and caching it on a miss.
+
+    On a cache hit the CARLA map is never queried. A freshly built route is
+    read back from its cache file, so every run drives the same (float32
+    rounded) geometry, whether or not it built the route.
+
+    Args:
+        world: CARLA world (carla.World)
+        town (str): CARLA town/map name
+        spawn_index (int): Index of the spawn point the route starts from
+        spacing (float): Distance between waypoints (meters)
+        length (float): Maximum route length (meters)
+        backend (str): Simulator backend the world runs on ('carla' or 'local')
+        cache_dir (str): Directory holding cached routes
+
+    Returns:
+        Path: Ordered array-backed route
+    """
+    filepath = route_cache_file(town, spawn_index, spacing, length, backend, cache_dir)
+    if os.path.exists(filepath):
+        print(f"Loaded cached route: {filepath}")
+        return load_route(filepath)
+
+    carla_map = world.get_map()
+    start = carla_map.get_spawn_points()[spawn_index]
+    path = build_route(carla_map, start.location, length=length, spacing=spacing)
+    save_route(path, filepath)
+    print(f"Cached route: {filepath}")
+    return load_route(filepath)
+
+
+class RouteBuffer:
+    """
+    Sliding window of waypoints ahead of the vehicle.
+
+    Instead of rebuilding the whole look-ahead list every tick, passed
+    waypoints are dropped from the head and only the missing tail is
+    fetched with Waypoint.next. The window is exposed as a Path so the
+    controllers consume it directly.
+    """
+
+    def __init__(self, carla_map, num_waypoints=50, spacing=2.0, keep_behind=2,
+                 lost_distance=5.0):
+        """
+        Initialize the buffer.
+
+        Args:
+            carla_map: CARLA map (carla.Map)
+            num_waypoints (int): Number of waypoints held in the window
+            spacing (float): Distance between waypoints (meters)
+            keep_behind (int): Passed waypoints kept behind the closest one
+            lost_distance (float): Distance from the window beyond which it is
+                rebuilt from the vehicle location (meters)
+        """
+        self.carla_map = carla_map
+        self.num_waypoints = num_waypoints
+        self.spacing = spacing
+        self.keep_behind = keep_behind
+        self.lost_distance = lost_distance
+
+        self.waypoints = []
+        self.path = None
+
+        # Map queries issued (get_waypoint + Waypoint.next)
+        self.rpc_calls = 0
+
+    def reset(self, location):
+        """
+        Rebuild the window starting at the lane waypoint under a location.
+
+        Args:
+            location: Vehicle location (carla.Location)
+
+        Returns:
+            Path: Window of waypoints ahead of the vehicle
+        """
+        self.waypoints = [self.carla_map.get_waypoint(location)]
+        self.rpc_calls += 1
+        self._extend()
+        self.path = Path.from_waypoints(self.waypoints)
+        return self.path
+
+    def advance(self, closest_idx, closest_distance, location):
+        """
+        Slide the window after the vehicle moved.
+
+        Only waypoints appended to the tail are read from the CARLA bindings;
+        the arrays of the kept waypoints are reused from the previous path.
+
+        Args:
+            closest_idx (int): Index of the closest waypoint in the current path
+            closest_distance (float): Distance to that waypoint (meters)
+            location: Vehicle location, used if the window must be rebuilt
+
+        Returns:
+            Path: Window of waypoints ahead of the vehicle (the same object as
+                before if nothing was passed)
+        """
+        if not self.waypoints or closest_distance > self.lost_distance:
+            return self.reset(location)
+
+        drop = closest_idx - self.keep_behind
+        if drop <= 0:
+            return self.path
+
+        del self.waypoints[:drop]
+        kept = len(self.waypoints)
+        self._extend()
+
+        old = self.path
+        if len(self.waypoints) == kept:
+            # Dead end ahead: nothing new to append
+            self.path = Path(old.x[drop:], old.y[drop:], old.yaw[drop:], z=old.z[drop:])
+            return self.path
+
+        tail = Path.from_waypoints(self.waypoints[kept:])
+        self.path = Path(
+            np.concatenate((old.x[drop:], tail.x)),
+            np.concatenate((old.y[drop:], tail.y)),
+            np.concatenate((old.yaw[drop:], tail.yaw)),
+            z=np.concatenate((old.z[drop:], tail.z)),
+        )
+        return self.path
+
+    def _extend(self):
+        """
+        Append waypoints to the tail until the window is full.
+        """
+        while len(self.waypoints) < self.num_waypoints:
+            candidates = self.waypoints[-1].next(self.spacing)
+            self.rpc_calls += 1
+            if not candidates:
+                break
+            self.waypoints.append(candidates[0])
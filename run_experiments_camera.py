@@ -4,17 +4,33 @@ Experiment Runner with Camera View Integration
 Compatible with actual Pure Pursuit, Stanley, and Hybrid controller implementations
 """
 
+import argparse
+import os
 import sys
 import time
-import json
-import carla
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
 import numpy as np
 from pathlib import Path
 
+import local_sim
+
 # Import your actual controllers
 from pure_pursuit import PurePursuitController
 from stanley import StanleyController
 from hybrid_controller import HybridController
+from path_query import query_path
+from abort_criteria import NO_DATA, AbortCriteria
+from metric_recorder import (POSITION_CHANNELS, STREAM_SUFFIX, TRACE_CHANNELS, TRACE_STREAM_DIR,
+                             YAW_CHANNELS, MetricRecorder, StreamingRecorder, trace_fields)
+from online_stats import LATERAL_ERROR_QUANTILES, RunSummary, quantile_key
+from result_format import save_result
+from route_builder import RouteBuffer
+from vehicle_state import RpcCounter, VehicleState
+from waypoint_path import ClosestPointTracker
 
 # Import visualization with camera support
 from visualization_with_camera import VisualizationHUD
@@ -23,8 +39,19 @@ from visualization_with_camera import VisualizationHUD
 class ExperimentRunnerWithCamera:
     """Run lane keeping experiments with camera visualization."""
     
-    def __init__(self, enable_viz=True):
-        """Initialize the experiment runner."""
+    def __init__(self, enable_viz=True, backend='carla', stream_dir=None):
+        """
+        Initialize the experiment runner.
+        
+        Args:
+            enable_viz (bool): Show the camera view and metrics HUD
+            backend (str): 'carla' for a CARLA server, 'local' for the offline
+                kinematic-bicycle simulator
+            stream_dir (str): Stream each run's traces to disk in this
+                directory as it proceeds (None to keep them in memory)
+        """
+        self.backend = backend
+        self.stream_dir = stream_dir
         self.client = None
         self.world = None
         self.vehicle = None
@@ -40,7 +67,7 @@ class ExperimentRunnerWithCamera:
     def setup_carla(self):
         """Connect to CARLA and setup the world."""
         print("Connecting to CARLA...")
-        self.client = carla.Client('localhost', 2000)
+        self.client = local_sim.connect(self.backend, 'localhost', 2000)
         self.client.set_timeout(10.0)
         
         self.world = self.client.get_world()
@@ -112,43 +139,18 @@ class ExperimentRunnerWithCamera:
         
         self.camera_data = array
     
-    def get_waypoints_ahead(self, num_waypoints=50, distance=2.0):
-        """
-        Get waypoints ahead of vehicle using CARLA's map.
-        
-        Args:
-            num_waypoints: Number of waypoints to get
-            distance: Distance between waypoints (meters)
-            
-        Returns:
-            List of carla.Waypoint objects
-        """
-        current_map = self.world.get_map()
-        vehicle_location = self.vehicle.get_location()
-        
-        # Get current waypoint
-        waypoint = current_map.get_waypoint(vehicle_location)
-        
-        # Collect waypoints ahead
-        waypoints = [waypoint]
-        for _ in range(num_waypoints - 1):
-            waypoint_list = waypoint.next(distance)
-            if waypoint_list:
-                waypoint = waypoint_list[0]
-                waypoints.append(waypoint)
-            else:
-                break
-        
-        return waypoints
-    
-    def run_experiment(self, controller_name, controller_params, duration=60):
+    def run_experiment(self, controller_name, controller_params, duration=60, num_ticks=None,
+                       abort_criteria=None):
         """
         Run a single experiment with camera visualization.
         
         Args:
             controller_name: Name of controller ('pure_pursuit', 'stanley', 'hybrid')
             controller_params: Dictionary of controller parameters
-            duration: Experiment duration in seconds
+            duration: Experiment duration in simulated seconds
+            num_ticks: Number of simulation ticks (overrides duration)
+            abort_criteria: AbortCriteria to stop diverged runs early
+                (None to always run the full duration)
         """
         print(f"\n{'='*60}")
         print(f"Running: {controller_name} with params {controller_params}")
@@ -180,15 +182,6 @@ class ExperimentRunnerWithCamera:
         if self.enable_viz and self.viz is None:
             self.viz = VisualizationHUD()
         
-        # Metrics storage
-        metrics = {
-            'lateral_errors': [],
-            'heading_errors': [],
-            'steering_angles': [],
-            'speeds': [],
-            'timestamps': []
-        }
-        
         # Experiment name
         param_str = '_'.join([f"{k}{v}" for k, v in sorted(controller_params.items())])
         experiment_name = f"{controller_name}_{param_str}"
@@ -196,162 +189,198 @@ class ExperimentRunnerWithCamera:
         if self.viz:
             self.viz.update_metrics(experiment_name=experiment_name)
         
-        # Run experiment
+        # Closest-waypoint search state for the per-tick path query
+        tracker = ClosestPointTracker()
+        rpc_counter = RpcCounter()
+        
+        # Sliding window of real CARLA waypoints ahead of the vehicle
+        route = RouteBuffer(self.world.get_map(), num_waypoints=50, spacing=2.0)
+        path = route.reset(self.vehicle.get_location())
+        
+        # Run length in ticks, so it does not depend on rendering speed
+        if num_ticks is None:
+            delta_seconds = self.world.get_settings().fixed_delta_seconds
+            num_ticks = int(round(duration / delta_seconds))
+        
+        # Per-tick traces (the sliding waypoint window has no route-wide arc
+        # length, so the path channels are not logged here)
+        channels = TRACE_CHANNELS + POSITION_CHANNELS + YAW_CHANNELS
+        if self.stream_dir is None:
+            recorder = MetricRecorder(channels, capacity=num_ticks)
+        else:
+            recorder = StreamingRecorder(
+                channels,
+                os.path.join(self.stream_dir, experiment_name + STREAM_SUFFIX),
+                metadata={'experiment_name': experiment_name}
+            )
+        
+        # Summary statistics, updated every tick
+        run_summary = RunSummary()
+        elapsed = 0.0
+        
+        # Run experiment (elapsed time is read from the world snapshots)
+        start_timestamp = self.world.get_snapshot().timestamp.elapsed_seconds
         start_time = time.time()
         step = 0
         
-        while time.time() - start_time < duration:
-            # Tick simulation
-            self.world.tick()
-            
-            # Get waypoints ahead (real CARLA waypoints)
-            waypoints = self.get_waypoints_ahead(num_waypoints=50, distance=2.0)
-            
-            # Get vehicle state
-            transform = self.vehicle.get_transform()
-            velocity = self.vehicle.get_velocity()
-            speed = np.sqrt(velocity.x**2 + velocity.y**2 + velocity.z**2)
-            
-            # Compute control using YOUR controller's run_step method
-            control = controller.run_step(self.vehicle, waypoints)
-            
-            # Apply control
-            self.vehicle.apply_control(control)
-            
-            # Calculate metrics
-            lateral_error = self._calculate_lateral_error(transform.location, waypoints)
-            heading_error = self._calculate_heading_error(transform, waypoints)
-            
-            # Store metrics
-            elapsed = time.time() - start_time
-            metrics['lateral_errors'].append(lateral_error)
-            metrics['heading_errors'].append(heading_error)
-            metrics['steering_angles'].append(control.steer)
-            metrics['speeds'].append(speed)
-            metrics['timestamps'].append(elapsed)
-            
-            # Update visualization
-            if self.viz:
-                # Set camera image
-                if self.camera_data is not None:
-                    self.viz.set_camera_image(self.camera_data)
+        if abort_criteria is not None:
+            abort_criteria.reset()
+        failure = None
+        
+        try:
+            while step < num_ticks:
+                # Tick simulation
+                self.world.tick()
+                rpc_counter.tick()
+                
+                # Get vehicle state once (shared with the controller for this frame)
+                state = VehicleState.capture(self.world, self.vehicle, rpc_counter)
+                query = query_path(state, path, tracker)
+                transform = query.transform
+                speed = query.speed
+                
+                # Compute control using YOUR controller
+                control = controller.run_step_from_state(state, path)
+                
+                # Apply control
+                self.vehicle.apply_control(control)
+                rpc_counter.add('apply_control')
                 
-                # Get additional info for hybrid
-                active_controller = controller_name
-                blend_weight = 0.0
-                curvature = 0.0
+                # Calculate metrics
+                lateral_error, heading_error = self._calculate_tracking_errors(
+                    transform, path, query.closest_idx
+                )
                 
-                if hasattr(controller, 'get_controller_info'):
-                    info = controller.get_controller_info()
-                    curvature = info.get('curvature', 0.0)
-                    active_controller = info.get('active_controller', controller_name)
-                    blend_weight = info.get('blend_weight', 0.0)
+                # Slide the waypoint window for the next tick
+                path = route.advance(query.closest_idx, query.closest_distance, query.location)
                 
-                self.viz.update_metrics(
-                    experiment_name=experiment_name,
-                    lateral_error=lateral_error,
-                    heading_error=heading_error,
-                    steering_angle=control.steer,
-                    speed=speed,
-                    time_elapsed=elapsed,
-                    curvature=curvature,
-                    active_controller=active_controller,
-                    blend_weight=blend_weight
+                # Update metrics (traces hold the heading error in degrees,
+                # like the other runners' traces)
+                elapsed = state.timestamp - start_timestamp
+                location = query.location
+                recorder.append(
+                    lateral_error, np.degrees(heading_error), control.steer, speed, elapsed,
+                    location.x, location.y, location.z, np.radians(transform.rotation.yaw)
                 )
+                run_summary.update(lateral_error, heading_error, control.steer, speed)
+                
+                if abort_criteria is not None:
+                    failure = abort_criteria.update(lateral_error, np.degrees(heading_error), speed)
+                
+                # Update visualization
+                if self.viz:
+                    # Set camera image
+                    if self.camera_data is not None:
+                        self.viz.set_camera_image(self.camera_data)
+                    
+                    # Get additional info for hybrid
+                    active_controller = controller_name
+                    blend_weight = 0.0
+                    curvature = 0.0
+                    
+                    if hasattr(controller, 'get_controller_info'):
+                        info = controller.get_controller_info()
+                        curvature = info.get('curvature', 0.0)
+                        active_controller = info.get('active_controller', controller_name)
+                        blend_weight = info.get('blend_weight', 0.0)
+                    
+                    self.viz.update_metrics(
+                        experiment_name=experiment_name,
+                        lateral_error=lateral_error,
+                        heading_error=heading_error,
+                        steering_angle=control.steer,
+                        speed=speed,
+                        time_elapsed=elapsed,
+                        curvature=curvature,
+                        active_controller=active_controller,
+                        blend_weight=blend_weight
+                    )
+                    
+                    self.viz.render()
+                    
+                    # Check if user closed window
+                    if not self.viz.is_running():
+                        print("\nVisualization closed by user. Stopping experiment.")
+                        break
                 
-                self.viz.render()
+                step += 1
                 
-                # Check if user closed window
-                if not self.viz.is_running():
-                    print("\nVisualization closed by user. Stopping experiment.")
+                if failure is not None:
+                    print(f"\n  Aborting at step {step}: {failure} bound exceeded")
                     break
-            
-            step += 1
-            
-            # Progress
-            if step % 100 == 0:
-                print(f"  Step {step}, Time: {elapsed:.1f}s, "
-                      f"Lat Error: {lateral_error:.3f}m, Speed: {speed:.1f}m/s")
+                
+                # Progress
+                if step % 100 == 0:
+                    print(f"  Step {step}, Time: {elapsed:.1f}s, "
+                          f"Lat Error: {lateral_error:.3f}m, Speed: {speed:.1f}m/s")
+        
+        finally:
+            # Writes out the last chunk of a streamed trace, even on errors
+            recorder.close()
         
         # Calculate summary statistics
-        results = self._calculate_statistics(metrics, experiment_name)
+        rpc_counter.add('waypoint_queries', route.rpc_calls)
+        results = self._calculate_statistics(run_summary, experiment_name, elapsed)
+        results.update(trace_fields(recorder))
+        results['rpcs_per_tick'] = rpc_counter.total_per_tick()
+        results['rpc_calls_per_tick'] = rpc_counter.per_tick()
+        results['wall_time'] = time.time() - start_time
+        # A run without a single logged tick has no statistics (None)
+        if not run_summary.count and failure is None:
+            failure = NO_DATA
+        results['failed'] = failure is not None
+        results['failure_reason'] = failure
         
         # Save results
         self._save_results(results, experiment_name)
         
         print(f"\n✓ Experiment complete!")
-        print(f"  Mean Lateral Error: {results['mean_lateral_error']:.3f}m")
-        print(f"  Steering Smoothness: {results['steering_smoothness']:.4f}")
+        if run_summary.count:
+            print(f"  Mean Lateral Error: {results['mean_lateral_error']:.3f}m")
+            print(f"  Steering Smoothness: {results['steering_smoothness']:.4f}")
+        else:
+            print("  No ticks logged")
+        print(f"  CARLA calls per tick: {results['rpcs_per_tick']:.2f}")
         
         return results
     
-    def _calculate_lateral_error(self, vehicle_location, waypoints):
-        """Calculate lateral error to nearest waypoint."""
-        if not waypoints:
-            return 0.0
-        
-        min_dist = float('inf')
-        
-        for wp in waypoints[:10]:
-            dist = vehicle_location.distance(wp.transform.location)
-            if dist < min_dist:
-                min_dist = dist
-        
-        return min_dist
-    
-    def _calculate_heading_error(self, vehicle_transform, waypoints):
-        """Calculate heading error."""
-        if not waypoints:
-            return 0.0
+    def _calculate_tracking_errors(self, vehicle_transform, path, closest_idx):
+        """Calculate lateral error to the path segments and heading error (radians)."""
+        location = vehicle_transform.location
+        cross_track_error, _, path_yaw = path.cross_track(location.x, location.y, closest_idx)
         
         vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
-        
-        # Get closest waypoint
-        min_dist = float('inf')
-        closest_wp = waypoints[0]
-        
-        for wp in waypoints[:10]:
-            dist = vehicle_transform.location.distance(wp.transform.location)
-            if dist < min_dist:
-                min_dist = dist
-                closest_wp = wp
-        
-        target_yaw = np.radians(closest_wp.transform.rotation.yaw)
-        
-        error = target_yaw - vehicle_yaw
+        error = path_yaw - vehicle_yaw
         error = np.arctan2(np.sin(error), np.cos(error))
         
-        return error
+        return abs(cross_track_error), error
     
-    def _calculate_statistics(self, metrics, name):
-        """Calculate summary statistics."""
-        lateral_errors = metrics['lateral_errors']
-        steering_angles = metrics['steering_angles']
-        
-        # Steering smoothness (std of changes)
-        steering_changes = np.diff(steering_angles)
-        smoothness = np.std(steering_changes) if len(steering_changes) > 0 else 0.0
+    def _calculate_statistics(self, run_summary, name, duration):
+        """Collect the summary statistics accumulated during the run."""
+        summary = run_summary.summary()
         
         results = {
             'experiment_name': name,
-            'mean_lateral_error': float(np.mean(lateral_errors)),
-            'max_lateral_error': float(np.max(lateral_errors)),
-            'std_lateral_error': float(np.std(lateral_errors)),
-            'mean_heading_error': float(np.mean([abs(x) for x in metrics['heading_errors']])),
-            'max_heading_error': float(np.max([abs(x) for x in metrics['heading_errors']])),
-            'steering_smoothness': float(smoothness),
-            'mean_speed': float(np.mean(metrics['speeds'])),
-            'duration': float(metrics['timestamps'][-1]) if metrics['timestamps'] else 0,
-            'data_points': len(lateral_errors)
+            'mean_lateral_error': summary['mean_lateral_error'],
+            'max_lateral_error': summary['max_lateral_error'],
+            'std_lateral_error': summary['std_lateral_error'],
+            'mean_heading_error': summary['mean_abs_heading_error'],
+            'max_heading_error': summary['max_abs_heading_error'],
+            # Steering smoothness (std of changes)
+            'steering_smoothness': summary['steering_smoothness'],
+            'mean_speed': summary['mean_speed'],
+            'duration': float(duration),
+            'data_points': run_summary.count
         }
+        for p in LATERAL_ERROR_QUANTILES:
+            results[quantile_key(p)] = summary[quantile_key(p)]
         
         return results
     
     def _save_results(self, results, name):
-        """Save results to JSON file."""
+        """Save results in the binary results format (JSON summary, .npz traces)."""
         filename = self.results_dir / f"{name}.json"
-        with open(filename, 'w') as f:
-            json.dump(results, f, indent=2)
+        save_result(results, str(filename))
         print(f"  Saved results to {filename}")
     
     def cleanup(self):
@@ -377,7 +406,20 @@ class ExperimentRunnerWithCamera:
 
 def main():
     """Run all experiments with camera visualization."""
-    runner = ExperimentRunnerWithCamera(enable_viz=True)
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--backend', choices=local_sim.BACKENDS, default='carla',
+        help="simulator backend: a CARLA server or the offline kinematic-bicycle simulator")
+    argparser.add_argument('--no-abort', action='store_true',
+                           help='run diverging experiments for the full duration')
+    argparser.add_argument('--stream', action='store_true',
+                           help='write traces to results/.traces in chunks during each run')
+    args = argparser.parse_args()
+    
+    stream_dir = os.path.join('results', TRACE_STREAM_DIR) if args.stream else None
+    runner = ExperimentRunnerWithCamera(enable_viz=True, backend=args.backend,
+                                        stream_dir=stream_dir)
+    abort_criteria = None if args.no_abort else AbortCriteria()
     
     try:
         # Setup
@@ -411,7 +453,8 @@ def main():
         all_results = []
         for i, (controller, params) in enumerate(experiments):
             print(f"\nExperiment {i+1}/{len(experiments)}")
-            results = runner.run_experiment(controller, params, duration=60)
+            results = runner.run_experiment(controller, params, duration=60,
+                                            abort_criteria=abort_criteria)
             all_results.append(results)
             
             # Brief pause between experiments
@@ -424,6 +467,9 @@ def main():
         # Print summary
         print("\nSummary:")
         for result in all_results:
+            if not result['data_points']:
+                print(f"  {result['experiment_name']}: no ticks logged")
+                continue
             print(f"  {result['experiment_name']}: "
                   f"Lateral Error = {result['mean_lateral_error']:.3f}m, "
                   f"Smoothness = {result['steering_smoothness']:.4f}")
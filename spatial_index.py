@@ -0,0 +1,298 @@
+"""
+Spatial Index for Waypoint Queries
+Uniform grid hash answering nearest-waypoint and radius queries in sub-linear time
+"""
+
+import math
+import numpy as np
+
+
+# Below this many waypoints one vectorized scan over all of them answers a
+# nearest query faster than the ring search (crossover measured with
+# benchmark_spatial_index.py)
+SCAN_THRESHOLD = 10_000
+
+
+class WaypointIndex:
+    """
+    Uniform grid hash over 2D waypoint positions.
+
+    Points are bucketed into square cells once at construction. A nearest
+    query inspects rings of cells around the query point and stops as soon
+    as no unvisited ring can hold a closer point, so the cost depends on
+    local waypoint density rather than on the total number of waypoints.
+    Small indexes answer nearest queries with a plain vectorized scan
+    instead, which has less per-query overhead.
+    """
+
+    def __init__(self, xs, ys, cell_size=None, scan_threshold=SCAN_THRESHOLD):
+        """
+        Build the index.
+
+        Args:
+            xs (array-like): Waypoint x coordinates (meters)
+            ys (array-like): Waypoint y coordinates (meters)
+            cell_size (float): Grid cell edge length (meters). If None, it is
+                chosen from the median point spacing.
+            scan_threshold (int): Answer nearest queries with a scan over all
+                points when there are fewer than this many
+        """
+        self.xs = np.ascontiguousarray(xs, dtype=np.float64)
+        self.ys = np.ascontiguousarray(ys, dtype=np.float64)
+
+        if len(self.xs) == 0:
+            raise ValueError("Cannot build a spatial index over zero waypoints")
+
+        self.min_x = float(self.xs.min())
+        self.min_y = float(self.ys.min())
+
+        if cell_size is None:
+            cell_size = self._default_cell_size()
+        self.cell_size = float(cell_size)
+
+        cell_x = np.floor((self.xs - self.min_x) / self.cell_size).astype(np.int64)
+        cell_y = np.floor((self.ys - self.min_y) / self.cell_size).astype(np.int64)
+        self.num_cells_x = int(cell_x.max()) + 1
+        self.num_cells_y = int(cell_y.max()) + 1
+
+        # Sort point ids by cell key so each cell is a contiguous slice
+        keys = cell_x * self.num_cells_y + cell_y
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        unique_keys, starts, counts = np.unique(
+            sorted_keys, return_index=True, return_counts=True
+        )
+        self.cells = {
+            int(key): (int(start), int(start + count))
+            for key, start, count in zip(unique_keys, starts, counts)
+        }
+        self._cell_x = cell_x
+        self._cell_y = cell_y
+        self._neighbours = None
+        self.scan = len(self.xs) < scan_threshold
+
+    def _default_cell_size(self):
+        """
+        Pick a cell size from the median spacing between consecutive points.
+
+        Returns:
+            float: Cell edge length in meters
+        """
+        if len(self.xs) < 2:
+            return 1.0
+
+        spacing = np.hypot(np.diff(self.xs), np.diff(self.ys))
+        spacing = spacing[spacing > 1e-6]
+        if len(spacing) == 0:
+            return 1.0
+
+        # A few waypoints per cell keeps both ring count and cell size small
+        return max(4.0 * float(np.median(spacing)), 1.0)
+
+    @classmethod
+    def from_waypoints(cls, waypoints, cell_size=None):
+        """
+        Build an index from a list of carla.Waypoint objects.
+
+        Args:
+            waypoints: List of waypoints
+            cell_size (float): Grid cell edge length (meters)
+
+        Returns:
+            WaypointIndex: Index over the waypoint locations
+        """
+        xs = np.empty(len(waypoints))
+        ys = np.empty(len(waypoints))
+        for i, waypoint in enumerate(waypoints):
+            location = waypoint.transform.location
+            xs[i] = location.x
+            ys[i] = location.y
+        return cls(xs, ys, cell_size=cell_size)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _cell_of(self, x, y):
+        cx = int(math.floor((x - self.min_x) / self.cell_size))
+        cy = int(math.floor((y - self.min_y) / self.cell_size))
+        return cx, cy
+
+    def _points_in_cell(self, cx, cy):
+        if cx < 0 or cy < 0 or cx >= self.num_cells_x or cy >= self.num_cells_y:
+            return None
+        span = self.cells.get(cx * self.num_cells_y + cy)
+        if span is None:
+            return None
+        return self.order[span[0]:span[1]]
+
+    def _ring_cells(self, cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+    def nearest(self, x, y):
+        """
+        Find the waypoint closest to a query point.
+
+        Args:
+            x (float): Query x coordinate (meters)
+            y (float): Query y coordinate (meters)
+
+        Returns:
+            tuple: (index, distance) of the closest waypoint
+        """
+        if self.scan:
+            dist_sq = (self.xs - x)**2 + (self.ys - y)**2
+            idx = int(np.argmin(dist_sq))
+            return idx, math.sqrt(dist_sq[idx])
+
+        cx, cy = self._cell_of(x, y)
+
+        # Rings that lie completely outside the grid hold no points, so
+        # start at the first ring that can touch it
+        gap_x = max(0, -cx, cx - (self.num_cells_x - 1))
+        gap_y = max(0, -cy, cy - (self.num_cells_y - 1))
+        first_ring = max(gap_x, gap_y)
+        last_ring = first_ring + max(self.num_cells_x, self.num_cells_y)
+
+        best_idx = -1
+        best_dist_sq = float('inf')
+
+        for ring in range(first_ring, last_ring + 1):
+            chunks = []
+            for ix, iy in self._ring_cells(cx, cy, ring):
+                ids = self._points_in_cell(ix, iy)
+                if ids is not None:
+                    chunks.append(ids)
+
+            if chunks:
+                ids = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+                dist_sq = (self.xs[ids] - x)**2 + (self.ys[ids] - y)**2
+                local = int(np.argmin(dist_sq))
+                if dist_sq[local] < best_dist_sq:
+                    best_dist_sq = float(dist_sq[local])
+                    best_idx = int(ids[local])
+
+            # Every point beyond this ring is at least ring * cell_size away
+            reach = ring * self.cell_size
+            if best_idx >= 0 and best_dist_sq <= reach * reach:
+                break
+
+        return best_idx, math.sqrt(best_dist_sq)
+
+    def _neighbour_table(self):
+        """
+        Points of the 3x3 block of cells around every cell, as one padded
+        array (built on first use).
+
+        Returns:
+            np.ndarray: (cells, K) point ids per cell key, padded with -1
+        """
+        if self._neighbours is None:
+            keys = []
+            ids = []
+            point_ids = np.arange(len(self.xs))
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    cx = self._cell_x + dx
+                    cy = self._cell_y + dy
+                    inside = (cx >= 0) & (cy >= 0) & (cx < self.num_cells_x) & (cy < self.num_cells_y)
+                    keys.append(cx[inside] * self.num_cells_y + cy[inside])
+                    ids.append(point_ids[inside])
+            keys = np.concatenate(keys)
+            ids = np.concatenate(ids)
+
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            ids = ids[order]
+            counts = np.bincount(keys, minlength=self.num_cells_x * self.num_cells_y)
+            starts = np.cumsum(counts) - counts
+            slots = np.arange(len(keys)) - starts[keys]
+
+            table = np.full((len(counts), max(int(counts.max()), 1)), -1, dtype=np.int64)
+            table[keys, slots] = ids
+            self._neighbours = table
+        return self._neighbours
+
+    def nearest_batch(self, x, y):
+        """
+        Vectorized nearest for many query points at once.
+
+        Each query looks at the points of the 3x3 block of cells around its
+        own cell in one array operation. A match within one cell size is
+        exact, because every closer point lies inside the block; the few
+        queries farther from the path than that fall back to nearest.
+
+        Args:
+            x (np.ndarray): Query x coordinates (meters)
+            y (np.ndarray): Query y coordinates (meters)
+
+        Returns:
+            tuple: (indices, distances) arrays of the closest waypoints
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        table = self._neighbour_table()
+
+        # A query just off the grid sees the same points from the nearest
+        # border cell; one farther off is more than a cell size from every
+        # point and falls back below
+        cx = np.floor((x - self.min_x) / self.cell_size)
+        cy = np.floor((y - self.min_y) / self.cell_size)
+        cx = np.clip(cx, 0, self.num_cells_x - 1).astype(np.int64)
+        cy = np.clip(cy, 0, self.num_cells_y - 1).astype(np.int64)
+        keys = cx * self.num_cells_y + cy
+
+        candidates = table[keys]
+        valid = candidates >= 0
+        safe = np.where(valid, candidates, 0)
+        dist_sq = (self.xs[safe] - x[:, None])**2 + (self.ys[safe] - y[:, None])**2
+        dist_sq[~valid] = np.inf
+
+        local = np.argmin(dist_sq, axis=1)
+        rows = np.arange(len(x))
+        idx = candidates[rows, local]
+        distance = np.sqrt(dist_sq[rows, local])
+
+        for i in np.flatnonzero(~(distance <= self.cell_size)):
+            idx[i], distance[i] = self.nearest(x[i], y[i])
+        return idx, distance
+
+    def query_radius(self, x, y, radius):
+        """
+        Find all waypoints within a radius of a query point.
+
+        Args:
+            x (float): Query x coordinate (meters)
+            y (float): Query y coordinate (meters)
+            radius (float): Search radius (meters)
+
+        Returns:
+            np.ndarray: Sorted indices of waypoints within the radius
+        """
+        lo_x, lo_y = self._cell_of(x - radius, y - radius)
+        hi_x, hi_y = self._cell_of(x + radius, y + radius)
+        lo_x, lo_y = max(lo_x, 0), max(lo_y, 0)
+        hi_x = min(hi_x, self.num_cells_x - 1)
+        hi_y = min(hi_y, self.num_cells_y - 1)
+
+        chunks = []
+        for ix in range(lo_x, hi_x + 1):
+            for iy in range(lo_y, hi_y + 1):
+                ids = self._points_in_cell(ix, iy)
+                if ids is not None:
+                    chunks.append(ids)
+
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+
+        ids = np.concatenate(chunks)
+        dist_sq = (self.xs[ids] - x)**2 + (self.ys[ids] - y)**2
+        return np.sort(ids[dist_sq <= radius * radius])
+
@@ -4,7 +4,15 @@ Implements lateral control using cross-track error and heading error
 """
 
 import numpy as np
-import carla
+try:
+    import carla
+except ImportError:
+    # CARLA client not installed: only the offline simulator is available
+    import local_sim as carla
+
+from path_query import query_path
+from vehicle_state import VehicleState
+from waypoint_path import BatchClosestPointTracker, ClosestPointTracker, as_path
 
 
 class StanleyController:
@@ -26,38 +34,46 @@ class StanleyController:
         self.k = k
         self.wheelbase = wheelbase
         self.target_speed = 30.0  # km/h
+        self.tracker = ClosestPointTracker()
+        self.batch_tracker = BatchClosestPointTracker()
         
-    def find_closest_waypoint(self, vehicle_location, waypoints):
+    def reset(self):
+        """
+        Reset per-run state (call after the vehicle is teleported).
+        """
+        self.tracker.reset()
+        self.batch_tracker.reset()
+    
+    def params(self):
+        """
+        Constructor parameters (identify the configuration, not its state).
+        
+        Returns:
+            dict: Keyword arguments that rebuild this controller
+        """
+        return {'k': self.k, 'wheelbase': self.wheelbase}
+    
+    def find_closest_waypoint(self, vehicle_location, path):
         """
         Find the closest waypoint to the vehicle.
         
         Args:
             vehicle_location: Current vehicle location (carla.Location)
-            waypoints: List of waypoints representing the path
+            path (Path): Array-backed path
             
         Returns:
-            tuple: (closest_waypoint, index, cross_track_error)
+            tuple: (index, distance) of the closest waypoint
         """
-        min_distance = float('inf')
-        closest_waypoint = None
-        closest_idx = 0
-        
-        for i, waypoint in enumerate(waypoints):
-            distance = vehicle_location.distance(waypoint.transform.location)
-            if distance < min_distance:
-                min_distance = distance
-                closest_waypoint = waypoint
-                closest_idx = i
-        
-        return closest_waypoint, closest_idx, min_distance
+        return self.tracker.find(path, vehicle_location.x, vehicle_location.y)
     
-    def compute_cross_track_error(self, vehicle_transform, closest_waypoint):
+    def compute_cross_track_error(self, vehicle_transform, path, closest_idx):
         """
         Compute the cross-track error (lateral deviation from path).
         
         Args:
             vehicle_transform: Current vehicle transform (carla.Transform)
-            closest_waypoint: Closest waypoint on the path
+            path (Path): Array-backed path
+            closest_idx (int): Index of the closest waypoint on the path
             
         Returns:
             float: Cross-track error (positive = right of path, negative = left)
@@ -66,12 +82,9 @@ class StanleyController:
         vehicle_location = vehicle_transform.location
         vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
         
-        # Waypoint position
-        waypoint_location = closest_waypoint.transform.location
-        
         # Vector from vehicle to waypoint
-        dx = waypoint_location.x - vehicle_location.x
-        dy = waypoint_location.y - vehicle_location.y
+        dx = path.x[closest_idx] - vehicle_location.x
+        dy = path.y[closest_idx] - vehicle_location.y
         
         # Transform to vehicle's local coordinate frame
         # Cross-track error is the lateral component
@@ -79,14 +92,14 @@ class StanleyController:
         
         return cross_track_error
     
-    def compute_heading_error(self, vehicle_transform, closest_waypoint, next_waypoint):
+    def compute_heading_error(self, vehicle_transform, path, closest_idx):
         """
         Compute the heading error (difference between vehicle and path heading).
         
         Args:
             vehicle_transform: Current vehicle transform (carla.Transform)
-            closest_waypoint: Closest waypoint on the path
-            next_waypoint: Next waypoint on the path (for computing path heading)
+            path (Path): Array-backed path
+            closest_idx (int): Index of the closest waypoint on the path
             
         Returns:
             float: Heading error in radians
@@ -95,13 +108,14 @@ class StanleyController:
         vehicle_yaw = np.radians(vehicle_transform.rotation.yaw)
         
         # Path heading (from closest to next waypoint)
-        if next_waypoint is not None:
-            dx = next_waypoint.transform.location.x - closest_waypoint.transform.location.x
-            dy = next_waypoint.transform.location.y - closest_waypoint.transform.location.y
+        next_idx = path.next_index(closest_idx)
+        if next_idx is not None:
+            dx = path.x[next_idx] - path.x[closest_idx]
+            dy = path.y[next_idx] - path.y[closest_idx]
             path_yaw = np.arctan2(dy, dx)
         else:
             # Use waypoint's own heading if no next waypoint
-            path_yaw = np.radians(closest_waypoint.transform.rotation.yaw)
+            path_yaw = path.yaw[closest_idx]
         
         # Compute heading error (normalize to [-pi, pi])
         heading_error = path_yaw - vehicle_yaw
@@ -109,14 +123,15 @@ class StanleyController:
         
         return heading_error
     
-    def compute_steering(self, vehicle_transform, vehicle_speed, waypoints):
+    def compute_steering(self, vehicle_transform, vehicle_speed, path, closest_idx=None):
         """
         Compute steering angle using Stanley controller formula.
         
         Args:
             vehicle_transform: Current vehicle transform (carla.Transform)
             vehicle_speed: Current vehicle speed (m/s)
-            waypoints: List of waypoints representing the path
+            path (Path): Array-backed path
+            closest_idx (int): Closest waypoint index if already known
             
         Returns:
             float: Steering angle in radians (normalized to [-1, 1] for CARLA)
@@ -124,23 +139,17 @@ class StanleyController:
         vehicle_location = vehicle_transform.location
         
         # Find closest waypoint
-        closest_waypoint, closest_idx, _ = self.find_closest_waypoint(
-            vehicle_location, waypoints
-        )
-        
-        # Get next waypoint for heading calculation
-        next_waypoint = None
-        if closest_idx + 1 < len(waypoints):
-            next_waypoint = waypoints[closest_idx + 1]
+        if closest_idx is None:
+            closest_idx, _ = self.find_closest_waypoint(vehicle_location, path)
         
         # Compute heading error
         heading_error = self.compute_heading_error(
-            vehicle_transform, closest_waypoint, next_waypoint
+            vehicle_transform, path, closest_idx
         )
         
         # Compute cross-track error
         cross_track_error = self.compute_cross_track_error(
-            vehicle_transform, closest_waypoint
+            vehicle_transform, path, closest_idx
         )
         
         # Stanley control law
@@ -156,22 +165,95 @@ class StanleyController:
         
         return normalized_steering
     
-    def run_step(self, vehicle, waypoints):
+    def compute_steering_batch(self, x, y, yaw, speed, path, closest_idx=None):
+        """
+        Vectorized Stanley steering for many vehicle states at once.
+        
+        Matches compute_steering per state. The k attribute may be a scalar
+        or an array with one entry per state.
+        
+        Args:
+            x, y (np.ndarray): Vehicle positions (meters)
+            yaw (np.ndarray): Vehicle headings (radians)
+            speed (np.ndarray): Vehicle speeds (m/s)
+            path (Path): Array-backed path
+            closest_idx (np.ndarray): Closest waypoint indices if already known
+            
+        Returns:
+            np.ndarray: Steering commands normalized to [-1, 1]
+        """
+        path = as_path(path)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        yaw = np.asarray(yaw, dtype=np.float64)
+        if closest_idx is None:
+            closest_idx, _ = self.batch_tracker.find(path, x, y)
+        
+        # Path heading from the closest to the next waypoint
+        n = len(path)
+        if path.closed:
+            next_idx = (closest_idx + 1) % n
+            has_next = np.ones(len(closest_idx), dtype=bool)
+        else:
+            has_next = closest_idx + 1 < n
+            next_idx = np.minimum(closest_idx + 1, n - 1)
+        segment_yaw = np.arctan2(path.y[next_idx] - path.y[closest_idx],
+                                 path.x[next_idx] - path.x[closest_idx])
+        path_yaw = np.where(has_next, segment_yaw, path.yaw[closest_idx])
+        
+        heading_error = path_yaw - yaw
+        heading_error = np.arctan2(np.sin(heading_error), np.cos(heading_error))
+        
+        # Lateral component of the vector to the closest waypoint
+        dx = path.x[closest_idx] - x
+        dy = path.y[closest_idx] - y
+        cross_track_error = -dx * np.sin(yaw) + dy * np.cos(yaw)
+        
+        cross_track_term = np.arctan(self.k * cross_track_error / np.maximum(speed, 0.1))
+        steering_angle = heading_error + cross_track_term
+        
+        max_steering_angle = np.radians(70)
+        return np.clip(steering_angle / max_steering_angle, -1.0, 1.0)
+    
+    def run_step(self, vehicle, path):
         """
         Execute one control step.
         
+        Reads the vehicle state from the world snapshot; runners that already
+        captured it this tick should call run_step_from_state instead.
+        
         Args:
             vehicle: CARLA vehicle actor
-            waypoints: List of waypoints representing the path
+            path (Path): Array-backed path (a list of waypoints is also accepted)
             
         Returns:
             carla.VehicleControl: Control command for the vehicle
         """
-        vehicle_transform = vehicle.get_transform()
-        vehicle_speed = self.get_speed(vehicle)
+        state = VehicleState.capture(vehicle.get_world(), vehicle)
+        return self.run_step_from_state(state, path)
+    
+    def run_step_from_state(self, state, path):
+        """
+        Execute one control step from a captured vehicle state.
+        
+        Args:
+            state (VehicleState): Vehicle state for the current frame
+            path (Path): Array-backed path (a list of waypoints is also accepted)
+            
+        Returns:
+            carla.VehicleControl: Control command for the vehicle
+        """
+        path = as_path(path)
+        
+        # Closest match (shared with other users this tick)
+        query = query_path(state, path, self.tracker)
+        vehicle_transform = query.transform
+        vehicle_speed = query.speed
         
         # Compute steering
-        steering = self.compute_steering(vehicle_transform, vehicle_speed, waypoints)
+        steering = self.compute_steering(
+            vehicle_transform, vehicle_speed, path, query.closest_idx
+        )
         
         # Simple speed control
         if vehicle_speed < self.target_speed / 3.6:  # Convert km/h to m/s
@@ -0,0 +1,273 @@
+"""
+Parallel Sweep Executor
+Dispatches experiments to a pool of worker processes, each driving its own
+simulator (one CARLA server per worker, or the offline local_sim backend)
+"""
+
+import contextlib
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import traceback
+
+from hybrid_controller import HybridController
+from pure_pursuit import PurePursuitController
+from stanley import StanleyController
+
+
+# Seconds between liveness checks while waiting for results
+POLL_INTERVAL = 1.0
+
+
+def experiment_spec(name, controller, params=None, duration=60.0, filename=None):
+    """
+    Describe one experiment of a sweep.
+
+    Specs are plain dicts so they can be sent to worker processes.
+
+    Args:
+        name (str): Experiment name
+        controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+        params (dict): Controller constructor parameters
+        duration (float): Experiment duration in simulated seconds
+        filename (str): Per-experiment results file (None to skip saving)
+
+    Returns:
+        dict: Experiment spec
+    """
+    return {
+        'name': name,
+        'controller': controller,
+        'params': dict(params or {}),
+        'duration': duration,
+        'filename': filename,
+    }
+
+
+def build_controller(controller, params):
+    """
+    Create a controller from its name and constructor parameters.
+
+    Args:
+        controller (str): 'pure_pursuit', 'stanley' or 'hybrid'
+        params (dict): Controller constructor parameters
+
+    Returns:
+        Controller instance
+    """
+    if controller == 'pure_pursuit':
+        return PurePursuitController(**params)
+    if controller == 'stanley':
+        return StanleyController(**params)
+    if controller == 'hybrid':
+        return HybridController(**params)
+    raise ValueError(f"Unknown controller: {controller}")
+
+
+def _worker(worker_id, backend, host, port, town, spacing, abort_criteria, result_cache,
+            stream_dir, verbose, task_queue, result_queue):
+    """
+    Worker process: set up one simulator connection and run experiments
+    from the task queue until the None sentinel arrives.
+
+    Results are put on the result queue as (index, worker_id, metrics, error)
+    tuples; a setup failure is reported once with index None.
+    """
+    # Ctrl-C is handled by the parent, which stops the workers; a worker
+    # must not turn it into a truncated result
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Imported here: experiment_runner_extended.main uses this module
+    from experiment_runner_extended import ExtendedExperimentRunner
+
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(
+                stack.enter_context(open(os.devnull, 'w'))))
+
+        runner = None
+        try:
+            runner = ExtendedExperimentRunner(host, port, backend=backend,
+                                              result_cache=result_cache, stream_dir=stream_dir)
+            runner.setup_world(town=town)
+            runner.generate_waypoints(distance=spacing)
+            runner.spawn_vehicle()
+        except Exception:
+            result_queue.put((None, worker_id, None, traceback.format_exc()))
+            if runner is not None:
+                runner.cleanup()
+            return
+
+        try:
+            while True:
+                task = task_queue.get()
+                if task is None:
+                    break
+                index, spec = task
+                try:
+                    controller = build_controller(spec['controller'], spec['params'])
+                    metrics = runner.run_experiment(controller, spec['name'],
+                                                    duration=spec['duration'],
+                                                    abort_criteria=abort_criteria)
+                    if spec['filename']:
+                        runner.save_metrics(metrics, spec['filename'])
+                    result_queue.put((index, worker_id, metrics, None))
+                except Exception:
+                    result_queue.put((index, worker_id, None, traceback.format_exc()))
+        finally:
+            runner.cleanup()
+
+
+class SweepExecutor:
+    """
+    Run a list of experiment specs on a pool of worker processes.
+
+    Each worker owns one simulator connection for its lifetime. Specs are
+    queued longest first and workers pull the next one as soon as they are
+    free, so experiments of unequal length balance across the pool. Results
+    come back through a queue and are returned in spec order, independent
+    of which worker ran what.
+    """
+
+    def __init__(self, num_workers=1, backend='carla', host='localhost', ports=None,
+                 port=2000, town='Town01', spacing=2.0, abort_criteria=None, result_cache=None,
+                 stream_dir=None, verbose=False):
+        """
+        Initialize the executor.
+
+        Args:
+            num_workers (int): Number of worker processes
+            backend (str): 'carla' or 'local'
+            host (str): CARLA server host
+            ports (list): CARLA server port of each worker; defaults to
+                port, port + 2, ... (CARLA also uses the port after each one)
+            port (int): First CARLA server port when ports is not given
+            town (str): Map every worker loads
+            spacing (float): Route waypoint spacing (meters)
+            abort_criteria (AbortCriteria): Early termination of diverging
+                experiments (None to run every experiment for its full duration)
+            result_cache (ResultCache): Cache serving unchanged experiments
+                (None to always simulate)
+            stream_dir (str): Directory the workers stream traces to during
+                each run (None to keep them in memory)
+            verbose (bool): Show the workers' per-experiment output
+        """
+        if ports is None:
+            ports = [port + 2 * i for i in range(num_workers)]
+        if len(ports) < num_workers:
+            raise ValueError(f"{num_workers} workers need {num_workers} ports, got {len(ports)}")
+
+        self.num_workers = num_workers
+        self.backend = backend
+        self.host = host
+        self.ports = list(ports)[:num_workers]
+        self.town = town
+        self.spacing = spacing
+        self.abort_criteria = abort_criteria
+        self.result_cache = result_cache
+        self.stream_dir = stream_dir
+        self.verbose = verbose
+
+    def run(self, specs, on_result=None):
+        """
+        Run all experiments.
+
+        Args:
+            specs (list): Experiment specs (see experiment_spec)
+            on_result (callable): Called as on_result(index, metrics) in this
+                process as soon as each experiment finishes
+
+        Returns:
+            list: Metrics of each spec, in spec order
+
+        Raises:
+            RuntimeError: If an experiment fails or no worker could start
+        """
+        if not specs:
+            return []
+
+        context = multiprocessing.get_context('spawn')
+        task_queue = context.Queue()
+        result_queue = context.Queue()
+
+        # Longest experiments first, so short ones fill in at the end
+        order = sorted(range(len(specs)), key=lambda i: -specs[i]['duration'])
+        for index in order:
+            task_queue.put((index, specs[index]))
+
+        num_workers = min(self.num_workers, len(specs))
+        for _ in range(num_workers):
+            task_queue.put(None)
+
+        workers = [
+            context.Process(
+                target=_worker,
+                args=(worker_id, self.backend, self.host, self.ports[worker_id], self.town,
+                      self.spacing, self.abort_criteria, self.result_cache, self.stream_dir,
+                      self.verbose, task_queue, result_queue),
+                daemon=True,
+            )
+            for worker_id in range(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        results = [None] * len(specs)
+        errors = []
+        failed_workers = set()
+        remaining = len(specs)
+        start = time.perf_counter()
+
+        try:
+            while remaining:
+                try:
+                    index, worker_id, metrics, error = result_queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError(
+                            f"All workers exited with {remaining} experiments left")
+                    continue
+
+                if index is None:
+                    # Setup failed; the other workers keep draining the queue
+                    failed_workers.add(worker_id)
+                    print(f"Worker {worker_id} (port {self.ports[worker_id]}) failed to start:\n"
+                          f"{error}")
+                    if len(failed_workers) == num_workers:
+                        raise RuntimeError("No worker could connect to a simulator")
+                    continue
+
+                remaining -= 1
+                done = len(specs) - remaining
+                if error is not None:
+                    errors.append((specs[index]['name'], error))
+                    print(f"[{done}/{len(specs)}] {specs[index]['name']} FAILED "
+                          f"(worker {worker_id})")
+                    continue
+
+                results[index] = metrics
+                if on_result is not None:
+                    on_result(index, metrics)
+                summary = metrics['summary']
+                outcome = (f"aborted ({summary['failure_reason']}) after {summary['total_steps']} steps"
+                           if summary.get('failed') else
+                           f"mean lateral error {summary['mean_lateral_error']:.3f} m")
+                print(f"[{done}/{len(specs)}] {specs[index]['name']} "
+                      f"(worker {worker_id}, {time.perf_counter() - start:.1f}s): {outcome}")
+        except BaseException:
+            # Interrupted or failed: do not wait for running experiments
+            for worker in workers:
+                worker.terminate()
+            raise
+        finally:
+            for worker in workers:
+                worker.join(timeout=10.0)
+                if worker.is_alive():
+                    worker.terminate()
+
+        if errors:
+            raise RuntimeError("Failed experiments:\n" + "\n".join(
+                f"{name}:\n{error}" for name, error in errors))
+        return results
@@ -0,0 +1,142 @@
+"""
+Sweep Manifest for Resumable Sweeps
+Records each completed experiment of a sweep as soon as it finishes, so an
+interrupted sweep restarts from the first unfinished experiment and the
+combined results file can be rebuilt from the per-run files
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from result_format import load_result_file
+
+
+# Manifests live in a subdirectory so result loaders never mistake them for
+# experiment files
+MANIFEST_DIR = '.sweep'
+
+
+class SweepManifest:
+    """
+    Completed experiments of one sweep, persisted after every completion.
+
+    Experiments are identified by a hash of their spec (controller,
+    parameters, duration, results file) and of the sweep settings, which
+    include the source hash of the code they run. Editing a configuration,
+    the simulator settings or the code therefore never resumes past it. The
+    manifest only resumes an interrupted sweep: once finish() is called the
+    next sweep starts over.
+
+    The manifest is rewritten to a temporary file and renamed into place on
+    every update, so it is never left half-written.
+    """
+
+    def __init__(self, name, results_dir='results', settings=None):
+        """
+        Open (or start) a sweep manifest.
+
+        Args:
+            name (str): Sweep name, e.g. the combined results file name
+            results_dir (str): Directory holding the per-run results files
+            settings (dict): JSON-serializable settings shared by the
+                experiments of the sweep (backend, town, source hash...)
+        """
+        self.results_dir = results_dir
+        self.filepath = os.path.join(results_dir, MANIFEST_DIR, f"{name}.json")
+        self.settings = dict(settings or {})
+        self.completed = {}
+        self.finished = None
+        if os.path.exists(self.filepath):
+            with open(self.filepath, 'r') as f:
+                content = json.load(f)
+            self.completed = content['completed']
+            self.finished = content.get('finished')
+
+    def spec_id(self, spec):
+        """
+        Manifest key of an experiment spec: a hash of the spec and the sweep
+        settings.
+        """
+        payload = json.dumps({'spec': spec, 'settings': self.settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_complete(self, spec):
+        """
+        Whether an experiment finished and its results file still exists.
+        """
+        return (self.spec_id(spec) in self.completed and
+                os.path.exists(os.path.join(self.results_dir, spec['filename'])))
+
+    def pending(self, specs):
+        """
+        Experiments still to run, in sweep order.
+
+        Args:
+            specs (list): Experiment specs of the sweep
+
+        Returns:
+            list: Indices into specs of the unfinished experiments
+        """
+        return [i for i, spec in enumerate(specs) if not self.is_complete(spec)]
+
+    def mark_complete(self, spec, metrics):
+        """
+        Record a finished experiment (its results file must already be saved).
+
+        Args:
+            spec (dict): Experiment spec
+            metrics (dict): Logged metrics
+        """
+        # An older entry for the same results file is stale now
+        self.completed = {spec_id: entry for spec_id, entry in self.completed.items()
+                          if entry['filename'] != spec['filename']}
+        self.completed[self.spec_id(spec)] = {
+            'name': spec['name'],
+            'filename': spec['filename'],
+            'completed': datetime.now().isoformat(),
+            'failed': bool(metrics['summary'].get('failed', False)),
+        }
+        self._write()
+
+    def finish(self):
+        """
+        Mark the sweep as finished, so the next sweep starts over instead of
+        resuming (load_results still reads the completed experiments).
+        """
+        self.finished = datetime.now().isoformat()
+        self._write()
+
+    def reset(self):
+        """
+        Forget all completed experiments (start the sweep over).
+        """
+        self.completed = {}
+        self.finished = None
+        self._write()
+
+    def load_results(self, specs):
+        """
+        Metrics of the completed experiments, read from their results files.
+
+        Args:
+            specs (list): Experiment specs of the sweep
+
+        Returns:
+            list: Metrics of each completed experiment, in sweep order
+        """
+        return [load_result_file(os.path.join(self.results_dir, spec['filename']))
+                for spec in specs if self.is_complete(spec)]
+
+    def _write(self):
+        """
+        Atomically replace the manifest file.
+        """
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        tmp_filepath = self.filepath + '.tmp'
+        with open(tmp_filepath, 'w') as f:
+            json.dump({'completed': self.completed, 'finished': self.finished}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, self.filepath)
@@ -0,0 +1,44 @@
+"""
+Tests for the hyperparameter search on the local backend
+"""
+
+import json
+import math
+
+import numpy as np
+
+from abort_criteria import AbortCriteria
+from hyperparameter_search import (BatchEvaluator, curve_start_index, rung_durations,
+                                   sample_configs, score)
+from online_stats import RunSummary
+
+
+def test_curve_start_index_skips_closing_corner():
+    evaluator = BatchEvaluator()
+    path = evaluator.path
+    start = evaluator.start_index
+    # Town01 opens with a 180 m straight; the loop's first waypoint still lies
+    # in the corner that closes it
+    assert abs(path.curvature[0]) >= 0.02
+    assert 150.0 <= path.s[start] <= 170.0
+    assert np.all(np.abs(path.curvature[start:start + 5]) < 0.02)
+    assert curve_start_index(path, lead_in=0.0) > start
+
+
+def test_first_rung_scores_differ_between_configs():
+    evaluator = BatchEvaluator(abort_criteria=AbortCriteria())
+    first_rung = rung_durations(10.0, 60.0, 3)[0]
+    rng = np.random.default_rng(0)
+    for controller in ('pure_pursuit', 'stanley', 'hybrid'):
+        configs = sample_configs(controller, 9, rng)
+        results = evaluator.evaluate(controller, configs, first_rung)
+        scores = [score(metrics['summary']) for metrics in results]
+        assert min(scores) > 0.0
+        assert len(set(np.round(scores, 6))) > 1
+
+
+def test_empty_run_writes_null_and_ranks_last():
+    summary = RunSummary().summary()
+    assert json.loads(json.dumps(summary, allow_nan=False)) == summary
+    assert all(value is None for value in summary.values())
+    assert score(summary) == math.inf
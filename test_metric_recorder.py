@@ -0,0 +1,45 @@
+"""
+Tests for the columnar and streaming metric recorders
+"""
+
+import numpy as np
+import pytest
+
+from metric_recorder import MetricRecorder, StreamingRecorder
+
+
+def test_recorder_grows_past_capacity():
+    recorder = MetricRecorder(('a', 'b'), capacity=2)
+    for i in range(5):
+        recorder.append(i, -i)
+    assert len(recorder) == 5
+    assert recorder.capacity == 8
+    assert recorder['a'].tolist() == [0, 1, 2, 3, 4]
+    assert recorder['b'].tolist() == [0, -1, -2, -3, -4]
+
+
+def test_recorder_rejects_malformed_rows():
+    recorder = MetricRecorder(('a', 'b'), capacity=1)
+    recorder.append(1.0, 2.0)
+    for row in ((1.0,), (1.0, 2.0, 3.0)):
+        with pytest.raises(ValueError):
+            recorder.append(*row)
+    assert len(recorder) == 1
+    assert recorder.capacity == 1
+
+
+def test_stream_round_trip(tmp_path):
+    filepath = str(tmp_path / 'run.trace')
+    recorder = StreamingRecorder(('a', 'active'), filepath, chunk_rows=3, labels=('active',))
+    for i in range(7):
+        recorder.append(i, recorder.label_code('active', 'pp' if i % 2 else 'stanley'))
+    with pytest.raises(ValueError):
+        recorder.append(1.0)
+    recorder.close()
+
+    reopened = StreamingRecorder.open(filepath)
+    assert reopened.complete
+    for logged in (recorder, reopened):
+        assert len(logged) == 7
+        np.testing.assert_array_equal(logged['a'], np.arange(7))
+        assert logged.to_dict(['active'])['active'][:3] == ['stanley', 'pp', 'stanley']
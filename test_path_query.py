@@ -0,0 +1,33 @@
+"""
+Tests for the shared per-tick path query
+"""
+
+import local_sim
+from path_query import query_path
+from route_builder import build_route
+from vehicle_state import VehicleState
+from waypoint_path import ClosestPointTracker
+
+
+def test_query_after_teleport_is_not_stale():
+    world = local_sim.Client().load_world('Town01')
+    carla_map = world.get_map()
+    spawn_points = carla_map.get_spawn_points()
+    path = build_route(carla_map, spawn_points[0].location)
+    vehicle = world.spawn_actor(world.get_blueprint_library().find('vehicle.tesla.model3'),
+                                spawn_points[0])
+    world.tick()
+    tracker = ClosestPointTracker()
+
+    state = VehicleState.capture(world, vehicle)
+    first = query_path(state, path, tracker)
+    assert query_path(state, path, ClosestPointTracker()) is first
+
+    # Teleporting does not advance the frame
+    vehicle.set_transform(spawn_points[2])
+    moved = VehicleState.capture(world, vehicle)
+    assert moved.frame == state.frame
+    query = query_path(moved, path, tracker)
+    assert query is not first
+    assert query.closest_idx != first.closest_idx
+    assert abs(path.x[query.closest_idx] - moved.x) + abs(path.y[query.closest_idx] - moved.y) < 3.0
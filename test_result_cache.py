@@ -0,0 +1,51 @@
+"""
+Tests for the content-addressed result cache
+"""
+
+import os
+
+import numpy as np
+
+from hybrid_controller import HybridController
+from result_cache import ResultCache, describe_controller
+from result_format import trace_file
+from waypoint_path import Path
+
+
+def _straight_path():
+    x = np.arange(0.0, 20.0, 2.0)
+    return Path(x, np.zeros_like(x), np.zeros_like(x))
+
+
+def test_describe_controller_ignores_runtime_state():
+    controller = HybridController(pp_lookahead=4.0, stanley_k=0.8, mode='blending')
+    before = describe_controller(controller)
+    # State a run leaves behind and reset() does not restore
+    controller.active_controller = 'Stanley'
+    controller.blend_weight = 0.9
+    controller.current_curvature = 0.1
+    controller.pure_pursuit.lookahead_distance = 7.5
+    controller.stanley.k = 2.0
+    controller.tracker.find(_straight_path(), 3.0, 0.5)
+    assert describe_controller(controller) == before
+    assert before['params']['pp_lookahead'] == 4.0
+    assert describe_controller(HybridController(pp_lookahead=5.0)) != before
+
+
+def test_entries_use_binary_result_format(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    fields = {'controller': describe_controller(HybridController())}
+    key = cache.key(fields)
+    metrics = {
+        'experiment_name': 'Hybrid',
+        'lateral_errors': np.linspace(0.0, 1.0, 50),
+        'summary': {'mean_lateral_error': 0.5},
+    }
+    assert cache.load(key) is None
+    cache.store(key, fields, metrics)
+
+    assert os.path.exists(trace_file(cache.entry_file(key)))
+    loaded = cache.load(key)
+    assert 'cache' not in loaded
+    assert loaded['summary'] == metrics['summary']
+    np.testing.assert_allclose(loaded['lateral_errors'], metrics['lateral_errors'], atol=1e-6)
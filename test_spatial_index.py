@@ -0,0 +1,25 @@
+"""
+Tests for the waypoint spatial index
+"""
+
+import numpy as np
+
+from benchmark_spatial_index import generate_road_network
+from spatial_index import SCAN_THRESHOLD, WaypointIndex
+
+
+def test_scan_and_grid_agree():
+    xs, ys = generate_road_network(2_000)
+    scan = WaypointIndex(xs, ys)
+    grid = WaypointIndex(xs, ys, scan_threshold=0)
+    assert len(scan) < SCAN_THRESHOLD
+    assert scan.scan and not grid.scan
+
+    rng = np.random.default_rng(0)
+    # Queries in lane and far off the network
+    qx = np.concatenate([xs[:50] + rng.normal(size=50), rng.uniform(-500, 1000, 50)])
+    qy = np.concatenate([ys[:50] + rng.normal(size=50), rng.uniform(-500, 1000, 50)])
+    for x, y in zip(qx, qy):
+        reference = np.hypot(xs - x, ys - y).min()
+        assert np.isclose(scan.nearest(x, y)[1], reference)
+        assert np.isclose(grid.nearest(x, y)[1], reference)
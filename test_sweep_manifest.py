@@ -0,0 +1,45 @@
+"""
+Tests for resumable sweep manifests
+"""
+
+from sweep_executor import experiment_spec
+from sweep_manifest import SweepManifest
+
+
+SETTINGS = {'backend': 'local', 'town': 'Town01', 'source': 'abc'}
+
+
+def _complete(manifest, spec):
+    (manifest.results_dir / spec['filename']).write_text('{}')
+    manifest.mark_complete(spec, {'summary': {'failed': False}})
+
+
+def test_changed_spec_or_settings_is_not_complete(tmp_path):
+    spec = experiment_spec('Hybrid_Blending', 'hybrid', {'mode': 'blending'},
+                           filename='hybrid_blending.json')
+    manifest = SweepManifest('sweep', results_dir=tmp_path, settings=SETTINGS)
+    _complete(manifest, spec)
+    assert manifest.pending([spec]) == []
+
+    edited = experiment_spec('Hybrid_Blending', 'hybrid', {'mode': 'blending', 'stanley_k': 1.0},
+                             filename='hybrid_blending.json')
+    reopened = SweepManifest('sweep', results_dir=tmp_path, settings=SETTINGS)
+    assert reopened.pending([spec, edited]) == [1]
+    new_code = SweepManifest('sweep', results_dir=tmp_path, settings=dict(SETTINGS, source='def'))
+    assert new_code.pending([spec]) == [0]
+
+    # Completing the edited spec replaces the stale entry for the same file
+    _complete(reopened, edited)
+    assert len(reopened.completed) == 1
+
+
+def test_finished_sweep_is_recorded(tmp_path):
+    spec = experiment_spec('Stanley_K1.0', 'stanley', {'k': 1.0}, filename='stanley_k1.0.json')
+    manifest = SweepManifest('sweep', results_dir=tmp_path, settings=SETTINGS)
+    _complete(manifest, spec)
+    manifest.finish()
+
+    reopened = SweepManifest('sweep', results_dir=tmp_path, settings=SETTINGS)
+    assert reopened.finished is not None
+    reopened.reset()
+    assert reopened.finished is None and reopened.pending([spec]) == [0]
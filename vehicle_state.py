@@ -0,0 +1,130 @@
+"""
+Per-tick Vehicle State Snapshot
+Captures the ego vehicle's pose and velocity once per simulation frame from a
+single world snapshot, and counts the CARLA calls a run issues per tick
+"""
+
+import math
+from collections import Counter
+
+
+class VehicleState:
+    """
+    Pose and speed of one vehicle at one simulation frame.
+
+    Attributes:
+        frame (int): Simulation frame the state was read from
+        timestamp (float): Simulation time of the frame (seconds)
+        vehicle_id (int): Actor id of the vehicle
+        transform: Vehicle transform (carla.Transform)
+        location: Vehicle location (carla.Location)
+        x, y, z (float): Vehicle position (meters)
+        yaw (float): Vehicle heading (radians)
+        speed (float): Vehicle speed (m/s)
+        path_query (PathQuery): Closest path match computed for this state
+            (see path_query.query_path), None until the first query
+    """
+
+    __slots__ = ('frame', 'timestamp', 'vehicle_id', 'transform', 'location',
+                 'x', 'y', 'z', 'yaw', 'speed', 'path_query')
+
+    def __init__(self, frame, timestamp, vehicle_id, transform, velocity):
+        self.frame = frame
+        self.timestamp = timestamp
+        self.vehicle_id = vehicle_id
+        self.transform = transform
+        self.location = transform.location
+        self.x = self.location.x
+        self.y = self.location.y
+        self.z = self.location.z
+        self.yaw = math.radians(transform.rotation.yaw)
+        self.speed = math.sqrt(velocity.x**2 + velocity.y**2 + velocity.z**2)
+        self.path_query = None
+
+    @classmethod
+    def capture(cls, world, vehicle, rpc_counter=None):
+        """
+        Read the vehicle state for the current frame.
+
+        Pose and velocity come from the world snapshot, so one call covers
+        both instead of separate get_transform/get_velocity round trips.
+
+        Args:
+            world: CARLA world (carla.World)
+            vehicle: CARLA vehicle actor
+            rpc_counter (RpcCounter): Optional counter for the calls issued
+
+        Returns:
+            VehicleState: State of the vehicle at the current frame
+        """
+        snapshot = world.get_snapshot()
+        if rpc_counter is not None:
+            rpc_counter.add('get_snapshot')
+
+        actor = snapshot.find(vehicle.id)
+        if actor is not None:
+            transform = actor.get_transform()
+            velocity = actor.get_velocity()
+        else:
+            # Actor not in the snapshot yet (e.g. spawned this frame)
+            transform = vehicle.get_transform()
+            velocity = vehicle.get_velocity()
+            if rpc_counter is not None:
+                rpc_counter.add('get_transform')
+                rpc_counter.add('get_velocity')
+
+        return cls(snapshot.frame, snapshot.timestamp.elapsed_seconds,
+                   vehicle.id, transform, velocity)
+
+
+class RpcCounter:
+    """
+    Counts CARLA client calls by name over a run.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.ticks = 0
+
+    def reset(self):
+        """
+        Clear all counts.
+        """
+        self.counts.clear()
+        self.ticks = 0
+
+    def add(self, name, n=1):
+        """
+        Record calls.
+
+        Args:
+            name (str): Call name (e.g. 'apply_control')
+            n (int): Number of calls
+        """
+        self.counts[name] += n
+
+    def tick(self):
+        """
+        Record a world.tick() call and advance the tick count.
+        """
+        self.counts['tick'] += 1
+        self.ticks += 1
+
+    def per_tick(self):
+        """
+        Average calls per tick by name.
+
+        Returns:
+            dict: Call name -> calls per tick
+        """
+        ticks = max(self.ticks, 1)
+        return {name: count / ticks for name, count in sorted(self.counts.items())}
+
+    def total_per_tick(self):
+        """
+        Average calls per tick over all names.
+
+        Returns:
+            float: Calls per tick
+        """
+        return sum(self.counts.values()) / max(self.ticks, 1)
@@ -0,0 +1,762 @@
+"""
+Array-backed Path for Controllers
+Stores a waypoint sequence as contiguous NumPy arrays so per-tick path math
+never touches the CARLA Python bindings
+"""
+
+import math
+import numpy as np
+
+from spatial_index import WaypointIndex
+
+
+class Path:
+    """
+    Waypoint sequence stored as contiguous float arrays.
+
+    Attributes:
+        x, y, z (np.ndarray): Waypoint positions (meters)
+        yaw (np.ndarray): Waypoint headings (radians)
+        s (np.ndarray): Cumulative arc length from the first waypoint (meters)
+        curvature (np.ndarray): Signed path curvature at each waypoint (1/m)
+        closed (bool): Whether the last waypoint connects back to the first
+    """
+
+    def __init__(self, x, y, yaw, z=None, closed=False):
+        """
+        Build a path from coordinate arrays.
+
+        Args:
+            x (array-like): Waypoint x coordinates (meters)
+            y (array-like): Waypoint y coordinates (meters)
+            yaw (array-like): Waypoint headings (radians)
+            z (array-like): Waypoint z coordinates (meters), zeros if None
+            closed (bool): Whether the path is a loop (the first waypoint is
+                not repeated at the end)
+        """
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        self.yaw = np.ascontiguousarray(yaw, dtype=np.float64)
+        if z is None:
+            self.z = np.zeros_like(self.x)
+        else:
+            self.z = np.ascontiguousarray(z, dtype=np.float64)
+
+        if len(self.x) == 0:
+            raise ValueError("Cannot build a path from zero waypoints")
+
+        self.closed = bool(closed) and len(self.x) > 2
+
+        # Cumulative arc length
+        segment_lengths = np.hypot(np.diff(self.x), np.diff(self.y))
+        self.s = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+
+        self.total_length = float(self.s[-1])
+        if self.closed:
+            closing = math.hypot(self.x[0] - self.x[-1], self.y[0] - self.y[-1])
+            self.total_length += closing
+            segment_lengths = np.append(segment_lengths, closing)
+
+        self.curvature = self._compute_curvature(segment_lengths)
+        self._index = None
+        self._profiles = {}
+
+    def _compute_curvature(self, segment_lengths):
+        """
+        Compute signed curvature as heading change per unit arc length.
+
+        Args:
+            segment_lengths (np.ndarray): Distances between consecutive
+                waypoints (including the closing segment of a loop)
+
+        Returns:
+            np.ndarray: Curvature at each waypoint (1/m)
+        """
+        curvature = np.zeros_like(self.x)
+        if len(self.x) < 3:
+            return curvature
+
+        if self.closed:
+            # Every waypoint sits between two segments on a loop
+            headings = np.arctan2(np.roll(self.y, -1) - self.y, np.roll(self.x, -1) - self.x)
+            heading_change = headings - np.roll(headings, 1)
+            heading_change = np.arctan2(np.sin(heading_change), np.cos(heading_change))
+            span = 0.5 * (segment_lengths + np.roll(segment_lengths, 1))
+            valid = span > 1e-6
+            curvature[valid] = heading_change[valid] / span[valid]
+            return curvature
+
+        headings = np.arctan2(np.diff(self.y), np.diff(self.x))
+        heading_change = np.diff(headings)
+        heading_change = np.arctan2(np.sin(heading_change), np.cos(heading_change))
+
+        # Heading change at interior point i spans half of each adjacent segment
+        span = 0.5 * (segment_lengths[:-1] + segment_lengths[1:])
+        valid = span > 1e-6
+        curvature[1:-1][valid] = heading_change[valid] / span[valid]
+
+        # Extend the end values so the profile has no artificial zeros
+        curvature[0] = curvature[1]
+        curvature[-1] = curvature[-2]
+        return curvature
+
+    @classmethod
+    def from_waypoints(cls, waypoints, closed=False):
+        """
+        Build a path from a list of carla.Waypoint objects.
+
+        The CARLA bindings are read once per waypoint here and never again.
+
+        Args:
+            waypoints: List of waypoints
+            closed (bool): Whether the waypoints form a loop
+
+        Returns:
+            Path: Array-backed path
+        """
+        n = len(waypoints)
+        x = np.empty(n)
+        y = np.empty(n)
+        z = np.empty(n)
+        yaw = np.empty(n)
+        for i, waypoint in enumerate(waypoints):
+            transform = waypoint.transform
+            location = transform.location
+            x[i] = location.x
+            y[i] = location.y
+            z[i] = location.z
+            yaw[i] = transform.rotation.yaw
+        return cls(x, y, np.radians(yaw), z=z, closed=closed)
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def index(self):
+        """
+        Spatial index over the path points, built on first use.
+
+        Returns:
+            WaypointIndex: Index answering nearest and radius queries
+        """
+        if self._index is None:
+            self._index = WaypointIndex(self.x, self.y)
+        return self._index
+
+    @property
+    def length(self):
+        """
+        Total arc length of the path in meters (including the closing
+        segment of a loop).
+        """
+        return self.total_length
+
+    def next_index(self, idx):
+        """
+        Index of the waypoint after idx, or None at the end of an open path.
+
+        Args:
+            idx (int): Waypoint index
+
+        Returns:
+            int: Next waypoint index
+        """
+        if idx + 1 < len(self.x):
+            return idx + 1
+        return 0 if self.closed else None
+
+    def project(self, x, y, idx):
+        """
+        Project a point onto the path segments adjacent to a waypoint.
+
+        Args:
+            x (float): Point x coordinate (meters)
+            y (float): Point y coordinate (meters)
+            idx (int): Index of the closest waypoint to the point
+
+        Returns:
+            float: Arc length of the projected point (meters)
+        """
+        n = len(self.x)
+        best_s = float(self.s[idx])
+        best_dist_sq = (x - self.x[idx])**2 + (y - self.y[idx])**2
+
+        for i in (idx - 1, idx):
+            if self.closed:
+                i %= n
+            elif i < 0 or i + 1 >= n:
+                continue
+            j = self.next_index(i)
+            seg_x = self.x[j] - self.x[i]
+            seg_y = self.y[j] - self.y[i]
+            seg_len_sq = seg_x * seg_x + seg_y * seg_y
+            if seg_len_sq <= 1e-12:
+                continue
+
+            t = ((x - self.x[i]) * seg_x + (y - self.y[i]) * seg_y) / seg_len_sq
+            t = min(max(t, 0.0), 1.0)
+            px = self.x[i] + t * seg_x
+            py = self.y[i] + t * seg_y
+            dist_sq = (x - px)**2 + (y - py)**2
+            if dist_sq < best_dist_sq:
+                best_dist_sq = dist_sq
+                best_s = float(self.s[i]) + t * math.sqrt(seg_len_sq)
+
+        return best_s
+
+    def project_batch(self, x, y, idx):
+        """
+        Vectorized project for many points at once.
+
+        Args:
+            x (np.ndarray): Point x coordinates (meters)
+            y (np.ndarray): Point y coordinates (meters)
+            idx (np.ndarray): Index of the closest waypoint to each point
+
+        Returns:
+            np.ndarray: Arc length of each projected point (meters)
+        """
+        n = len(self.x)
+        best_s = self.s[idx].astype(np.float64)
+        if n < 2:
+            return best_s
+        best_dist_sq = (x - self.x[idx])**2 + (y - self.y[idx])**2
+
+        for offset in (-1, 0):
+            i = idx + offset
+            if self.closed:
+                i = i % n
+                j = (i + 1) % n
+                valid = np.ones(len(i), dtype=bool)
+            else:
+                valid = (i >= 0) & (i + 1 < n)
+                i = np.clip(i, 0, n - 2)
+                j = i + 1
+            seg_x = self.x[j] - self.x[i]
+            seg_y = self.y[j] - self.y[i]
+            seg_len_sq = seg_x * seg_x + seg_y * seg_y
+            valid &= seg_len_sq > 1e-12
+            seg_len_sq = np.where(valid, seg_len_sq, 1.0)
+
+            t = ((x - self.x[i]) * seg_x + (y - self.y[i]) * seg_y) / seg_len_sq
+            t = np.clip(t, 0.0, 1.0)
+            px = self.x[i] + t * seg_x
+            py = self.y[i] + t * seg_y
+            dist_sq = (x - px)**2 + (y - py)**2
+
+            better = valid & (dist_sq < best_dist_sq)
+            best_dist_sq = np.where(better, dist_sq, best_dist_sq)
+            best_s = np.where(better, self.s[i] + t * np.sqrt(seg_len_sq), best_s)
+
+        return best_s
+
+    def cross_track(self, x, y, idx):
+        """
+        Signed cross-track error of a point against the path segments
+        adjacent to a waypoint.
+
+        Unlike the distance to the waypoint itself, the distance to the
+        segments does not depend on the waypoint spacing.
+
+        Args:
+            x (float): Point x coordinate (meters)
+            y (float): Point y coordinate (meters)
+            idx (int): Index of the closest waypoint to the point
+
+        Returns:
+            tuple: (error, s, heading) - distance to the path, positive when
+                the point lies to the right of it (the sign of the Stanley
+                cross-track error); arc length of the projected point
+                (meters); path heading there (radians)
+        """
+        n = len(self.x)
+        dx = x - self.x[idx]
+        dy = y - self.y[idx]
+        best_dist_sq = dx * dx + dy * dy
+        best_s = float(self.s[idx])
+        best_heading = float(self.yaw[idx])
+        best_side = math.sin(best_heading) * dx - math.cos(best_heading) * dy
+
+        for i in (idx - 1, idx):
+            if self.closed:
+                i %= n
+            elif i < 0 or i + 1 >= n:
+                continue
+            j = self.next_index(i)
+            seg_x = self.x[j] - self.x[i]
+            seg_y = self.y[j] - self.y[i]
+            seg_len_sq = seg_x * seg_x + seg_y * seg_y
+            if seg_len_sq <= 1e-12:
+                continue
+
+            t = ((x - self.x[i]) * seg_x + (y - self.y[i]) * seg_y) / seg_len_sq
+            t = min(max(t, 0.0), 1.0)
+            off_x = x - (self.x[i] + t * seg_x)
+            off_y = y - (self.y[i] + t * seg_y)
+            dist_sq = off_x * off_x + off_y * off_y
+            if dist_sq < best_dist_sq:
+                best_dist_sq = dist_sq
+                seg_len = math.sqrt(seg_len_sq)
+                best_s = float(self.s[i]) + t * seg_len
+                turn = self.yaw[j] - self.yaw[i]
+                turn = math.atan2(math.sin(turn), math.cos(turn))
+                best_heading = float(self.yaw[i]) + t * turn
+                best_side = (seg_y * off_x - seg_x * off_y) / seg_len
+
+        error = math.sqrt(best_dist_sq)
+        heading = math.atan2(math.sin(best_heading), math.cos(best_heading))
+        return (error if best_side >= 0.0 else -error), best_s, heading
+
+    def cross_track_batch(self, x, y, idx=None):
+        """
+        Vectorized cross_track for many points at once, e.g. a whole saved
+        trajectory.
+
+        Args:
+            x (np.ndarray): Point x coordinates (meters)
+            y (np.ndarray): Point y coordinates (meters)
+            idx (np.ndarray): Index of the closest waypoint to each point. If
+                None, it is looked up in the spatial index.
+
+        Returns:
+            tuple: (errors, s, headings) arrays, as in cross_track
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if idx is None:
+            idx, _ = self.index.nearest_batch(x, y)
+        idx = np.asarray(idx, dtype=np.int64)
+
+        n = len(self.x)
+        dx = x - self.x[idx]
+        dy = y - self.y[idx]
+        best_dist_sq = dx * dx + dy * dy
+        best_s = self.s[idx].astype(np.float64)
+        best_heading = self.yaw[idx].astype(np.float64)
+        best_side = np.sin(best_heading) * dx - np.cos(best_heading) * dy
+
+        for offset in (-1, 0):
+            if n < 2:
+                break
+            i = idx + offset
+            if self.closed:
+                i = i % n
+                j = (i + 1) % n
+                valid = np.ones(len(i), dtype=bool)
+            else:
+                valid = (i >= 0) & (i + 1 < n)
+                i = np.clip(i, 0, n - 2)
+                j = i + 1
+            seg_x = self.x[j] - self.x[i]
+            seg_y = self.y[j] - self.y[i]
+            seg_len_sq = seg_x * seg_x + seg_y * seg_y
+            valid &= seg_len_sq > 1e-12
+            seg_len_sq = np.where(valid, seg_len_sq, 1.0)
+
+            t = ((x - self.x[i]) * seg_x + (y - self.y[i]) * seg_y) / seg_len_sq
+            t = np.clip(t, 0.0, 1.0)
+            off_x = x - (self.x[i] + t * seg_x)
+            off_y = y - (self.y[i] + t * seg_y)
+            dist_sq = off_x * off_x + off_y * off_y
+
+            better = valid & (dist_sq < best_dist_sq)
+            seg_len = np.sqrt(seg_len_sq)
+            turn = self.yaw[j] - self.yaw[i]
+            turn = np.arctan2(np.sin(turn), np.cos(turn))
+            best_dist_sq = np.where(better, dist_sq, best_dist_sq)
+            best_s = np.where(better, self.s[i] + t * seg_len, best_s)
+            best_heading = np.where(better, self.yaw[i] + t * turn, best_heading)
+            best_side = np.where(better, (seg_y * off_x - seg_x * off_y) / seg_len, best_side)
+
+        error = np.sqrt(best_dist_sq)
+        heading = np.arctan2(np.sin(best_heading), np.cos(best_heading))
+        return np.where(best_side >= 0.0, error, -error), best_s, heading
+
+    def interpolate(self, s):
+        """
+        Interpolate a point on the path at an arc length.
+
+        Uses a binary search over the cumulative arc-length array, so the cost
+        is logarithmic in the number of waypoints.
+
+        Args:
+            s (float): Arc length along the path (meters). It wraps around a
+                closed path and is clamped to the ends of an open one.
+
+        Returns:
+            tuple: (x, y) of the interpolated point
+        """
+        if self.closed:
+            s %= self.total_length
+            if s >= self.s[-1]:
+                # On the closing segment back to the first waypoint
+                seg_len = self.total_length - self.s[-1]
+                t = (s - self.s[-1]) / seg_len if seg_len > 1e-9 else 0.0
+                x = self.x[-1] + t * (self.x[0] - self.x[-1])
+                y = self.y[-1] + t * (self.y[0] - self.y[-1])
+                return float(x), float(y)
+        elif s >= self.s[-1]:
+            return float(self.x[-1]), float(self.y[-1])
+
+        if s <= 0.0:
+            return float(self.x[0]), float(self.y[0])
+
+        i = int(np.searchsorted(self.s, s, side='right')) - 1
+        seg_len = self.s[i + 1] - self.s[i]
+        t = (s - self.s[i]) / seg_len if seg_len > 1e-9 else 0.0
+        x = self.x[i] + t * (self.x[i + 1] - self.x[i])
+        y = self.y[i] + t * (self.y[i + 1] - self.y[i])
+        return float(x), float(y)
+
+    def interpolate_batch(self, s):
+        """
+        Vectorized interpolate for many arc lengths at once.
+
+        Args:
+            s (np.ndarray): Arc lengths along the path (meters)
+
+        Returns:
+            tuple: (x, y) arrays of the interpolated points
+        """
+        s = np.asarray(s, dtype=np.float64)
+        n = len(self.x)
+        if n < 2:
+            return np.full(s.shape, self.x[0]), np.full(s.shape, self.y[0])
+
+        if self.closed:
+            s = np.mod(s, self.total_length)
+        else:
+            s = np.clip(s, 0.0, self.s[-1])
+
+        i = np.clip(np.searchsorted(self.s, s, side='right') - 1, 0, n - 2)
+        seg_len = self.s[i + 1] - self.s[i]
+        t = np.where(seg_len > 1e-9, (s - self.s[i]) / np.where(seg_len > 1e-9, seg_len, 1.0), 0.0)
+        x = self.x[i] + t * (self.x[i + 1] - self.x[i])
+        y = self.y[i] + t * (self.y[i + 1] - self.y[i])
+
+        if self.closed:
+            # Points on the closing segment back to the first waypoint
+            closing = s >= self.s[-1]
+            seg_len = self.total_length - self.s[-1]
+            t = (s - self.s[-1]) / seg_len if seg_len > 1e-9 else np.zeros_like(s)
+            x = np.where(closing, self.x[-1] + t * (self.x[0] - self.x[-1]), x)
+            y = np.where(closing, self.y[-1] + t * (self.y[0] - self.y[-1]), y)
+
+        return x, y
+
+    def curvature_profile(self, horizon):
+        """
+        Preview curvature profile for a horizon, computed once per horizon.
+
+        Args:
+            horizon (float): Arc length ahead to average over (meters)
+
+        Returns:
+            CurvatureProfile: Profile with O(1) lookups by arc length
+        """
+        profile = self._profiles.get(horizon)
+        if profile is None:
+            profile = CurvatureProfile(self, horizon)
+            self._profiles[horizon] = profile
+        return profile
+
+
+class CurvatureProfile:
+    """
+    Smoothed preview curvature along a path.
+
+    The value at arc length s is the mean absolute curvature over
+    [s, s + horizon], computed for the whole path in one vectorized pass and
+    sampled on a uniform arc-length grid so lookups are a single array read.
+    """
+
+    def __init__(self, path, horizon, resolution=0.5):
+        """
+        Build the profile.
+
+        Args:
+            path (Path): Array-backed path
+            horizon (float): Arc length ahead to average over (meters)
+            resolution (float): Spacing of the arc-length lookup grid (meters)
+        """
+        self.horizon = horizon
+        self.resolution = resolution
+        self.closed = path.closed
+
+        abs_curvature = np.abs(path.curvature)
+        s = path.s
+        if path.closed:
+            # Repeat the first waypoint at the end of the loop
+            abs_curvature = np.append(abs_curvature, abs_curvature[0])
+            s = np.append(s, path.length)
+
+        # Running integral of |curvature| over arc length (trapezoid rule)
+        integral = np.concatenate((
+            [0.0],
+            np.cumsum(0.5 * (abs_curvature[:-1] + abs_curvature[1:]) * np.diff(s))
+        ))
+
+        if path.closed:
+            grid = np.arange(0.0, path.length, resolution)
+            window_end = grid + horizon
+            laps, remainder = np.divmod(window_end, path.length)
+            end_integral = laps * integral[-1] + np.interp(remainder, s, integral)
+            self.values = (end_integral - np.interp(grid, s, integral)) / max(horizon, 1e-6)
+            return
+
+        grid = np.arange(0.0, path.length + resolution, resolution)
+        window_end = np.minimum(grid + horizon, path.length)
+        span = window_end - grid
+
+        # Near the end of the path the window shrinks to what is left of it
+        area = np.interp(window_end, s, integral) - np.interp(grid, s, integral)
+        local = np.interp(grid, s, abs_curvature)
+        self.values = np.where(span > 1e-6, area / np.maximum(span, 1e-6), local)
+
+    def at(self, s):
+        """
+        Look up the preview curvature at an arc length.
+
+        Args:
+            s (float): Arc length along the path (meters)
+
+        Returns:
+            float: Mean absolute curvature over the horizon ahead (1/m)
+        """
+        i = int(s / self.resolution)
+        if self.closed:
+            i %= len(self.values)
+        else:
+            i = min(max(i, 0), len(self.values) - 1)
+        return float(self.values[i])
+
+    def at_batch(self, s):
+        """
+        Vectorized at for many arc lengths at once.
+
+        Args:
+            s (np.ndarray): Arc lengths along the path (meters)
+
+        Returns:
+            np.ndarray: Mean absolute curvature over the horizon ahead (1/m)
+        """
+        i = (np.asarray(s) / self.resolution).astype(np.int64)
+        if self.closed:
+            i %= len(self.values)
+        else:
+            i = np.clip(i, 0, len(self.values) - 1)
+        return self.values[i]
+
+
+class ClosestPointTracker:
+    """
+    Warm-started closest-waypoint search along a path.
+
+    The vehicle moves only a few waypoints per tick, so after the first match
+    the search is limited to a small window around the previous index. A
+    global indexed search is used when there is no previous match, when the
+    path changes, or when the windowed match looks lost (too far away, or
+    pinned to the window edge after a jump such as a set_transform reset).
+    """
+
+    def __init__(self, window_behind=5, window_ahead=20, lost_distance=5.0):
+        """
+        Initialize the tracker.
+
+        Args:
+            window_behind (int): Waypoints to search behind the last match
+            window_ahead (int): Waypoints to search ahead of the last match
+            lost_distance (float): Match distance beyond which the windowed
+                result is discarded in favor of a global search (meters)
+        """
+        self.window_behind = window_behind
+        self.window_ahead = window_ahead
+        self.lost_distance = lost_distance
+        self.last_idx = None
+        self._path = None
+
+    def reset(self):
+        """
+        Forget the previous match so the next query searches globally.
+        """
+        self.last_idx = None
+
+    def sync(self, path, idx):
+        """
+        Adopt a match found elsewhere (e.g. from a shared per-tick query).
+
+        Args:
+            path (Path): Path the match refers to
+            idx (int): Matched waypoint index
+        """
+        self._path = path
+        self.last_idx = idx
+
+    def find(self, path, x, y):
+        """
+        Find the closest waypoint to a position.
+
+        Args:
+            path (Path): Array-backed path
+            x (float): Query x coordinate (meters)
+            y (float): Query y coordinate (meters)
+
+        Returns:
+            tuple: (index, distance) of the closest waypoint
+        """
+        if path is not self._path:
+            self._path = path
+            self.last_idx = None
+
+        n = len(path)
+        window = self.window_behind + self.window_ahead + 1
+        if self.last_idx is not None and path.closed and window < n:
+            # Window wraps around the end of a loop
+            ids = np.arange(self.last_idx - self.window_behind,
+                            self.last_idx + self.window_ahead + 1) % n
+            dist_sq = (path.x[ids] - x)**2 + (path.y[ids] - y)**2
+            local = int(np.argmin(dist_sq))
+            idx = int(ids[local])
+            distance = float(np.sqrt(dist_sq[local]))
+
+            at_edge = local == 0 or local == window - 1
+            if distance <= self.lost_distance and not at_edge:
+                self.last_idx = idx
+                return idx, distance
+
+        elif self.last_idx is not None:
+            lo = max(self.last_idx - self.window_behind, 0)
+            hi = min(self.last_idx + self.window_ahead + 1, n)
+            dist_sq = (path.x[lo:hi] - x)**2 + (path.y[lo:hi] - y)**2
+            local = int(np.argmin(dist_sq))
+            idx = lo + local
+            distance = float(np.sqrt(dist_sq[local]))
+
+            at_edge = (idx == lo and lo > 0) or (idx == hi - 1 and hi < n)
+            if distance <= self.lost_distance and not at_edge:
+                self.last_idx = idx
+                return idx, distance
+
+        idx, distance = path.index.nearest(x, y)
+        self.last_idx = idx
+        return idx, distance
+
+
+class BatchClosestPointTracker:
+    """
+    Warm-started closest-waypoint search for many vehicles on one path.
+
+    Vectorized counterpart of ClosestPointTracker: all vehicles are searched
+    in a window around their previous match with one array operation, and
+    only vehicles whose match looks lost fall back to the global index.
+    """
+
+    def __init__(self, window_behind=5, window_ahead=20, lost_distance=5.0):
+        """
+        Initialize the tracker.
+
+        Args:
+            window_behind (int): Waypoints to search behind the last match
+            window_ahead (int): Waypoints to search ahead of the last match
+            lost_distance (float): Match distance beyond which the windowed
+                result is discarded in favor of a global search (meters)
+        """
+        self.window_behind = window_behind
+        self.window_ahead = window_ahead
+        self.lost_distance = lost_distance
+        self.last_idx = None
+        self._path = None
+
+    def reset(self):
+        """
+        Forget the previous matches so the next query searches globally.
+        """
+        self.last_idx = None
+
+    def find(self, path, x, y):
+        """
+        Find the closest waypoint to each position.
+
+        Args:
+            path (Path): Array-backed path
+            x (np.ndarray): Query x coordinates (meters)
+            y (np.ndarray): Query y coordinates (meters)
+
+        Returns:
+            tuple: (indices, distances) arrays of the closest waypoints
+        """
+        if path is not self._path or self.last_idx is None or len(self.last_idx) != len(x):
+            self._path = path
+            self.last_idx = None
+
+        n = len(path)
+        if self.last_idx is None:
+            idx = np.empty(len(x), dtype=np.int64)
+            distance = np.empty(len(x))
+            for v in range(len(x)):
+                idx[v], distance[v] = path.index.nearest(x[v], y[v])
+            self.last_idx = idx
+            return idx, distance
+
+        offsets = np.arange(-self.window_behind, self.window_ahead + 1)
+        ids = self.last_idx[:, None] + offsets
+        if path.closed:
+            ids %= n
+        else:
+            ids = np.clip(ids, 0, n - 1)
+        dist_sq = (path.x[ids] - x[:, None])**2 + (path.y[ids] - y[:, None])**2
+        local = np.argmin(dist_sq, axis=1)
+        rows = np.arange(len(x))
+        idx = ids[rows, local]
+        distance = np.sqrt(dist_sq[rows, local])
+
+        # Matches pinned to a window edge that is not a path end may be lost
+        at_edge = (local == 0) | (local == len(offsets) - 1)
+        if not path.closed:
+            at_edge &= ~((idx == 0) | (idx == n - 1))
+        lost = np.flatnonzero(at_edge | (distance > self.lost_distance))
+        for v in lost:
+            idx[v], distance[v] = path.index.nearest(x[v], y[v])
+
+        self.last_idx = idx
+        return idx, distance
+
+    def select(self, keep):
+        """
+        Keep the previous matches of a subset of the vehicles.
+
+        Args:
+            keep (np.ndarray): Boolean mask or indices of the vehicles to keep
+        """
+        if self.last_idx is not None:
+            self.last_idx = self.last_idx[keep]
+
+
+# Paths keyed by the identity of the waypoint list they were built from.
+# The list itself is kept alive in the entry so its id cannot be reused.
+_PATH_CACHE = {}
+_PATH_CACHE_SIZE = 8
+
+
+def as_path(waypoints):
+    """
+    Return a Path for a waypoint list, converting each list only once.
+
+    Args:
+        waypoints: Path instance or list of carla.Waypoint objects
+
+    Returns:
+        Path: Array-backed path
+    """
+    if isinstance(waypoints, Path):
+        return waypoints
+
+    entry = _PATH_CACHE.get(id(waypoints))
+    if entry is not None and entry[0] is waypoints:
+        return entry[1]
+
+    path = Path.from_waypoints(waypoints)
+    if len(_PATH_CACHE) >= _PATH_CACHE_SIZE:
+        _PATH_CACHE.pop(next(iter(_PATH_CACHE)))
+    _PATH_CACHE[id(waypoints)] = (waypoints, path)
+    return path